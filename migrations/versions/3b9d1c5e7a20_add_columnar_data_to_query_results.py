@@ -0,0 +1,44 @@
+"""Add columnar_data column to query_results.
+
+Revision ID: 3b9d1c5e7a20
+Revises: fd4fc850d7ea
+Create Date: 2026-10-18 09:12:40.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from redash.utils import columnar, json_dumps
+
+# revision identifiers, used by Alembic.
+revision = "3b9d1c5e7a20"
+down_revision = "fd4fc850d7ea"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "query_results", sa.Column("columnar_data", sa.LargeBinary(), nullable=True)
+    )
+    op.alter_column(
+        "query_results", "data", existing_type=sa.Text(), nullable=True
+    )
+
+
+def downgrade():
+    connection = op.get_bind()
+    results = connection.execute(
+        "SELECT id, columnar_data FROM query_results WHERE data IS NULL"
+    )
+    for result_id, payload in results.fetchall():
+        connection.execute(
+            sa.text("UPDATE query_results SET data = :data WHERE id = :id"),
+            data=json_dumps(columnar.deserialize(bytes(payload))),
+            id=result_id,
+        )
+
+    op.alter_column(
+        "query_results", "data", existing_type=sa.Text(), nullable=False
+    )
+    op.drop_column("query_results", "columnar_data")
@@ -0,0 +1,33 @@
+"""Add schedule_next_run_at to queries.
+
+Revision ID: 5e1a7c2d9b44
+Revises: 3b9d1c5e7a20
+Create Date: 2026-10-18 11:02:17.520931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5e1a7c2d9b44"
+down_revision = "3b9d1c5e7a20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "queries",
+        sa.Column("schedule_next_run_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        op.f("ix_queries_schedule_next_run_at"),
+        "queries",
+        ["schedule_next_run_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_queries_schedule_next_run_at"), table_name="queries")
+    op.drop_column("queries", "schedule_next_run_at")
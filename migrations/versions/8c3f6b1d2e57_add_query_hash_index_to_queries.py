@@ -0,0 +1,27 @@
+"""Add (query_hash, data_source_id) index to queries.
+
+Revision ID: 8c3f6b1d2e57
+Revises: 5e1a7c2d9b44
+Create Date: 2026-10-18 14:21:06.381204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c3f6b1d2e57"
+down_revision = "5e1a7c2d9b44"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "queries_query_hash_data_source_id",
+        "queries",
+        ["query_hash", "data_source_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("queries_query_hash_data_source_id", table_name="queries")
@@ -120,7 +120,7 @@ def new(name=None, type=None, options=None, organization="default"):
         validate_data_source_type(type)
 
     query_runner = query_runners[type]
-    schema = query_runner.configuration_schema()
+    schema = query_runner.full_configuration_schema()
 
     if options is None:
         types = {"string": str, "number": int, "boolean": bool}
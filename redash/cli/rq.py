@@ -12,7 +12,7 @@ from sqlalchemy.orm import configure_mappers
 from supervisor_checks import check_runner
 from supervisor_checks.check_modules import base
 
-from redash import rq_redis_connection
+from redash import rq_redis_connection, settings
 from redash.tasks import (
     Worker,
     rq_scheduler,
@@ -45,7 +45,15 @@ def worker(queues):
         queues = chain(*[queue.split(",") for queue in queues])
 
     with Connection(rq_redis_connection):
-        w = Worker(queues, log_job_description=False, job_monitoring_interval=5)
+        w = Worker(
+            queues,
+            log_job_description=False,
+            job_monitoring_interval=5,
+            in_process_queues=settings.RQ_WORKER_IN_PROCESS_QUEUES,
+            threaded_queues=settings.RQ_WORKER_THREADED_QUEUES,
+            threads=settings.RQ_WORKER_THREADS,
+            aging=settings.QUERY_PRIORITY_AGING,
+        )
         w.work()
 
 
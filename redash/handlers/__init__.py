@@ -3,7 +3,7 @@ from flask_login import login_required
 
 from redash.handlers.api import api
 from redash.handlers.base import routes
-from redash.monitor import get_status
+from redash.monitor import get_status_snapshot
 from redash.permissions import require_super_admin
 from redash.security import talisman
 
@@ -18,7 +18,7 @@ def ping():
 @login_required
 @require_super_admin
 def status_api():
-    status = get_status()
+    status = get_status_snapshot()
     return jsonify(status)
 
 
@@ -8,7 +8,7 @@ from redash.handlers.base import json_response, record_event
 from redash.permissions import require_super_admin
 from redash.serializers import QuerySerializer
 from redash.utils import json_loads
-from redash.monitor import rq_status
+from redash.monitor import get_rq_status_snapshot
 
 
 @routes.route("/api/admin/queries/outdated", methods=["GET"])
@@ -51,4 +51,4 @@ def queries_rq_status():
         {"action": "list", "object_type": "rq_status"},
     )
 
-    return json_response(rq_status())
+    return json_response(get_rq_status_snapshot())
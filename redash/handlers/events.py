@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from flask import request
 import geolite2
 import maxminddb
@@ -7,16 +9,29 @@ from redash.handlers.base import BaseResource, paginate
 from redash.permissions import require_admin
 
 
+# The GeoIP database is opened once per process and kept open, and lookups of
+# IPs and user agents seen recently are served from memory, since the same few
+# users account for most events.
+@lru_cache(maxsize=1)
+def _geoip_reader():
+    return maxminddb.open_database(geolite2.geolite2_database())
+
+
+@lru_cache(maxsize=4096)
 def get_location(ip):
     if ip is None:
         return "Unknown"
 
-    with maxminddb.open_database(geolite2.geolite2_database()) as reader:
-        try:
-            match = reader.get(ip)
-            return match["country"]["names"]["en"]
-        except Exception:
-            return "Unknown"
+    try:
+        match = _geoip_reader().get(ip)
+        return match["country"]["names"]["en"]
+    except Exception:
+        return "Unknown"
+
+
+@lru_cache(maxsize=4096)
+def get_browser(user_agent):
+    return str(parse_ua(user_agent))
 
 
 def event_details(event):
@@ -51,7 +66,7 @@ def serialize_event(event):
     if not event.user_id:
         d["user_name"] = event.additional_properties.get("api_key", "Unknown")
 
-    d["browser"] = str(parse_ua(event.additional_properties.get("user_agent", "")))
+    d["browser"] = get_browser(event.additional_properties.get("user_agent", ""))
     d["location"] = get_location(event.additional_properties.get("ip"))
     d["details"] = event_details(event)
 
@@ -2,7 +2,7 @@ import logging
 import time
 
 import unicodedata
-from flask import make_response, request
+from flask import Response, make_response, request, stream_with_context
 from flask_login import current_user
 from flask_restful import abort
 from werkzeug.urls import url_quote
@@ -20,6 +20,7 @@ from redash.tasks import Job
 from redash.tasks.queries import enqueue_query
 from redash.utils import (
     collect_parameters_from_request,
+    gen_query_hash,
     json_dumps,
     utcnow,
     to_filename,
@@ -32,8 +33,8 @@ from redash.models.parameterized_query import (
 )
 from redash.serializers import (
     serialize_query_result,
-    serialize_query_result_to_dsv,
-    serialize_query_result_to_xlsx,
+    serialize_query_result_to_dsv_stream,
+    serialize_query_result_to_xlsx_stream,
     serialize_job,
 )
 
@@ -90,7 +91,15 @@ def run_query(
     if max_age == 0:
         query_result = None
     else:
-        query_result = models.QueryResult.get_latest(data_source, query_text, max_age)
+        query_result = models.results_cache.get(
+            data_source.id, gen_query_hash(query_text), max_age
+        )
+        if query_result is None:
+            query_result = models.QueryResult.get_latest(
+                data_source, query_text, max_age
+            )
+            if query_result:
+                models.results_cache.set(query_result)
 
     record_event(
         current_user.org,
@@ -327,6 +336,9 @@ class QueryResultResource(BaseResource):
         :param number query_id: The ID of the query whose results should be fetched
         :param number query_result_id: the ID of the query result to fetch
         :param string filetype: Format to return. One of 'json', 'xlsx', or 'csv'. Defaults to 'json'.
+        :qparam number offset: Index of the first row to return (JSON only)
+        :qparam number limit: Maximum number of rows to return (JSON only)
+        :qparam string columns: Comma separated names of the columns to return (JSON only)
 
         :<json number id: Query result ID
         :<json string query: Query that produced this result
@@ -425,22 +437,42 @@ class QueryResultResource(BaseResource):
 
     @staticmethod
     def make_json_response(query_result):
-        data = json_dumps({"query_result": query_result.to_dict()})
+        offset = request.args.get("offset", 0, type=int)
+        limit = request.args.get("limit", None, type=int)
+        columns = request.args.get("columns")
+
+        if offset < 0 or (limit is not None and limit < 0):
+            abort(400, message="offset and limit must be non-negative integers.")
+
+        if columns is not None:
+            columns = [name for name in columns.split(",") if name]
+
+        data = json_dumps(
+            {"query_result": query_result.to_dict(offset, limit, columns)}
+        )
         headers = {"Content-Type": "application/json"}
         return make_response(data, 200, headers)
 
     @staticmethod
     def make_csv_response(query_result):
         headers = {"Content-Type": "text/csv; charset=UTF-8"}
-        return make_response(
-            serialize_query_result_to_dsv(query_result, ","), 200, headers
+        return Response(
+            stream_with_context(
+                serialize_query_result_to_dsv_stream(query_result, ",")
+            ),
+            200,
+            headers,
         )
 
     @staticmethod
     def make_tsv_response(query_result):
         headers = {"Content-Type": "text/tab-separated-values; charset=UTF-8"}
-        return make_response(
-            serialize_query_result_to_dsv(query_result, "\t"), 200, headers
+        return Response(
+            stream_with_context(
+                serialize_query_result_to_dsv_stream(query_result, "\t")
+            ),
+            200,
+            headers,
         )
 
     @staticmethod
@@ -448,7 +480,11 @@ class QueryResultResource(BaseResource):
         headers = {
             "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         }
-        return make_response(serialize_query_result_to_xlsx(query_result), 200, headers)
+        return Response(
+            stream_with_context(serialize_query_result_to_xlsx_stream(query_result)),
+            200,
+            headers,
+        )
 
 
 class JobResource(BaseResource):
@@ -1,15 +1,28 @@
 import datetime
 import calendar
+import io
+import itertools
 import logging
 import time
 import numbers
+import sys
+import zlib
 import pytz
 
-from sqlalchemy import distinct, or_, and_, UniqueConstraint, cast
+from sqlalchemy import distinct, or_, and_, UniqueConstraint, bindparam, cast
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import backref, contains_eager, joinedload, subqueryload, load_only
+from sqlalchemy.orm import (
+    backref,
+    contains_eager,
+    defer,
+    joinedload,
+    subqueryload,
+    load_only,
+)
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.orm.exc import NoResultFound  # noqa: F401
 from sqlalchemy import func
 from sqlalchemy_utils import generic_relationship
@@ -32,6 +45,7 @@ from redash.query_runner import (
     TYPE_DATETIME,
     BaseQueryRunner)
 from redash.utils import (
+    columnar,
     generate_token,
     json_dumps,
     json_loads,
@@ -40,12 +54,16 @@ from redash.utils import (
     sentry,
     gen_query_hash)
 from redash.utils.configuration import ConfigurationContainer
+from redash.utils.lru import LRUCache
+from redash.utils.result_limits import ResultSizeGuard
 from redash.models.parameterized_query import ParameterizedQuery
 
 from .base import db, gfk_type, Column, GFKBase, SearchBaseQuery, key_type, primary_key
 from .changes import ChangeTrackingMixin, Change  # noqa
 from .mixins import BelongsToOrgMixin, TimestampMixin
 from .organizations import Organization
+from .permissions_cache import permissions_cache  # noqa
+from .results_cache import results_cache  # noqa
 from .types import (
     EncryptedConfiguration,
     Configuration,
@@ -65,8 +83,19 @@ class ScheduledQueriesExecutions(object):
     def __init__(self):
         self.executions = {}
 
-    def refresh(self):
-        self.executions = redis_connection.hgetall(self.KEY_NAME)
+    def refresh(self, query_ids=None):
+        if query_ids is None:
+            self.executions = redis_connection.hgetall(self.KEY_NAME)
+        elif not query_ids:
+            self.executions = {}
+        else:
+            fields = [str(query_id) for query_id in query_ids]
+            timestamps = redis_connection.hmget(self.KEY_NAME, fields)
+            self.executions = {
+                field: timestamp
+                for field, timestamp in zip(fields, timestamps)
+                if timestamp is not None
+            }
 
     def update(self, query_id):
         redis_connection.hmset(self.KEY_NAME, {query_id: time.time()})
@@ -223,9 +252,13 @@ class DataSource(BelongsToOrgMixin, db.Model):
     def _schema_key(self):
         return "data_source:schema:{}".format(self.id)
 
+    @staticmethod
+    def pause_key_for(data_source_id):
+        return "ds:{}:pause".format(data_source_id)
+
     @property
     def _pause_key(self):
-        return "ds:{}:pause".format(self.id)
+        return self.pause_key_for(self.id)
 
     @property
     def paused(self):
@@ -280,8 +313,14 @@ class DataSource(BelongsToOrgMixin, db.Model):
     # XXX examine call sites to see if a regular SQLA collection would work better
     @property
     def groups(self):
-        groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
-        return dict([(group.group_id, group.view_only) for group in groups])
+        def load():
+            groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
+            return dict([(group.group_id, group.view_only) for group in groups])
+
+        if self.id is None:
+            return load()
+
+        return permissions_cache.data_source_groups(self.id, load)
 
 
 @generic_repr("id", "data_source_id", "group_id", "view_only")
@@ -297,17 +336,94 @@ class DataSourceGroup(db.Model):
     __tablename__ = "data_source_groups"
 
 
+PERMISSIONS_CHANGED = "permissions_changed"
+
+
+@listens_for(db.session, "after_flush")
+def track_permission_changes(session, flush_context):
+    changed = itertools.chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, (Group, DataSourceGroup)) for obj in changed):
+        session.info[PERMISSIONS_CHANGED] = True
+
+
+@listens_for(db.session, "after_bulk_delete")
+@listens_for(db.session, "after_bulk_update")
+def track_permission_changes_on_bulk_change(context):
+    if context.mapper.class_ in (Group, DataSourceGroup):
+        context.session.info[PERMISSIONS_CHANGED] = True
+
+
+@listens_for(db.session, "after_commit")
+def invalidate_permissions_cache(session):
+    # Only once the changes are committed: a request reloading the groups
+    # before that would cache the old ones under the new generation.
+    if session.info.pop(PERMISSIONS_CHANGED, False):
+        permissions_cache.invalidate()
+
+
 DESERIALIZED_DATA_ATTR = "_deserialized_data"
 
+# Query results never change once stored, so decoded data can be shared by
+# every request handled by this process.
+decoded_results = LRUCache(
+    settings.QUERY_RESULTS_CACHE_SIZE, metrics_prefix="query_results.cache"
+)
+# How many rows of a result are measured to estimate the size of all of them.
+DECODED_SIZE_SAMPLE_ROWS = 100
+
+
+def _decoded_value_size(value):
+    # Keys aren't counted: decoders share them between rows.
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_decoded_value_size(v) for v in value.values())
+    elif isinstance(value, list):
+        size += sum(_decoded_value_size(v) for v in value)
+    return size
+
+
+def decoded_size(data):
+    """Estimates the memory taken by decoded result data, extrapolating the
+    size of its rows from a sample of them. It's several times the size of
+    the stored data, which is compact text or even compressed."""
+    rows = data.get("rows") if isinstance(data, dict) else None
+    if not isinstance(rows, list):
+        return _decoded_value_size(data)
+
+    sample = rows[:DECODED_SIZE_SAMPLE_ROWS]
+    rows_size = sys.getsizeof(rows)
+    if sample:
+        sample_size = sum(_decoded_value_size(row) for row in sample)
+        rows_size += sample_size * len(rows) // len(sample)
+
+    return (
+        sys.getsizeof(data)
+        + rows_size
+        + sum(_decoded_value_size(v) for k, v in data.items() if k != "rows")
+    )
+
 
 class DBPersistence(object):
+    _columnar_data = None
+
     @property
     def data(self):
-        if self._data is None:
-            return None
-
         if not hasattr(self, DESERIALIZED_DATA_ATTR):
-            setattr(self, DESERIALIZED_DATA_ATTR, json_loads(self._data))
+            result_id = getattr(self, "id", None)
+            data = decoded_results.get(result_id) if result_id is not None else None
+
+            if data is None:
+                if self._data is not None:
+                    data = json_loads(self._data)
+                elif self._columnar_data is not None:
+                    data = columnar.deserialize(self._columnar_data)
+                else:
+                    return None
+
+                if result_id is not None and decoded_results.enabled:
+                    decoded_results.set(result_id, data, decoded_size(data))
+
+            setattr(self, DESERIALIZED_DATA_ATTR, data)
 
         return self._deserialized_data
 
@@ -315,7 +431,96 @@ class DBPersistence(object):
     def data(self, data):
         if hasattr(self, DESERIALIZED_DATA_ATTR):
             delattr(self, DESERIALIZED_DATA_ATTR)
+        if getattr(self, "id", None) is not None:
+            decoded_results.delete(self.id)
+
+        if columnar.is_columnar(data):
+            self._data = None
+            self._columnar_data = data
+            return
+
         self._data = data
+        self._columnar_data = None
+
+        if data and settings.QUERY_RESULTS_STORAGE_FORMAT == "columnar":
+            try:
+                self._columnar_data = columnar.serialize(json_loads(data))
+                self._data = None
+            except columnar.UnsupportedResultError:
+                logger.debug("Result can't be stored as columnar data, using JSON.")
+
+    @staticmethod
+    def encode_rows(columns, row_batches, encoder=None, guard=None):
+        """Encodes a result given as its columns and an iterable of row lists
+        into the stored format, one batch at a time. The returned value can be
+        assigned to `data`.
+
+        When `guard` (a ResultSizeGuard) trims a batch, the remaining batches
+        aren't consumed and the result is flagged as truncated."""
+        dumps_kwargs = {"cls": encoder} if encoder else {}
+        guard = guard or ResultSizeGuard(**dumps_kwargs)
+
+        if settings.QUERY_RESULTS_STORAGE_FORMAT == "columnar":
+            writer = columnar.ColumnarWriter(columns, **dumps_kwargs)
+            for rows in row_batches:
+                rows, _ = guard.admit(rows)
+                writer.write(rows)
+                if guard.truncated:
+                    break
+            return writer.finish({"truncated": True} if guard.truncated else None)
+
+        output = io.StringIO()
+        output.write('{"columns": %s, "rows": [' % json_dumps(columns))
+        separator = ""
+        for rows in row_batches:
+            rows, encoded = guard.admit(rows)
+            if rows:
+                output.write(separator)
+                output.write(encoded or json_dumps(rows, **dumps_kwargs)[1:-1])
+                separator = ", "
+            if guard.truncated:
+                break
+        output.write('], "truncated": true}' if guard.truncated else "]}")
+        return output.getvalue()
+
+    def iter_data(self):
+        """Returns the result's columns and an iterator over its rows. Columnar
+        results are decoded a block at a time instead of all at once."""
+        if self._columnar_data is not None and not hasattr(
+            self, DESERIALIZED_DATA_ATTR
+        ):
+            reader = columnar.ColumnarReader(self._columnar_data)
+            return reader.columns, reader.iter_rows()
+
+        data = self.data or {}
+        return data.get("columns"), iter(data.get("rows") or [])
+
+    def read_data(self, offset=0, limit=None, columns=None):
+        """Returns `limit` rows starting at `offset`, with only the given columns,
+        and the result's total row count. Columnar results only decode the
+        blocks holding the requested rows and columns."""
+        if self._columnar_data is not None and not hasattr(
+            self, DESERIALIZED_DATA_ATTR
+        ):
+            reader = columnar.ColumnarReader(self._columnar_data)
+            return reader.read(offset, limit, columns), reader.row_count
+
+        data = dict(self.data or {})
+        rows = data.get("rows") or []
+        end = None if limit is None else offset + limit
+        data["rows"] = rows[offset:end]
+
+        if columns is not None:
+            wanted = set(columns)
+            data["columns"] = [
+                column for column in data.get("columns") or [] if column["name"] in wanted
+            ]
+            data["rows"] = [
+                {name: value for name, value in row.items() if name in wanted}
+                for row in data["rows"]
+            ]
+
+        return data, len(rows)
 
 
 QueryResultPersistence = (
@@ -332,7 +537,8 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
     data_source = db.relationship(DataSource, backref=backref("query_results"))
     query_hash = Column(db.String(32), index=True)
     query_text = Column("query", db.Text)
-    _data = Column("data", db.Text)
+    _data = Column("data", db.Text, nullable=True)
+    _columnar_data = Column("columnar_data", db.LargeBinary, nullable=True)
     runtime = Column(postgresql.DOUBLE_PRECISION)
     retrieved_at = Column(db.DateTime(True))
 
@@ -341,12 +547,28 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
     def __str__(self):
         return "%d | %s | %s" % (self.id, self.query_hash, self.retrieved_at)
 
-    def to_dict(self):
+    @classmethod
+    def get_by_id_and_org(cls, object_id, org):
+        # The data columns are only read when accessed, so results already
+        # decoded by this process don't load them at all.
+        return (
+            cls.query.options(defer(cls._data), defer(cls._columnar_data))
+            .filter(cls.id == object_id, cls.org == org)
+            .one()
+        )
+
+    def to_dict(self, offset=0, limit=None, columns=None):
+        if offset or limit is not None or columns is not None:
+            data, row_count = self.read_data(offset, limit, columns)
+            data["row_count"] = row_count
+        else:
+            data = self.data
+
         return {
             "id": self.id,
             "query_hash": self.query_hash,
             "query": self.query_text,
-            "data": self.data,
+            "data": data,
             "data_source_id": self.data_source_id,
             "runtime": self.runtime,
             "retrieved_at": self.retrieved_at,
@@ -406,14 +628,52 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
         return self.data_source.groups
 
 
-def should_schedule_next(
-    previous_iteration, now, interval, time=None, day_of_week=None, failures=0
+def schedule_offset(seed, window):
+    """Returns a number of seconds within `window`, always the same for
+    `seed`, by which a query's scheduled runs are delayed when spread."""
+    return zlib.crc32(str(seed).encode()) % int(window)
+
+
+def _spread_interval_run(previous_iteration, ttl, offset):
+    # Runs happen every `ttl` seconds, `offset` seconds after the start of
+    # each period. The next one is the first that comes at least half an
+    # interval after the previous run, so the interval is kept on average
+    # even though runs don't happen exactly at the offset.
+    earliest = previous_iteration + datetime.timedelta(seconds=ttl / 2)
+    earliest_ts = calendar.timegm(earliest.utctimetuple())
+    slot = (earliest_ts - offset) // ttl * ttl + offset
+    if slot < earliest_ts:
+        slot += ttl
+    return earliest.replace(microsecond=0) + datetime.timedelta(
+        seconds=slot - earliest_ts
+    )
+
+
+def next_scheduled_run(
+    previous_iteration,
+    interval,
+    time=None,
+    day_of_week=None,
+    failures=0,
+    spread=0,
+    seed=None,
 ):
+    """
+    Returns when the next run of a schedule is due. With a `spread` window (in
+    seconds), runs are delayed by an offset within the window that depends on
+    `seed` (the query id): schedules with a time run that much after it, and
+    interval schedules that much after the start of each interval instead of
+    an interval after their previous run.
+    """
     # if time exists then interval > 23 hours (82800s)
     # if day_of_week exists then interval > 6 days (518400s)
     if time is None:
         ttl = int(interval)
-        next_iteration = previous_iteration + datetime.timedelta(seconds=ttl)
+        if spread and ttl > 0:
+            offset = schedule_offset(seed, min(spread, ttl))
+            next_iteration = _spread_interval_run(previous_iteration, ttl, offset)
+        else:
+            next_iteration = previous_iteration + datetime.timedelta(seconds=ttl)
     else:
         hour, minute = time.split(":")
         hour, minute = int(hour), int(minute)
@@ -445,12 +705,37 @@ def should_schedule_next(
             + datetime.timedelta(days=days_delay)
             + datetime.timedelta(days=days_to_add)
         ).replace(hour=hour, minute=minute)
+        if spread:
+            offset = schedule_offset(seed, min(spread, int(interval)))
+            next_iteration = next_iteration.replace(second=0, microsecond=0)
+            next_iteration += datetime.timedelta(seconds=offset)
     if failures:
         try:
             next_iteration += datetime.timedelta(minutes=2 ** failures)
         except OverflowError:
-            return False
-    return now > next_iteration
+            return None
+    return next_iteration
+
+
+# Next run of schedules that won't run again until they, the query's failures
+# count or its results change.
+SCHEDULE_NEVER = pytz.utc.localize(datetime.datetime(9999, 1, 1))
+
+
+def should_schedule_next(
+    previous_iteration,
+    now,
+    interval,
+    time=None,
+    day_of_week=None,
+    failures=0,
+    spread=0,
+    seed=None,
+):
+    next_iteration = next_scheduled_run(
+        previous_iteration, interval, time, day_of_week, failures, spread, seed
+    )
+    return next_iteration is not None and now > next_iteration
 
 
 @gfk_type
@@ -496,6 +781,9 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
     schedule = Column(MutableDict.as_mutable(PseudoJSON), nullable=True)
     interval = pseudo_json_cast_property(db.Integer, "schedule", "interval", default=0)
     schedule_failures = Column(db.Integer, default=0)
+    # When the scheduler should next look at this query. NULL means it has to
+    # be (re)computed, which happens on the next scheduler tick.
+    schedule_next_run_at = Column(db.DateTime(True), nullable=True, index=True)
     visualizations = db.relationship("Visualization", cascade="all, delete-orphan")
     options = Column(MutableDict.as_mutable(PseudoJSON), default={})
     search_vector = Column(
@@ -514,6 +802,9 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     query_class = SearchBaseQuery
     __tablename__ = "queries"
+    __table_args__ = (
+        db.Index("queries_query_hash_data_source_id", "query_hash", "data_source_id"),
+    )
     __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
     def __str__(self):
@@ -637,60 +928,144 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def outdated_queries(cls):
-        queries = (
-            Query.query.options(
-                joinedload(Query.latest_query_data).load_only("retrieved_at")
+        # Only queries whose indexed next run has passed, or whose index entry
+        # was reset by a change to their schedule or results, need a look.
+        now = utils.utcnow()
+        schedules = (
+            db.session.query(
+                Query.id,
+                Query.query_hash,
+                Query.data_source_id,
+                Query.schedule,
+                Query.schedule_failures,
+                Query.schedule_next_run_at,
+                QueryResult.retrieved_at,
             )
+            .outerjoin(QueryResult, Query.latest_query_data_id == QueryResult.id)
             .filter(Query.schedule.isnot(None))
+            .filter(
+                or_(
+                    Query.schedule_next_run_at.is_(None),
+                    Query.schedule_next_run_at <= now,
+                )
+            )
             .order_by(Query.id)
             .all()
         )
 
-        now = utils.utcnow()
-        outdated_queries = {}
-        scheduled_queries_executions.refresh()
-
-        for query in queries:
+        outdated_query_ids = {}
+        next_runs = {}
+        failures = {}
+        scheduled_queries_executions.refresh([row.id for row in schedules])
+
+        for (
+            query_id,
+            query_hash,
+            data_source_id,
+            schedule,
+            schedule_failures,
+            schedule_next_run_at,
+            latest_retrieved_at,
+        ) in schedules:
             try:
-                if query.schedule.get("disabled"):
+                next_run_at = cls._next_run(
+                    query_id, schedule, schedule_failures, latest_retrieved_at, now
+                )
+
+                if next_run_at is not None and now > next_run_at:
+                    key = "{}:{}".format(query_hash, data_source_id)
+                    outdated_query_ids[key] = query_id
                     continue
 
-                if query.schedule["until"]:
-                    schedule_until = pytz.utc.localize(
-                        datetime.datetime.strptime(query.schedule["until"], "%Y-%m-%d")
-                    )
+                # Schedules that won't run again are indexed as such, so they
+                # aren't looked at on every tick.
+                next_run_at = next_run_at or SCHEDULE_NEVER
+                if next_run_at != schedule_next_run_at:
+                    next_runs[query_id] = next_run_at
+            except Exception as e:
+                failures[query_id] = e
+
+        if next_runs:
+            cls._update_next_runs(next_runs)
 
-                    if schedule_until <= now:
-                        continue
+        if failures:
+            cls._disable_broken_schedules(failures)
 
-                retrieved_at = scheduled_queries_executions.get(query.id) or (
-                    query.latest_query_data and query.latest_query_data.retrieved_at
-                )
+        if not outdated_query_ids:
+            return []
 
-                if should_schedule_next(
-                    retrieved_at or now,
-                    now,
-                    query.schedule["interval"],
-                    query.schedule["time"],
-                    query.schedule["day_of_week"],
-                    query.schedule_failures,
-                ):
-                    key = "{}:{}".format(query.query_hash, query.data_source_id)
-                    outdated_queries[key] = query
-            except Exception as e:
-                query.schedule["disabled"] = True
-                db.session.commit()
+        return (
+            Query.query.options(
+                joinedload(Query.org),
+                joinedload(Query.data_source),
+                joinedload(Query.latest_query_data).load_only("retrieved_at"),
+            )
+            .filter(Query.id.in_(list(outdated_query_ids.values())))
+            .order_by(Query.id)
+            .all()
+        )
 
-                message = (
-                    "Could not determine if query %d is outdated due to %s. The schedule for this query has been disabled."
-                    % (query.id, repr(e))
-                )
-                logging.info(message)
-                sentry.capture_exception(
-                    type(e)(message).with_traceback(e.__traceback__)
-                )
+    @staticmethod
+    def _next_run(query_id, schedule, schedule_failures, latest_retrieved_at, now):
+        # Returns None for schedules that won't run again.
+        if schedule.get("disabled"):
+            return None
+
+        if schedule["until"]:
+            schedule_until = pytz.utc.localize(
+                datetime.datetime.strptime(schedule["until"], "%Y-%m-%d")
+            )
+
+            if schedule_until <= now:
+                return None
+
+        retrieved_at = scheduled_queries_executions.get(query_id) or latest_retrieved_at
+
+        return next_scheduled_run(
+            retrieved_at or now,
+            schedule["interval"],
+            schedule["time"],
+            schedule["day_of_week"],
+            schedule_failures,
+            settings.SCHEDULED_QUERIES_SPREAD,
+            query_id,
+        )
+
+    @classmethod
+    def _update_next_runs(cls, next_runs):
+        # Written with a plain UPDATE so indexing doesn't bump updated_at or
+        # the query version. Copies already loaded in the session are kept in
+        # sync, so that resetting them later is noticed by the ORM.
+        db.session.execute(
+            Query.__table__.update()
+            .where(Query.__table__.c.id == bindparam("query_id"))
+            .values(schedule_next_run_at=bindparam("next_run_at")),
+            [
+                {"query_id": query_id, "next_run_at": next_run_at}
+                for query_id, next_run_at in next_runs.items()
+            ],
+        )
+        db.session.commit()
+
+        for query_id, next_run_at in next_runs.items():
+            query = db.session.identity_map.get(identity_key(Query, query_id))
+            if query is not None:
+                set_committed_value(query, "schedule_next_run_at", next_run_at)
 
-        return list(outdated_queries.values())
+    @classmethod
+    def _disable_broken_schedules(cls, failures):
+        for query in Query.query.filter(Query.id.in_(list(failures.keys()))):
+            query.schedule["disabled"] = True
+            e = failures[query.id]
+
+            message = (
+                "Could not determine if query %d is outdated due to %s. The schedule for this query has been disabled."
+                % (query.id, repr(e))
+            )
+            logging.info(message)
+            sentry.capture_exception(type(e)(message).with_traceback(e.__traceback__))
+
+        db.session.commit()
 
     @classmethod
     def search(
@@ -772,19 +1147,32 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def update_latest_result(cls, query_result):
-        # TODO: Investigate how big an impact this select-before-update makes.
-        queries = Query.query.filter(
-            Query.query_hash == query_result.query_hash,
-            Query.data_source == query_result.data_source,
-        )
+        # A single UPDATE (served by the query_hash/data_source_id index)
+        # instead of loading and saving every matching query. Like the
+        # listener on latest_query_data would, it resets schedule_next_run_at,
+        # and it leaves updated_at and the query version alone.
+        db.session.flush()
+        queries = Query.__table__
+        query_ids = [
+            row[0]
+            for row in db.session.execute(
+                queries.update()
+                .where(queries.c.query_hash == query_result.query_hash)
+                .where(queries.c.data_source_id == query_result.data_source_id)
+                .values(
+                    latest_query_data_id=query_result.id, schedule_next_run_at=None
+                )
+                .returning(queries.c.id)
+            )
+        ]
 
-        for q in queries:
-            q.latest_query_data = query_result
-            # don't auto-update the updated_at timestamp
-            q.skip_updated_at = True
-            db.session.add(q)
+        for query_id in query_ids:
+            query = db.session.identity_map.get(identity_key(Query, query_id))
+            if query is not None:
+                set_committed_value(query, "latest_query_data_id", query_result.id)
+                set_committed_value(query, "latest_query_data", query_result)
+                set_committed_value(query, "schedule_next_run_at", None)
 
-        query_ids = [q.id for q in queries]
         logging.info(
             "Updated %s queries with result (%s).",
             len(query_ids),
@@ -886,6 +1274,20 @@ def query_last_modified_by(target, val, oldval, initiator):
     target.last_modified_by_id = val
 
 
+@listens_for(Query.schedule, "set")
+@listens_for(Query.schedule_failures, "set")
+@listens_for(Query.latest_query_data, "set")
+@listens_for(Query.latest_query_data_id, "set")
+def reset_schedule_next_run(target, val, oldval, initiator):
+    target.schedule_next_run_at = None
+
+
+@listens_for(Query.schedule, "modified")
+def reset_schedule_next_run_on_change(target, initiator):
+    # The schedule was changed in place (or flagged as modified).
+    target.schedule_next_run_at = None
+
+
 @generic_repr("id", "object_type", "object_id", "user_id", "org_id")
 class Favorite(TimestampMixin, db.Model):
     id = primary_key("Favorite")
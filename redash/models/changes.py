@@ -1,3 +1,4 @@
+from sqlalchemy import select
 from sqlalchemy.inspection import inspect
 from sqlalchemy_utils.models import generic_repr
 
@@ -47,6 +48,25 @@ class Change(GFKBase, db.Model):
         )
 
 
+_tracked_columns = {}
+# Stands for the previous value of columns that weren't loaded when assigned.
+_UNLOADED = object()
+
+
+def tracked_columns(cls):
+    """Returns the column attributes of `cls`, as a dict of attribute name to
+    column name (they differ for e.g. Query.query_text)."""
+    columns = _tracked_columns.get(cls)
+    if columns is None:
+        columns = {}
+        for attr in inspect(cls).column_attrs:
+            (col,) = attr.columns
+            columns[attr.key] = col.name
+        _tracked_columns[cls] = columns
+
+    return columns
+
+
 class ChangeTrackingMixin(object):
     skipped_fields = ("id", "created_at", "updated_at", "version")
     _clean_values = None
@@ -55,35 +75,59 @@ class ChangeTrackingMixin(object):
         super(ChangeTrackingMixin, self).__init__(*a, **kw)
         self.record_changes(self.user)
 
-    def prep_cleanvalues(self):
-        self.__dict__["_clean_values"] = {}
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            # 'query' is col name but not attr name
-            self._clean_values[col.name] = None
-
     def __setattr__(self, key, value):
-        if self._clean_values is None:
-            self.prep_cleanvalues()
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            previous = getattr(self, attr.key, None)
-            self._clean_values[col.name] = previous
+        column_name = tracked_columns(self.__class__).get(key)
+
+        if column_name is not None:
+            if self._clean_values is None:
+                self.__dict__["_clean_values"] = {}
+
+            # Remember each column's value from before its first assignment
+            # since the last recorded change. Only loaded values are looked
+            # at, so assignments never load deferred or expired columns; those
+            # are read when the change is recorded.
+            if column_name not in self._clean_values:
+                self._clean_values[column_name] = self.__dict__.get(key, _UNLOADED)
 
         super(ChangeTrackingMixin, self).__setattr__(key, value)
 
+    def _clean_values_with_unloaded(self):
+        clean_values = dict(self._clean_values or {})
+        unloaded = [name for name, value in clean_values.items() if value is _UNLOADED]
+        if not unloaded:
+            return clean_values
+
+        committed = {}
+        if inspect(self).has_identity:
+            table = self.__table__
+            with db.session.no_autoflush:
+                row = db.session.execute(
+                    select([table.c[name] for name in unloaded]).where(
+                        table.c.id == self.id
+                    )
+                ).first()
+            if row is not None:
+                committed = dict(zip(unloaded, row))
+
+        for name in unloaded:
+            clean_values[name] = committed.get(name)
+        return clean_values
+
     def record_changes(self, changed_by):
+        # Read before flushing, while the database still has the old values.
+        clean_values = self._clean_values_with_unloaded()
         db.session.add(self)
         db.session.flush()
         changes = {}
-        for attr in inspect(self.__class__).column_attrs:
-            (col,) = attr.columns
-            if attr.key not in self.skipped_fields:
-                changes[col.name] = {
-                    "previous": self._clean_values[col.name],
-                    "current": getattr(self, attr.key),
+        for key, column_name in tracked_columns(self.__class__).items():
+            if key not in self.skipped_fields:
+                current = getattr(self, key)
+                changes[column_name] = {
+                    "previous": clean_values.get(column_name, current),
+                    "current": current,
                 }
 
+        self.__dict__["_clean_values"] = {}
         db.session.add(
             Change(
                 object=self,
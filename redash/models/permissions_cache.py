@@ -0,0 +1,105 @@
+"""
+Cache of what authorization checks read on almost every request: the
+permissions granted by a set of groups, and the groups a data source is
+shared with. Values are kept for the duration of a request and in Redis
+across requests. Redis keys include a generation number that is bumped
+whenever groups or data source grants change, so outdated entries are never
+read again and just expire.
+"""
+import logging
+
+import redis
+from flask import g, has_request_context
+
+from redash import redis_connection, settings
+from redash.utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionsCache(object):
+    GENERATION_KEY = "permissions_cache:generation"
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @staticmethod
+    def _request_cache():
+        if not has_request_context():
+            return None
+
+        if "permissions_cache" not in g:
+            g.permissions_cache = {}
+        return g.permissions_cache
+
+    def _generation(self, request_cache):
+        if request_cache is not None and self.GENERATION_KEY in request_cache:
+            return request_cache[self.GENERATION_KEY]
+
+        generation = int(redis_connection.get(self.GENERATION_KEY) or 0)
+        if request_cache is not None:
+            request_cache[self.GENERATION_KEY] = generation
+        return generation
+
+    def _get_shared(self, name, load, request_cache):
+        try:
+            key = "permissions_cache:{}:{}".format(
+                self._generation(request_cache), name
+            )
+            cached = redis_connection.get(key)
+        except redis.RedisError:
+            logger.warning("Failed reading from the permissions cache.", exc_info=True)
+            return load()
+
+        if cached is not None:
+            return json_loads(cached)
+
+        value = load()
+        try:
+            redis_connection.set(key, json_dumps(value), ex=self.ttl)
+        except redis.RedisError:
+            logger.warning("Failed writing to the permissions cache.", exc_info=True)
+
+        return value
+
+    def _get(self, name, load):
+        request_cache = self._request_cache()
+        if request_cache is not None and name in request_cache:
+            return request_cache[name]
+
+        if self.ttl:
+            value = self._get_shared(name, load, request_cache)
+        else:
+            value = load()
+
+        if request_cache is not None:
+            request_cache[name] = value
+        return value
+
+    def group_permissions(self, group_ids, load):
+        """Returns the permissions granted by `group_ids`, calling `load` to
+        read them from the database when they aren't cached."""
+        name = "groups:{}".format(",".join(str(i) for i in sorted(set(group_ids))))
+        return self._get(name, load)
+
+    def data_source_groups(self, data_source_id, load):
+        """Returns a dict of group id to view_only flag for the groups the data
+        source is shared with, calling `load` when they aren't cached."""
+        # Stored as pairs, since JSON object keys can only be strings.
+        pairs = self._get(
+            "data_source:{}".format(data_source_id), lambda: list(load().items())
+        )
+        return dict(pairs)
+
+    def invalidate(self):
+        request_cache = self._request_cache()
+        if request_cache is not None:
+            request_cache.clear()
+
+        try:
+            redis_connection.incr(self.GENERATION_KEY)
+        except redis.RedisError:
+            logger.warning("Failed invalidating the permissions cache.", exc_info=True)
+
+
+permissions_cache = PermissionsCache(settings.PERMISSIONS_CACHE_TTL)
@@ -0,0 +1,129 @@
+"""
+Optional Redis tier holding the latest result of each (data source, query
+hash) pair, so fresh results can be served by any web worker without reading
+query_results from the database. Entries are compressed JSON copies of
+QueryResult.to_dict().
+"""
+import logging
+import time
+import zlib
+
+import redis
+
+from redash import settings, statsd_client
+from redash.utils import columnar, json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+# JSON result data rarely compresses to less than a fifth of its size.
+JSON_COMPRESSION_RATIO = 5
+
+
+def _estimated_payload_size(query_result):
+    # Estimated from the stored data, before it's decoded for the cache.
+    # Columnar data is compressed already.
+    if query_result._columnar_data is not None:
+        return len(query_result._columnar_data)
+    return len(query_result._data or "") // JSON_COMPRESSION_RATIO
+
+
+def _is_truncated(query_result):
+    # Truncated results are flagged last (see QueryResult.encode_rows), so
+    # that's checked without decoding their rows.
+    if query_result._columnar_data is not None:
+        reader = columnar.ColumnarReader(query_result._columnar_data)
+        return bool(reader.extra.get("truncated"))
+    return (query_result._data or "").rstrip().endswith('"truncated": true}')
+
+
+class SharedResultsCache(object):
+    def __init__(self, enabled, url, ttl, max_size):
+        self.enabled = enabled
+        self.url = url
+        self.ttl = ttl
+        self.max_size = max_size
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = redis.from_url(self.url)
+        return self._connection
+
+    @staticmethod
+    def key(data_source_id, query_hash):
+        return "query_results:latest:{}:{}".format(data_source_id, query_hash)
+
+    def get(self, data_source_id, query_hash, max_age):
+        """Returns the cached result dict if it's at most `max_age` seconds old
+        (any age for -1), otherwise None."""
+        if not self.enabled or max_age == 0:
+            return None
+
+        try:
+            payload = self.connection.get(self.key(data_source_id, query_hash))
+        except redis.RedisError:
+            logger.warning("Failed reading from the results cache.", exc_info=True)
+            payload = None
+
+        entry = None
+        if payload:
+            try:
+                entry = json_loads(zlib.decompress(payload).decode("utf-8"))
+            except (zlib.error, ValueError):
+                logger.warning("Failed decoding a results cache entry.", exc_info=True)
+
+        if entry is None or (
+            max_age != -1 and entry["retrieved_at"] + max_age < time.time()
+        ):
+            statsd_client.incr("query_results.shared_cache.miss")
+            return None
+
+        statsd_client.incr("query_results.shared_cache.hit")
+        return entry["query_result"]
+
+    def _cacheable(self, query_result):
+        # Results that are too large, or were cut short at the result limits
+        # (which are the large ones), aren't decoded at all.
+        return _estimated_payload_size(
+            query_result
+        ) <= self.max_size and not _is_truncated(query_result)
+
+    def set(self, query_result):
+        if not self.enabled:
+            return False
+
+        key = self.key(query_result.data_source_id, query_result.query_hash)
+        payload = None
+        if self._cacheable(query_result):
+            payload = zlib.compress(
+                json_dumps(
+                    {
+                        "retrieved_at": query_result.retrieved_at.timestamp(),
+                        "query_result": query_result.to_dict(),
+                    }
+                ).encode("utf-8"),
+                COMPRESSION_LEVEL,
+            )
+
+        try:
+            if payload is None or len(payload) > self.max_size:
+                # Don't leave an older result behind in place of this one
+                self.connection.delete(key)
+                return False
+
+            self.connection.set(key, payload, ex=self.ttl)
+        except redis.RedisError:
+            logger.warning("Failed writing to the results cache.", exc_info=True)
+            return False
+
+        return True
+
+
+results_cache = SharedResultsCache(
+    settings.QUERY_RESULTS_REDIS_CACHE_ENABLED,
+    settings.QUERY_RESULTS_REDIS_CACHE_URL,
+    settings.QUERY_RESULTS_REDIS_CACHE_TTL,
+    settings.QUERY_RESULTS_REDIS_CACHE_MAX_SIZE,
+)
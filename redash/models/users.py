@@ -19,6 +19,7 @@ from redash.utils import generate_token, utcnow, dt_from_timestamp
 
 from .base import db, Column, GFKBase, key_type, primary_key
 from .mixins import TimestampMixin, BelongsToOrgMixin
+from .permissions_cache import permissions_cache
 from .types import json_cast_property, MutableDict, MutableList
 
 logger = logging.getLogger(__name__)
@@ -180,15 +181,17 @@ class User(
 
     @property
     def permissions(self):
-        # TODO: this should be cached.
-        return list(
-            itertools.chain(
-                *[
-                    g.permissions
-                    for g in Group.query.filter(Group.id.in_(self.group_ids))
-                ]
+        def load():
+            return list(
+                itertools.chain(
+                    *[
+                        g.permissions
+                        for g in Group.query.filter(Group.id.in_(self.group_ids))
+                    ]
+                )
             )
-        )
+
+        return permissions_cache.group_permissions(self.group_ids, load)
 
     @classmethod
     def get_by_org(cls, org):
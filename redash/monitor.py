@@ -1,14 +1,19 @@
 from __future__ import absolute_import
 import itertools
+import time
 from funcy import flatten
 from sqlalchemy import union_all
 from redash import redis_connection, rq_redis_connection, __version__, settings
 from redash.models import db, DataSource, Query, QueryResult, Dashboard, Widget
-from redash.utils import json_loads
+from redash.utils import json_dumps, json_loads
 from rq import Queue, Worker
 from rq.job import Job
 from rq.registry import StartedJobRegistry
 
+STATUS_SNAPSHOT_KEY = "redash:status_snapshot"
+STATUS_DETAILS_KEY = "redash:status_details"
+RQ_STATUS_SNAPSHOT_KEY = "redash:rq_status_snapshot"
+
 
 def get_redis_status():
     info = redis_connection.info()
@@ -18,14 +23,29 @@ def get_redis_status():
     }
 
 
+def estimated_count(model):
+    """
+    Returns Postgres' estimate of the number of rows in the model's table,
+    which is kept up to date by (auto)vacuum and analyze and doesn't require
+    a scan. Tables that weren't analyzed yet are counted exactly.
+    """
+    estimate = db.session.execute(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)",
+        {"table": model.__tablename__},
+    ).scalar()
+    if not estimate or estimate < 0:
+        return model.query.count()
+    return estimate
+
+
 def get_object_counts():
     status = {}
-    status["queries_count"] = Query.query.count()
+    status["queries_count"] = estimated_count(Query)
     if settings.FEATURE_SHOW_QUERY_RESULTS_COUNT:
-        status["query_results_count"] = QueryResult.query.count()
+        status["query_results_count"] = estimated_count(QueryResult)
         status["unused_query_results_count"] = QueryResult.unused().count()
-    status["dashboards_count"] = Dashboard.query.count()
-    status["widgets_count"] = Widget.query.count()
+    status["dashboards_count"] = estimated_count(Dashboard)
+    status["widgets_count"] = estimated_count(Widget)
     return status
 
 
@@ -49,18 +69,46 @@ def get_db_sizes():
     return database_metrics
 
 
-def get_status():
+def get_status_details():
+    # The parts of the status that take counting rows or measuring tables.
+    status = get_object_counts()
+    status["database_metrics"] = {}
+    status["database_metrics"]["metrics"] = get_db_sizes()
+    return status
+
+
+def _get_status(details):
     status = {"version": __version__, "workers": []}
     status.update(get_redis_status())
-    status.update(get_object_counts())
+    status.update(details)
     status["manager"] = redis_connection.hgetall("redash:status")
     status["manager"]["queues"] = get_queues_status()
-    status["database_metrics"] = {}
-    status["database_metrics"]["metrics"] = get_db_sizes()
 
     return status
 
 
+def get_status():
+    return _get_status(get_status_details())
+
+
+def _cached_status_details():
+    # Those change slowly and are expensive to get, so they're only refreshed
+    # every STATUS_DETAILS_INTERVAL seconds.
+    details = redis_connection.get(STATUS_DETAILS_KEY)
+    if details is not None:
+        return json_loads(details)
+
+    details = get_status_details()
+    redis_connection.set(
+        STATUS_DETAILS_KEY, json_dumps(details), ex=settings.STATUS_DETAILS_INTERVAL
+    )
+    return details
+
+
+def get_snapshot_status():
+    return _get_status(_cached_status_details())
+
+
 def rq_job_ids():
     queues = Queue.all(connection=redis_connection)
 
@@ -92,7 +140,9 @@ def rq_queues():
             "started": fetch_jobs(StartedJobRegistry(queue=q).get_job_ids()),
             "queued": len(q.job_ids),
         }
-        for q in sorted(Queue.all(), key=lambda q: q.name)
+        for q in sorted(
+            Queue.all(connection=rq_redis_connection), key=lambda q: q.name
+        )
     }
 
 
@@ -115,9 +165,46 @@ def rq_workers():
             "failed_jobs": w.failed_job_count,
             "total_working_time": w.total_working_time,
         }
-        for w in Worker.all()
+        for w in Worker.all(connection=rq_redis_connection)
     ]
 
 
 def rq_status():
     return {"queues": rq_queues(), "workers": rq_workers()}
+
+
+def _store_snapshot(key, status):
+    status["updated_at"] = time.time()
+    snapshot = json_dumps(status)
+    # Kept for a few refresh intervals only, so a stopped scheduler doesn't
+    # leave an ever older snapshot around.
+    redis_connection.set(key, snapshot, ex=settings.STATUS_SNAPSHOT_INTERVAL * 5)
+    return snapshot
+
+
+def _get_snapshot(key, compute):
+    snapshot = redis_connection.get(key)
+    if snapshot is None:
+        snapshot = _store_snapshot(key, compute())
+
+    status = json_loads(snapshot)
+    status["age"] = max(time.time() - status["updated_at"], 0)
+    return status
+
+
+def refresh_status_snapshots():
+    _store_snapshot(STATUS_SNAPSHOT_KEY, get_snapshot_status())
+    _store_snapshot(RQ_STATUS_SNAPSHOT_KEY, rq_status())
+
+
+def get_status_snapshot():
+    """
+    Returns the status as of the last `refresh_status_snapshots` run, with its
+    `updated_at` time and `age` in seconds. It's computed on the spot when
+    there's no recent snapshot.
+    """
+    return _get_snapshot(STATUS_SNAPSHOT_KEY, get_snapshot_status)
+
+
+def get_rq_status_snapshot():
+    return _get_snapshot(RQ_STATUS_SNAPSHOT_KEY, rq_status)
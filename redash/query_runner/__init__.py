@@ -1,6 +1,10 @@
+import hashlib
 import logging
+import os
+import threading
+import time
 
-from contextlib import ExitStack
+from contextlib import contextmanager
 from dateutil import parser
 from functools import wraps
 import socket
@@ -10,7 +14,9 @@ from urllib.parse import urlparse
 from six import text_type
 from sshtunnel import open_tunnel
 from redash import settings, utils
-from redash.utils import json_loads
+from redash.utils import JSONEncoder, json_dumps, json_loads
+from redash.utils.configuration import ConfigurationContainer
+from redash.utils.connection_pool import ConnectionPool
 from rq.timeouts import JobTimeoutException
 
 from redash.utils.requests_session import requests_or_advocate, requests_session, UnacceptableAddressException
@@ -24,6 +30,7 @@ __all__ = [
     "BaseQueryRunner",
     "BaseHTTPQueryRunner",
     "InterruptException",
+    "QueryRunnerError",
     "JobTimeoutException",
     "BaseSQLQueryRunner",
     "TYPE_DATETIME",
@@ -37,6 +44,7 @@ __all__ = [
     "get_query_runner",
     "import_query_runners",
     "guess_type",
+    "connection_pool",
 ]
 
 # Valid types of columns returned in results:
@@ -51,6 +59,20 @@ SUPPORTED_COLUMN_TYPES = set(
     [TYPE_INTEGER, TYPE_FLOAT, TYPE_BOOLEAN, TYPE_STRING, TYPE_DATETIME, TYPE_DATE]
 )
 
+# Options every data source has on top of its runner's configuration, read by
+# dynamic_settings.query_result_limits and query_concurrency_limit.
+DATA_SOURCE_OPTIONS = {
+    "max_result_rows": {"type": "number", "title": "Max Result Rows"},
+    "max_result_bytes": {"type": "number", "title": "Max Result Size (Bytes)"},
+    "max_concurrent_queries": {"type": "number", "title": "Max Concurrent Queries"},
+}
+
+connection_pool = ConnectionPool(
+    settings.QUERY_RUNNER_POOL_MAX_IDLE,
+    settings.QUERY_RUNNER_POOL_IDLE_TIMEOUT,
+    metrics_prefix="query_runner.pool",
+)
+
 def split_sql_statements(query):
     def strip_trailing_comments(stmt):
         idx = len(stmt.tokens) - 1
@@ -115,12 +137,18 @@ class NotSupported(Exception):
     pass
 
 
+class QueryRunnerError(Exception):
+    pass
+
+
 class BaseQueryRunner(object):
     deprecated = False
     should_annotate_query = True
     noop_query = None
     limit_query = " LIMIT 1000"
     limit_keywords = [ "LIMIT", "OFFSET"]
+    result_encoder = JSONEncoder
+    stream_batch_size = 1000
 
     def __init__(self, configuration):
         self.syntax = "sql"
@@ -202,6 +230,19 @@ class BaseQueryRunner(object):
     def configuration_schema(cls):
         return {}
 
+    @classmethod
+    def full_configuration_schema(cls):
+        """The runner's configuration schema, with the options every data
+        source has (see `DATA_SOURCE_OPTIONS`)."""
+        schema = cls.configuration_schema()
+        if "properties" not in schema:
+            return schema
+
+        return {
+            **schema,
+            "properties": {**schema["properties"], **DATA_SOURCE_OPTIONS},
+        }
+
     def annotate_query(self, query, metadata):
         if not self.should_annotate_query:
             return query
@@ -221,6 +262,62 @@ class BaseQueryRunner(object):
     def run_query(self, query, user):
         raise NotImplementedError()
 
+    @property
+    def supports_streaming(self):
+        return False
+
+    def run_query_stream(self, query, user):
+        """Incremental counterpart of `run_query` for runners that can fetch
+        results a batch at a time. Yields the result's columns first and then
+        lists of up to `stream_batch_size` rows. Errors are raised as
+        QueryRunnerError."""
+        raise NotImplementedError()
+
+    # The ResultSizeGuard of the query being run, set by QueryExecutor. See
+    # `limit_rows`.
+    result_guard = None
+
+    def limit_rows(self, batches):
+        """For runners that can't stream: collects the rows of `batches` (an
+        iterable of lists of rows, fetched as it's consumed) until they're
+        over the limits of `result_guard`, when no more batches are fetched.
+        Returns the rows, and whether any were left out."""
+        rows = []
+        for batch in batches:
+            if self.result_guard is not None:
+                batch, _ = self.result_guard.admit(batch)
+            rows.extend(batch)
+            if self.result_guard is not None and self.result_guard.truncated:
+                return rows, True
+
+        return rows, False
+
+    def _run_query_from_stream(self, query, user):
+        try:
+            stream = self.run_query_stream(query, user)
+            columns = next(stream)
+            rows = [row for batch in stream for row in batch]
+        except QueryRunnerError as e:
+            return None, str(e)
+
+        data = {"columns": columns, "rows": rows}
+        return json_dumps(data, ignore_nan=True, cls=self.result_encoder), None
+
+    @property
+    def pools_connections(self):
+        """Whether connections of this data source are kept open and reused
+        by later jobs of the same worker (see `connection_pool`). Runners
+        supporting it offer a `pool_connections` option."""
+        return bool(self.configuration.get("pool_connections"))
+
+    def _connection_pool_key(self):
+        configuration = self.configuration
+        if isinstance(configuration, ConfigurationContainer):
+            configuration = configuration.to_dict()
+
+        digest = hashlib.sha1(json_dumps(configuration, sort_keys=True).encode("utf-8"))
+        return "{}:{}".format(self.type(), digest.hexdigest())
+
     def fetch_columns(self, columns):
         column_names = []
         duplicates_counter = 1
@@ -261,7 +358,7 @@ class BaseQueryRunner(object):
         return {
             "name": cls.name(),
             "type": cls.type(),
-            "configuration_schema": cls.configuration_schema(),
+            "configuration_schema": cls.full_configuration_schema(),
             **({"deprecated": True} if cls.deprecated else {}),
         }
 
@@ -374,12 +471,43 @@ class BaseHTTPQueryRunner(BaseQueryRunner):
         else:
             return None
 
+    # Set by QueryExecutor for jobs sharing the worker's memory with others
+    # (see RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES): larger responses are
+    # rejected instead of being read whole.
+    max_response_bytes = None
+
+    def _read_limited(self, response):
+        # Reads the body of a streamed response, unless it's larger than
+        # max_response_bytes. Returns an error when it is.
+        error = "Response is larger than the {} bytes limit.".format(
+            self.max_response_bytes
+        )
+        if int(response.headers.get("Content-Length") or 0) > self.max_response_bytes:
+            response.close()
+            return error
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_response_bytes:
+                response.close()
+                return error
+            chunks.append(chunk)
+
+        # Where requests keeps the body it read, for .text and .json().
+        response._content = b"".join(chunks)
+        return None
+
     def get_response(self, url, auth=None, http_method="get", **kwargs):
 
         # Get authentication values if not given
         if auth is None:
             auth = self.get_auth()
 
+        if self.max_response_bytes:
+            kwargs["stream"] = True
+
         # Then call requests to get the response from the given endpoint
         # URL optionally, with the additional requests parameters.
         error = None
@@ -394,6 +522,8 @@ class BaseHTTPQueryRunner(BaseQueryRunner):
             # Any other responses (e.g. 2xx and 3xx):
             if response.status_code != 200:
                 error = "{} ({}).".format(self.response_error, response.status_code)
+            elif self.max_response_bytes:
+                error = self._read_limited(response)
 
         except requests_or_advocate.HTTPError as exc:
             logger.exception(exc)
@@ -437,7 +567,25 @@ def get_query_runner(query_runner_type, configuration):
     if query_runner_class is None:
         return None
 
-    return query_runner_class(configuration)
+    return query_runner_class(runner_configuration(configuration))
+
+
+def runner_configuration(configuration):
+    """The data source options without `DATA_SOURCE_OPTIONS`, which are read
+    by Redash itself and mustn't reach runners passing their whole
+    configuration to a driver."""
+    if not any(key in configuration for key in DATA_SOURCE_OPTIONS):
+        return configuration
+
+    if isinstance(configuration, ConfigurationContainer):
+        config = configuration.to_dict()
+    else:
+        config = configuration
+
+    config = {k: v for k, v in config.items() if k not in DATA_SOURCE_OPTIONS}
+    if isinstance(configuration, ConfigurationContainer):
+        return ConfigurationContainer(config, configuration._schema)
+    return config
 
 
 def get_configuration_schema_for_query_runner_type(query_runner_type):
@@ -445,7 +593,7 @@ def get_configuration_schema_for_query_runner_type(query_runner_type):
     if query_runner_class is None:
         return None
 
-    return query_runner_class.configuration_schema()
+    return query_runner_class.full_configuration_schema()
 
 
 def import_query_runners(query_runner_imports):
@@ -492,44 +640,185 @@ def guess_type_from_string(string_value):
     return TYPE_STRING
 
 
+class SSHTunnelManager(object):
+    """Keeps the SSH tunnels of this process open between query executions,
+    so data sources behind a bastion only pay for the SSH negotiation once.
+    Tunnels whose transport went down are reopened on their next use, and
+    tunnels no execution used for `idle_timeout` seconds are closed. With an
+    `idle_timeout` of 0 every execution opens a tunnel of its own.
+
+    A forked work horse exits with the tunnels it opened, so they're only
+    reused by jobs of in-process or threaded queues and in the web process."""
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        # key -> [tunnel, number of executions using it, last time it was released]
+        self._tunnels = {}
+        self._lock = threading.Lock()
+        # tunnels of the parent process, see _after_fork
+        self._inherited = []
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Like ConnectionPool's: a forked process keeps the tunnels of its
+        # parent referenced, so they aren't stopped when collected, but opens
+        # its own.
+        self._inherited.append(self._tunnels)
+        self._tunnels = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _open(bastion_address, remote_address, auth):
+        try:
+            server = open_tunnel(
+                bastion_address, remote_bind_address=remote_address, **auth
+            )
+            server.start()
+        except Exception as error:
+            raise type(error)("SSH tunnel: {}".format(str(error)))
+
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.stop()
+        except Exception:
+            logger.debug("Failed closing SSH tunnel.", exc_info=True)
+
+    def _checkout(self, key, server=None):
+        # Returns the open tunnel for `key` (registering `server` as it when
+        # there's none), counting one more execution using it.
+        now = time.time()
+        stale = []
+
+        with self._lock:
+            for other_key, (other, users, released_at) in list(self._tunnels.items()):
+                if users == 0 and now - released_at > self.idle_timeout:
+                    stale.append(self._tunnels.pop(other_key)[0])
+
+            entry = self._tunnels.get(key)
+            if entry is not None and not (entry[0].is_active and entry[0].is_alive):
+                stale.append(self._tunnels.pop(key)[0])
+                entry = None
+
+            if entry is None and server is not None:
+                entry = self._tunnels[key] = [server, 0, now]
+                server = None
+
+            if entry is not None:
+                entry[1] += 1
+
+        # Another execution opened a tunnel to the same address meanwhile.
+        if server is not None:
+            stale.append(server)
+
+        for server in stale:
+            self._close(server)
+
+        return entry
+
+    def _acquire(self, key, bastion_address, remote_address, auth):
+        entry = self._checkout(key)
+        if entry is None:
+            # Opened without holding the lock, so that a slow bastion doesn't
+            # hold back executions using other tunnels.
+            server = self._open(bastion_address, remote_address, auth)
+            entry = self._checkout(key, server)
+
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry[1] -= 1
+            entry[2] = time.time()
+
+    @contextmanager
+    def tunnel(self, bastion_address, remote_address, auth):
+        """Yields a started tunnel from `bastion_address` to `remote_address`."""
+        if not self.idle_timeout:
+            server = self._open(bastion_address, remote_address, auth)
+            try:
+                yield server
+            finally:
+                self._close(server)
+            return
+
+        key = (bastion_address, remote_address, auth.get("ssh_username"))
+        entry = self._acquire(key, bastion_address, remote_address, auth)
+        try:
+            yield entry[0]
+        finally:
+            self._release(entry)
+
+    def clear(self):
+        with self._lock:
+            tunnels, self._tunnels = self._tunnels, {}
+
+        for server, _, _ in tunnels.values():
+            self._close(server)
+
+
+ssh_tunnels = SSHTunnelManager(settings.SSH_TUNNEL_IDLE_TIMEOUT)
+
+
 def with_ssh_tunnel(query_runner, details):
+    def tunnel_to_remote():
+        try:
+            remote_host, remote_port = query_runner.host, query_runner.port
+        except NotImplementedError:
+            raise NotImplementedError(
+                "SSH tunneling is not implemented for this query runner yet."
+            )
+
+        bastion_address = (details["ssh_host"], details.get("ssh_port", 22))
+        auth = {
+            "ssh_username": details["ssh_username"],
+            **settings.dynamic_settings.ssh_tunnel_auth(),
+        }
+        return (
+            (remote_host, remote_port),
+            ssh_tunnels.tunnel(bastion_address, (remote_host, remote_port), auth),
+        )
+
+    @contextmanager
+    def tunnel_open():
+        # Runners may implement run_query with run_query_stream, which then
+        # goes through the tunnel run_query already opened.
+        if getattr(query_runner, "_ssh_tunnel_open", False):
+            yield
+            return
+
+        remote_address, tunnel_context = tunnel_to_remote()
+
+        with tunnel_context as server:
+            query_runner._ssh_tunnel_open = True
+            try:
+                query_runner.host, query_runner.port = server.local_bind_address
+                yield
+            finally:
+                query_runner.host, query_runner.port = remote_address
+                query_runner._ssh_tunnel_open = False
+
     def tunnel(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            try:
-                remote_host, remote_port = query_runner.host, query_runner.port
-            except NotImplementedError:
-                raise NotImplementedError(
-                    "SSH tunneling is not implemented for this query runner yet."
-                )
+            with tunnel_open():
+                return f(*args, **kwargs)
 
-            stack = ExitStack()
-            try:
-                bastion_address = (details["ssh_host"], details.get("ssh_port", 22))
-                remote_address = (remote_host, remote_port)
-                auth = {
-                    "ssh_username": details["ssh_username"],
-                    **settings.dynamic_settings.ssh_tunnel_auth(),
-                }
-                server = stack.enter_context(
-                    open_tunnel(
-                        bastion_address, remote_bind_address=remote_address, **auth
-                    )
-                )
-            except Exception as error:
-                raise type(error)("SSH tunnel: {}".format(str(error)))
-
-            with stack:
-                try:
-                    query_runner.host, query_runner.port = server.local_bind_address
-                    result = f(*args, **kwargs)
-                finally:
-                    query_runner.host, query_runner.port = remote_host, remote_port
-
-                return result
+        return wrapper
+
+    def tunnel_stream(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with tunnel_open():
+                for item in f(*args, **kwargs):
+                    yield item
 
         return wrapper
 
     query_runner.run_query = tunnel(query_runner.run_query)
+    if query_runner.supports_streaming:
+        query_runner.run_query_stream = tunnel_stream(query_runner.run_query_stream)
 
     return query_runner
@@ -234,10 +234,13 @@ class Athena(BaseQueryRunner):
                 (i[0], _TYPE_MAPPINGS.get(i[1], None)) for i in cursor.description
             ]
             columns = self.fetch_columns(column_tuples)
-            rows = [
-                dict(zip(([c["name"] for c in columns]), r))
-                for i, r in enumerate(cursor.fetchall())
-            ]
+            column_names = [c["name"] for c in columns]
+            rows, truncated = self.limit_rows(
+                [dict(zip(column_names, r)) for r in batch]
+                for batch in iter(
+                    lambda: cursor.fetchmany(self.stream_batch_size), []
+                )
+            )
             qbytes = None
             athena_query_id = None
             try:
@@ -259,6 +262,8 @@ class Athena(BaseQueryRunner):
                     "query_cost": price * qbytes * 10e-12,
                 },
             }
+            if truncated:
+                data["truncated"] = True
 
             json_data = json_dumps(data, ignore_nan=True)
             error = None
@@ -210,24 +210,28 @@ class BigQuery(BaseQueryRunner):
 
         logger.debug("bigquery replied: %s", query_reply)
 
-        rows = []
+        def pages():
+            nonlocal current_row, query_reply
+            while ("rows" in query_reply) and current_row < int(
+                query_reply["totalRows"]
+            ):
+                fields = query_reply["schema"]["fields"]
+                yield [transform_row(row, fields) for row in query_reply["rows"]]
 
-        while ("rows" in query_reply) and current_row < int(query_reply["totalRows"]):
-            for row in query_reply["rows"]:
-                rows.append(transform_row(row, query_reply["schema"]["fields"]))
+                current_row += len(query_reply["rows"])
 
-            current_row += len(query_reply["rows"])
+                query_result_request = {
+                    "projectId": project_id,
+                    "jobId": query_reply["jobReference"]["jobId"],
+                    "startIndex": current_row,
+                }
 
-            query_result_request = {
-                "projectId": project_id,
-                "jobId": query_reply["jobReference"]["jobId"],
-                "startIndex": current_row,
-            }
+                if self._get_location():
+                    query_result_request["location"] = self._get_location()
 
-            if self._get_location():
-                query_result_request["location"] = self._get_location()
+                query_reply = jobs.getQueryResults(**query_result_request).execute()
 
-            query_reply = jobs.getQueryResults(**query_result_request).execute()
+        rows, truncated = self.limit_rows(pages())
 
         columns = [
             {
@@ -245,6 +249,8 @@ class BigQuery(BaseQueryRunner):
             "rows": rows,
             "metadata": {"data_scanned": _get_total_bytes_processed_for_resp(query_reply)},
         }
+        if truncated:
+            data["truncated"] = True
 
         return data
 
@@ -45,23 +45,18 @@ TYPES_MAP = {
 }
 
 
-def _get_column_by_name(columns, column_name):
-    for c in columns:
-        if "name" in c and c["name"] == column_name:
-            return c
-
-    return None
-
-
 def _get_type(value):
     return TYPES_MAP.get(type(value), TYPE_STRING)
 
 
 def add_column(columns, column_name, column_type):
-    if _get_column_by_name(columns, column_name) is None:
-        columns.append(
-            {"name": column_name, "friendly_name": column_name, "type": column_type}
-        )
+    # `columns` maps names to columns, so adding one doesn't scan the others.
+    if column_name not in columns:
+        columns[column_name] = {
+            "name": column_name,
+            "friendly_name": column_name,
+            "type": column_type,
+        }
 
 
 def _apply_path_search(response, path):
@@ -91,9 +86,9 @@ def _normalize_json(data, path):
 
 def _sort_columns_with_fields(columns, fields):
     if fields:
-        columns = compact([_get_column_by_name(columns, field) for field in fields])
+        return compact([columns.get(field) for field in fields])
 
-    return columns
+    return list(columns.values())
 
 
 # TODO: merge the logic here with the one in MongoDB's queyr runner
@@ -101,28 +96,26 @@ def parse_json(data, path, fields):
     data = _normalize_json(data, path)
 
     rows = []
-    columns = []
+    columns = {}
 
     for row in data:
         parsed_row = {}
 
-        for key in row:
-            if isinstance(row[key], dict):
-                for inner_key in row[key]:
+        for key, value in row.items():
+            if isinstance(value, dict):
+                for inner_key, inner_value in value.items():
                     column_name = "{}.{}".format(key, inner_key)
                     if fields and key not in fields and column_name not in fields:
                         continue
 
-                    value = row[key][inner_key]
-                    add_column(columns, column_name, _get_type(value))
-                    parsed_row[column_name] = value
+                    add_column(columns, column_name, _get_type(inner_value))
+                    parsed_row[column_name] = inner_value
             else:
                 if fields and key not in fields:
                     continue
 
-                value = row[key]
                 add_column(columns, key, _get_type(value))
-                parsed_row[key] = row[key]
+                parsed_row[key] = value
 
         rows.append(parsed_row)
 
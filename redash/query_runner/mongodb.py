@@ -83,45 +83,38 @@ def _get_column_by_name(columns, column_name):
     return None
 
 
+def _add_column(columns, column_name, value):
+    if column_name not in columns:
+        columns[column_name] = {
+            "name": column_name,
+            "friendly_name": column_name,
+            "type": TYPES_MAP.get(type(value), TYPE_STRING),
+        }
+
+
 def parse_results(results):
     rows = []
-    columns = []
+    # Columns by name, in the order they were first seen, so looking them up
+    # doesn't depend on how many columns there are.
+    columns = {}
 
     for row in results:
         parsed_row = {}
 
-        for key in row:
-            if isinstance(row[key], dict):
-                for inner_key in row[key]:
+        for key, value in row.items():
+            if isinstance(value, dict):
+                for inner_key, inner_value in value.items():
                     column_name = "{}.{}".format(key, inner_key)
-                    if _get_column_by_name(columns, column_name) is None:
-                        columns.append(
-                            {
-                                "name": column_name,
-                                "friendly_name": column_name,
-                                "type": TYPES_MAP.get(
-                                    type(row[key][inner_key]), TYPE_STRING
-                                ),
-                            }
-                        )
-
-                    parsed_row[column_name] = row[key][inner_key]
+                    _add_column(columns, column_name, inner_value)
+                    parsed_row[column_name] = inner_value
 
             else:
-                if _get_column_by_name(columns, key) is None:
-                    columns.append(
-                        {
-                            "name": key,
-                            "friendly_name": key,
-                            "type": TYPES_MAP.get(type(row[key]), TYPE_STRING),
-                        }
-                    )
-
-                parsed_row[key] = row[key]
+                _add_column(columns, key, value)
+                parsed_row[key] = value
 
         rows.append(parsed_row)
 
-    return rows, columns
+    return rows, list(columns.values())
 
 
 class MongoDB(BaseQueryRunner):
@@ -339,13 +332,10 @@ class MongoDB(BaseQueryRunner):
             rows, columns = parse_results(cursor)
 
         if f:
-            ordered_columns = []
-            for k in sorted(f, key=f.get):
-                column = _get_column_by_name(columns, k)
-                if column:
-                    ordered_columns.append(column)
-
-            columns = ordered_columns
+            columns_by_name = {column["name"]: column for column in columns}
+            columns = [
+                columns_by_name[k] for k in sorted(f, key=f.get) if k in columns_by_name
+            ]
 
         if query_data.get("sortColumns"):
             reverse = query_data["sortColumns"] == "desc"
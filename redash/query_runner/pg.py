@@ -7,10 +7,12 @@ from tempfile import NamedTemporaryFile
 from uuid import uuid4
 
 import psycopg2
+import sqlparse
 from psycopg2.extras import Range
 
 from redash.query_runner import *
-from redash.utils import JSONEncoder, json_dumps, json_loads
+from redash.query_runner import split_sql_statements
+from redash.utils import JSONEncoder, json_loads
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +72,18 @@ def _wait(conn, timeout=None):
             raise psycopg2.OperationalError("select.error received")
 
 
+def _cursor_statement(query):
+    # Cursors can only be declared for a single SELECT (or VALUES) statement,
+    # without the trailing semicolon.
+    statements = split_sql_statements(query)
+    if len(statements) != 1:
+        return None
+
+    if sqlparse.parse(statements[0])[0].get_type() not in ("SELECT", "VALUES"):
+        return None
+    return statements[0]
+
+
 def full_table_name(schema, name):
     if "." in name:
         name = '"{}"'.format(name)
@@ -139,6 +153,7 @@ def _get_ssl_config(configuration):
 
 class PostgreSQL(BaseSQLQueryRunner):
     noop_query = "SELECT 1"
+    result_encoder = PostgreSQLJSONEncoder
 
     @classmethod
     def configuration_schema(cls):
@@ -166,6 +181,11 @@ class PostgreSQL(BaseSQLQueryRunner):
                 "sslrootcertFile": {"type": "string", "title": "SSL Root Certificate"},
                 "sslcertFile": {"type": "string", "title": "SSL Client Certificate"},
                 "sslkeyFile": {"type": "string", "title": "SSL Client Key"},
+                "pool_connections": {
+                    "type": "boolean",
+                    "title": "Reuse connections across queries "
+                    "(in-process or threaded worker queues only)",
+                },
             },
             "order": ["host", "port", "user", "password"],
             "required": ["dbname"],
@@ -175,6 +195,7 @@ class PostgreSQL(BaseSQLQueryRunner):
                 "sslrootcertFile",
                 "sslcertFile",
                 "sslkeyFile",
+                "pool_connections",
             ],
         }
 
@@ -250,48 +271,138 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return connection
 
-    def run_query(self, query, user):
+    # Whether rows of single SELECT queries are fetched with a server side
+    # cursor (see `_declare_cursor`).
+    server_side_cursors = True
+
+    @property
+    def supports_streaming(self):
+        return True
+
+    def _connect(self):
         connection = self._get_connection()
+        try:
+            _wait(connection, timeout=10)
+        finally:
+            # Certificates are only read while connecting, so pooled connections
+            # don't need them to stay around.
+            _cleanup_ssl_certs(self.ssl_config)
+            self.ssl_config = {}
+
+        return connection
+
+    def _reset_connection(self, connection):
+        cursor = connection.cursor()
+        cursor.execute("DISCARD ALL")
         _wait(connection, timeout=10)
+        cursor.close()
+
+    def _acquire_connection(self):
+        if not self.pools_connections:
+            connection = self._get_connection()
+            _wait(connection, timeout=10)
+            return connection
+
+        return connection_pool.acquire(
+            self._connection_pool_key(), self._connect, self._reset_connection
+        )
+
+    def _release_connection(self, connection, reusable):
+        if not self.pools_connections:
+            connection.close()
+            _cleanup_ssl_certs(self.ssl_config)
+        elif reusable:
+            connection_pool.release(self._connection_pool_key(), connection)
+        else:
+            connection.close()
+
+    def _execute(self, cursor, sql):
+        cursor.execute(sql)
+        _wait(cursor.connection)
+
+    def _declare_cursor(self, cursor, query):
+        """Declares the server side cursor `redash_result` for `query`, in a
+        transaction, so that its rows can be fetched a batch at a time instead
+        of libpq receiving the whole result at once. Returns whether it did."""
+        statement = _cursor_statement(query)
+        if not self.server_side_cursors or statement is None:
+            return False
 
+        self._execute(cursor, "BEGIN")
+        try:
+            self._execute(
+                cursor, "DECLARE redash_result NO SCROLL CURSOR FOR " + statement
+            )
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.DatabaseError:
+            # Queries cursors can't be declared for (like SELECT INTO) and
+            # invalid ones are run as they are instead, failing the same way
+            # they always did.
+            self._execute(cursor, "ROLLBACK")
+            return False
+        return True
+
+    def _end_transaction(self, cursor, sql):
+        try:
+            self._execute(cursor, sql)
+        except psycopg2.Error:
+            logger.info("Failed ending result cursor transaction.", exc_info=True)
+            return False
+        return True
+
+    def run_query_stream(self, query, user):
+        connection = self._acquire_connection()
         cursor = connection.cursor()
+        reusable = False
+        declared = False
 
         try:
-            cursor.execute(query)
-            _wait(connection)
+            declared = self._declare_cursor(cursor, query)
+            fetch = "FETCH FORWARD {} FROM redash_result".format(self.stream_batch_size)
+            self._execute(cursor, fetch if declared else query)
 
-            if cursor.description is not None:
-                columns = self.fetch_columns(
-                    [(i[0], types_map.get(i[1], None)) for i in cursor.description]
-                )
-                rows = [
-                    dict(zip((column["name"] for column in columns), row))
-                    for row in cursor
-                ]
-
-                data = {"columns": columns, "rows": rows}
-                error = None
-                json_data = json_dumps(data, ignore_nan=True, cls=PostgreSQLJSONEncoder)
-            else:
-                error = "Query completed but it returned no data."
-                json_data = None
+            if cursor.description is None:
+                raise QueryRunnerError("Query completed but it returned no data.")
+
+            columns = self.fetch_columns(
+                [(i[0], types_map.get(i[1], None)) for i in cursor.description]
+            )
+            column_names = [column["name"] for column in columns]
+            yield columns
+
+            rows = cursor.fetchmany(self.stream_batch_size)
+            while rows:
+                yield [dict(zip(column_names, row)) for row in rows]
+                if declared:
+                    self._execute(cursor, fetch)
+                rows = cursor.fetchmany(self.stream_batch_size)
+
+            reusable = not declared or self._end_transaction(cursor, "COMMIT")
+        except GeneratorExit:
+            # The consumer stopped early: the rest of the result is dropped.
+            reusable = not declared or self._end_transaction(cursor, "ROLLBACK")
+            raise
         except (select.error, OSError) as e:
-            error = "Query interrupted. Please retry."
-            json_data = None
+            raise QueryRunnerError("Query interrupted. Please retry.")
         except psycopg2.DatabaseError as e:
-            error = str(e)
-            json_data = None
+            raise QueryRunnerError(str(e))
         except (KeyboardInterrupt, InterruptException, JobTimeoutException):
             connection.cancel()
             raise
         finally:
-            connection.close()
-            _cleanup_ssl_certs(self.ssl_config)
+            cursor.close()
+            self._release_connection(connection, reusable)
 
-        return json_data, error
+    def run_query(self, query, user):
+        return self._run_query_from_stream(query, user)
 
 
 class Redshift(PostgreSQL):
+    # Redshift materializes cursor results on the leader node and caps their
+    # size, so they'd only add limits.
+    server_side_cursors = False
+
     @classmethod
     def type(cls):
         return "redshift"
@@ -545,6 +656,9 @@ class RedshiftIAM(Redshift):
 
 
 class CockroachDB(PostgreSQL):
+    # Only recent CockroachDB versions support DECLARE.
+    server_side_cursors = False
+
     @classmethod
     def type(cls):
         return "cockroach"
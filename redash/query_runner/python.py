@@ -1,3 +1,4 @@
+import copy
 import datetime
 import importlib
 import logging
@@ -259,7 +260,9 @@ class Python(BaseQueryRunner):
         if query.latest_query_data.data is None:
             raise Exception("Query does not have results yet.")
 
-        return query.latest_query_data.data
+        # The decoded data is shared with other users of the result in this
+        # process, so scripts get a copy they're free to change.
+        return copy.deepcopy(query.latest_query_data.data)
 
     def dataframe_to_result(self, result, df):
 
@@ -6,6 +6,9 @@ from redash import models
 from redash.permissions import has_access, view_only
 from redash.query_runner import (
     BaseQueryRunner,
+    TYPE_BOOLEAN,
+    TYPE_FLOAT,
+    TYPE_INTEGER,
     TYPE_STRING,
     guess_type,
     register,
@@ -15,6 +18,8 @@ from redash.utils import json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
 
+SQLITE_TYPES = {TYPE_INTEGER: "INTEGER", TYPE_FLOAT: "REAL", TYPE_BOOLEAN: "INTEGER"}
+
 
 class PermissionError(Exception):
     pass
@@ -67,16 +72,18 @@ def get_query_results(user, query_id, bring_from_cache):
     return results
 
 
-def create_tables_from_query_ids(user, connection, query_ids, cached_query_ids=[]):
+def create_tables_from_query_ids(
+    user, connection, query_ids, cached_query_ids=[], typed_columns=False
+):
     for query_id in set(cached_query_ids):
         results = get_query_results(user, query_id, True)
         table_name = "cached_query_{query_id}".format(query_id=query_id)
-        create_table(connection, table_name, results)
+        create_table(connection, table_name, results, typed_columns)
 
     for query_id in set(query_ids):
         results = get_query_results(user, query_id, False)
         table_name = "query_{query_id}".format(query_id=query_id)
-        create_table(connection, table_name, results)
+        create_table(connection, table_name, results, typed_columns)
 
 
 def fix_column_name(name):
@@ -90,14 +97,29 @@ def flatten(value):
         return value
 
 
-def create_table(connection, table_name, query_results):
+def column_definition(column, typed=False):
+    # Unless typed, and for unknown or textual types, columns are left without
+    # a declared type, so SQLite stores their values as they are. Typed integer,
+    # float and boolean columns get numeric affinity: values that look like
+    # numbers (even when they came as text) are stored, compared and sorted as
+    # numbers.
+    sqlite_type = SQLITE_TYPES.get(column.get("type")) if typed else None
+    safe_name = fix_column_name(column["name"])
+    return "{} {}".format(safe_name, sqlite_type) if sqlite_type else safe_name
+
+
+def create_table(connection, table_name, query_results, typed_columns=False):
     try:
         columns = [column["name"] for column in query_results["columns"]]
         safe_columns = [fix_column_name(column) for column in columns]
 
         column_list = ", ".join(safe_columns)
-        create_table = "CREATE TABLE {table_name} ({column_list})".format(
-            table_name=table_name, column_list=column_list
+        create_table = "CREATE TABLE {table_name} ({column_definitions})".format(
+            table_name=table_name,
+            column_definitions=", ".join(
+                column_definition(column, typed_columns)
+                for column in query_results["columns"]
+            ),
         )
         logger.debug("CREATE TABLE query: %s", create_table)
         connection.execute(create_table)
@@ -112,9 +134,15 @@ def create_table(connection, table_name, query_results):
         place_holders=",".join(["?"] * len(columns)),
     )
 
-    for row in query_results["rows"]:
-        values = [flatten(row.get(column)) for column in columns]
-        connection.execute(insert_template, values)
+    # All rows are loaded with a single executemany call, which binds and
+    # inserts them without going back to Python for every row.
+    connection.executemany(
+        insert_template,
+        (
+            [flatten(row.get(column)) for column in columns]
+            for row in query_results["rows"]
+        ),
+    )
 
 
 class Results(BaseQueryRunner):
@@ -123,7 +151,16 @@ class Results(BaseQueryRunner):
 
     @classmethod
     def configuration_schema(cls):
-        return {"type": "object", "properties": {}}
+        return {
+            "type": "object",
+            "properties": {
+                "typed_columns": {
+                    "type": "boolean",
+                    "title": "Compare numeric columns as numbers, even when "
+                    "their values are text",
+                }
+            },
+        }
 
     @classmethod
     def name(cls):
@@ -134,7 +171,13 @@ class Results(BaseQueryRunner):
 
         query_ids = extract_query_ids(query)
         cached_query_ids = extract_cached_query_ids(query)
-        create_tables_from_query_ids(user, connection, query_ids, cached_query_ids)
+        create_tables_from_query_ids(
+            user,
+            connection,
+            query_ids,
+            cached_query_ids,
+            self.configuration.get("typed_columns", False),
+        )
 
         cursor = connection.cursor()
 
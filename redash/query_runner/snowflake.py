@@ -118,11 +118,15 @@ class Snowflake(BaseQueryRunner):
                 for i in cursor.description
             ]
         )
-        rows = [
-            dict(zip((column["name"] for column in columns), row)) for row in cursor
-        ]
+        column_names = [column["name"] for column in columns]
+        rows, truncated = self.limit_rows(
+            [dict(zip(column_names, row)) for row in batch]
+            for batch in iter(lambda: cursor.fetchmany(self.stream_batch_size), [])
+        )
 
         data = {"columns": columns, "rows": rows}
+        if truncated:
+            data["truncated"] = True
         return data
 
     def run_query(self, query, user):
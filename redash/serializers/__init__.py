@@ -18,7 +18,9 @@ from redash.models.parameterized_query import ParameterizedQuery
 from .query_result import (
     serialize_query_result,
     serialize_query_result_to_dsv,
+    serialize_query_result_to_dsv_stream,
     serialize_query_result_to_xlsx,
+    serialize_query_result_to_xlsx_stream,
 )
 
 
@@ -301,6 +303,7 @@ class DashboardSerializer(Serializer):
 def serialize_job(job):
     # TODO: this is mapping to the old Job class statuses. Need to update the client side and remove this
     STATUSES = {
+        JobStatus.DEFERRED: 1,
         JobStatus.QUEUED: 1,
         JobStatus.STARTED: 2,
         JobStatus.FINISHED: 3,
@@ -1,5 +1,7 @@
 import io
 import csv
+import tempfile
+from functools import partial
 import xlsxwriter
 from funcy import rpartial, project
 from dateutil.parser import isoparse as parse_date
@@ -72,46 +74,60 @@ def _get_column_lists(columns):
 
 
 def serialize_query_result(query_result, is_api_user):
+    # Results served from the shared results cache are already dicts
+    if not isinstance(query_result, dict):
+        query_result = query_result.to_dict()
+
     if is_api_user:
         publicly_needed_keys = ["data", "retrieved_at"]
-        return project(query_result.to_dict(), publicly_needed_keys)
+        return project(query_result, publicly_needed_keys)
     else:
-        return query_result.to_dict()
+        return query_result
 
 
-def serialize_query_result_to_dsv(query_result, delimiter):
+def serialize_query_result_to_dsv_stream(query_result, delimiter, batch_size=1000):
+    """Yields the result as delimiter separated text, `batch_size` rows at a time."""
     s = io.StringIO()
 
-    query_data = query_result.data
-
-    fieldnames, special_columns = _get_column_lists(query_data["columns"] or [])
+    columns, rows = query_result.iter_data()
+    fieldnames, special_columns = _get_column_lists(columns or [])
 
     writer = csv.DictWriter(s, extrasaction="ignore", fieldnames=fieldnames, delimiter=delimiter)
     writer.writeheader()
 
-    for row in query_data["rows"]:
-        for col_name, converter in special_columns.items():
-            if col_name in row:
-                row[col_name] = converter(row[col_name])
+    for count, row in enumerate(rows, 1):
+        if special_columns:
+            # Copy the row, so the (possibly cached) result data isn't modified
+            row = dict(row)
+            for col_name, converter in special_columns.items():
+                if col_name in row:
+                    row[col_name] = converter(row[col_name])
 
         writer.writerow(row)
 
-    return s.getvalue()
+        if count % batch_size == 0:
+            yield s.getvalue()
+            s.seek(0)
+            s.truncate(0)
 
+    yield s.getvalue()
 
-def serialize_query_result_to_xlsx(query_result):
-    output = io.BytesIO()
 
-    query_data = query_result.data
+def serialize_query_result_to_dsv(query_result, delimiter):
+    return "".join(serialize_query_result_to_dsv_stream(query_result, delimiter))
+
+
+def _write_xlsx(query_result, output):
+    columns, rows = query_result.iter_data()
     book = xlsxwriter.Workbook(output, {"constant_memory": True})
     sheet = book.add_worksheet("result")
 
     column_names = []
-    for c, col in enumerate(query_data["columns"]):
+    for c, col in enumerate(columns or []):
         sheet.write(0, c, col["name"])
         column_names.append(col["name"])
 
-    for r, row in enumerate(query_data["rows"]):
+    for r, row in enumerate(rows):
         for c, name in enumerate(column_names):
             v = row.get(name)
             if isinstance(v, (dict, list)):
@@ -120,4 +136,19 @@ def serialize_query_result_to_xlsx(query_result):
 
     book.close()
 
-    return output.getvalue()
+
+def serialize_query_result_to_xlsx_stream(query_result, chunk_size=64 * 1024):
+    """
+    The XLSX archive can only be assembled once all rows are written, so it's
+    built in a temporary file (rather than in memory) and then yielded in chunks.
+    """
+    with tempfile.TemporaryFile() as output:
+        _write_xlsx(query_result, output)
+        output.seek(0)
+
+        for chunk in iter(partial(output.read, chunk_size), b""):
+            yield chunk
+
+
+def serialize_query_result_to_xlsx(query_result):
+    return b"".join(serialize_query_result_to_xlsx_stream(query_result))
@@ -56,6 +56,64 @@ QUERY_RESULTS_CLEANUP_MAX_AGE = int(
     os.environ.get("REDASH_QUERY_RESULTS_CLEANUP_MAX_AGE", "7")
 )
 
+# How new query results are stored: "json" (a single JSON document) or "columnar" (compressed
+# column blocks, see redash.utils.columnar). Results stored in either format stay readable.
+QUERY_RESULTS_STORAGE_FORMAT = os.environ.get(
+    "REDASH_QUERY_RESULTS_STORAGE_FORMAT", "json"
+)
+
+# Memory (in bytes) the per-process cache of decoded query results may take. Results are
+# charged an estimate of the memory their decoded rows take, which is several times the
+# size of the stored data. Set to 0 to disable it.
+QUERY_RESULTS_CACHE_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_CACHE_SIZE", 32 * 1024 * 1024)
+)
+
+# Optional Redis cache of the latest result of each query, shared by all web workers. Results
+# are kept for up to REDASH_QUERY_RESULTS_REDIS_CACHE_TTL seconds and served while they're
+# fresh enough for the requested max_age. Results larger than ..._MAX_SIZE (compressed, or
+# estimated from their stored size) and truncated results are skipped.
+QUERY_RESULTS_REDIS_CACHE_ENABLED = parse_boolean(
+    os.environ.get("REDASH_QUERY_RESULTS_REDIS_CACHE_ENABLED", "false")
+)
+QUERY_RESULTS_REDIS_CACHE_URL = os.environ.get(
+    "REDASH_QUERY_RESULTS_REDIS_CACHE_URL", _REDIS_URL
+)
+QUERY_RESULTS_REDIS_CACHE_TTL = int(
+    os.environ.get("REDASH_QUERY_RESULTS_REDIS_CACHE_TTL", 24 * 60 * 60)
+)
+QUERY_RESULTS_REDIS_CACHE_MAX_SIZE = int(
+    os.environ.get("REDASH_QUERY_RESULTS_REDIS_CACHE_MAX_SIZE", 5 * 1024 * 1024)
+)
+
+# Data sources with connection reuse enabled keep up to ..._MAX_IDLE idle connections per worker
+# process, each for up to ..._IDLE_TIMEOUT seconds. Connections are only reused by queries
+# of REDASH_RQ_WORKER_IN_PROCESS_QUEUES or ..._THREADED_QUEUES, and by schema refreshes and
+# connection tests within the web process: a forked work horse exits with its connections.
+QUERY_RUNNER_POOL_MAX_IDLE = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_MAX_IDLE", 2)
+)
+QUERY_RUNNER_POOL_IDLE_TIMEOUT = int(
+    os.environ.get("REDASH_QUERY_RUNNER_POOL_IDLE_TIMEOUT", 300)
+)
+
+# SSH tunnels to data sources are kept open and reused by later queries until they've been
+# unused for this many seconds. Set to 0 to open a new tunnel for every query. Like pooled
+# connections, tunnels are only reused by queries of in-process or threaded queues, and by
+# schema refreshes and connection tests within the web process.
+SSH_TUNNEL_IDLE_TIMEOUT = int(os.environ.get("REDASH_SSH_TUNNEL_IDLE_TIMEOUT", 300))
+
+# Group permissions and data source grants are cached in Redis for this many seconds (changes
+# to them invalidate the cache right away). Set to 0 to only cache them per request.
+PERMISSIONS_CACHE_TTL = int(os.environ.get("REDASH_PERMISSIONS_CACHE_TTL", 60 * 60))
+
+# How often (in seconds) the status shown in the admin pages and /status.json
+# is refreshed. Those serve the last snapshot instead of querying on each call.
+STATUS_SNAPSHOT_INTERVAL = int(os.environ.get("REDASH_STATUS_SNAPSHOT_INTERVAL", 60))
+# How often (in seconds) the expensive parts of the status (object counts and database
+# sizes) are recomputed for those snapshots.
+STATUS_DETAILS_INTERVAL = int(os.environ.get("REDASH_STATUS_DETAILS_INTERVAL", 15 * 60))
+
 SCHEMAS_REFRESH_SCHEDULE = int(os.environ.get("REDASH_SCHEMAS_REFRESH_SCHEDULE", 30))
 
 AUTH_TYPE = os.environ.get("REDASH_AUTH_TYPE", "api_key")
@@ -255,11 +313,64 @@ SCHEDULED_QUERY_TIME_LIMIT = int(
 # Time limit (in seconds) for adhoc queries. Set this to -1 to execute without a time limit.
 ADHOC_QUERY_TIME_LIMIT = int(os.environ.get("REDASH_ADHOC_QUERY_TIME_LIMIT", -1))
 
+# Spread scheduled queries over a window of this many seconds, so that queries
+# scheduled for the same time (like the top of the hour) don't all run at once.
+# Each query is delayed by its own offset within the window, always the same one.
+# Interval schedules then run at their offset within each interval (e.g. past the
+# hour for hourly schedules). 0 disables spreading.
+SCHEDULED_QUERIES_SPREAD = int(os.environ.get("REDASH_SCHEDULED_QUERIES_SPREAD", 0))
+
 JOB_EXPIRY_TIME = int(os.environ.get("REDASH_JOB_EXPIRY_TIME", 3600 * 12))
 JOB_DEFAULT_FAILURE_TTL = int(
     os.environ.get("REDASH_JOB_DEFAULT_FAILURE_TTL", 7 * 24 * 60 * 60)
 )
 
+# How many queries of a data source may be queued or running at once (0 means no
+# limit). Further queries wait in a pending list of the data source, so a single
+# data source can't take every worker of a shared queue. Data sources can override
+# it with their "max_concurrent_queries" option.
+DATA_SOURCE_MAX_CONCURRENT_QUERIES = int(
+    os.environ.get("REDASH_DATA_SOURCE_MAX_CONCURRENT_QUERIES", 0)
+)
+
+# Queries run by users (including dashboard refreshes) go ahead of scheduled queries,
+# both on RQ workers (which prefer the queues they list first) and among the pending
+# queries of data sources at their concurrency limit. Scheduled queries (and jobs of
+# each queue a worker lists after another) are ordered as if they were submitted this
+# many seconds later than they were, so they're never starved.
+QUERY_PRIORITY_AGING = int(os.environ.get("REDASH_QUERY_PRIORITY_AGING", 120))
+
+# How many query locks remove_ghost_locks checks per Redis round trip.
+GHOST_LOCKS_BATCH_SIZE = int(os.environ.get("REDASH_GHOST_LOCKS_BATCH_SIZE", 500))
+
+# Queues whose jobs RQ workers run in the worker process itself, instead of forking a
+# work horse per job. Forking is much more expensive than short jobs like recording
+# events, checking alerts or sending emails, so it's worth doing for queues of such jobs
+# (e.g. "default,emails,periodic"). Time limits and cancellation are still enforced,
+# but a job that never returns control to Python (e.g. blocked in a C extension) can't
+# be stopped, so don't use this for queues of data source queries.
+RQ_WORKER_IN_PROCESS_QUEUES = array_from_string(
+    os.environ.get("REDASH_RQ_WORKER_IN_PROCESS_QUEUES", "")
+)
+
+# Queues whose jobs RQ workers run concurrently, up to REDASH_RQ_WORKER_THREADS at once,
+# each in a thread of the worker process. Meant for queues of data sources that mostly
+# wait on the network (BigQuery, Athena, Snowflake, HTTP APIs...), to get concurrency
+# without a process per running query. The results of these jobs are capped at
+# REDASH_RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES (on top of the org and data source
+# limits), as they share the worker's memory. PostgreSQL (and the runners based on
+# it), BigQuery, Athena and Snowflake stop fetching once they reach it, and the JSON
+# and URL runners reject larger responses. Other runners build their whole result
+# before it's trimmed, so a single large result of theirs can still take all of the
+# worker's memory.
+RQ_WORKER_THREADED_QUEUES = array_from_string(
+    os.environ.get("REDASH_RQ_WORKER_THREADED_QUEUES", "")
+)
+RQ_WORKER_THREADS = int(os.environ.get("REDASH_RQ_WORKER_THREADS", 8))
+RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES = int(
+    os.environ.get("REDASH_RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES", 100 * 1024 * 1024)
+)
+
 LOG_LEVEL = os.environ.get("REDASH_LOG_LEVEL", "INFO")
 LOG_STDOUT = parse_boolean(os.environ.get("REDASH_LOG_STDOUT", "false"))
 LOG_PREFIX = os.environ.get("REDASH_LOG_PREFIX", "")
@@ -443,6 +554,12 @@ EVENT_REPORTING_WEBHOOKS = array_from_string(
     os.environ.get("REDASH_EVENT_REPORTING_WEBHOOKS", "")
 )
 
+# Events are buffered in Redis and stored every EVENTS_FLUSH_INTERVAL seconds, in transactions
+# of up to EVENTS_BATCH_SIZE events and at most EVENTS_FLUSH_MAX_BATCHES transactions per flush.
+EVENTS_FLUSH_INTERVAL = int(os.environ.get("REDASH_EVENTS_FLUSH_INTERVAL", 10))
+EVENTS_BATCH_SIZE = int(os.environ.get("REDASH_EVENTS_BATCH_SIZE", 500))
+EVENTS_FLUSH_MAX_BATCHES = int(os.environ.get("REDASH_EVENTS_FLUSH_MAX_BATCHES", 20))
+
 # Support for Sentry (https://getsentry.com/). Just set your Sentry DSN to enable it:
 SENTRY_DSN = os.environ.get("REDASH_SENTRY_DSN", "")
 SENTRY_ENVIRONMENT = os.environ.get("REDASH_SENTRY_ENVIRONMENT")
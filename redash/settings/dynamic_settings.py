@@ -10,6 +10,33 @@ def query_time_limit(is_scheduled, user_id, org_id):
         return settings.ADHOC_QUERY_TIME_LIMIT
 
 
+# Replace this method with your own implementation in case you want different result size limits
+# for certain data sources. Returns the largest number of rows and bytes (of JSON encoded rows) a
+# result may have, where 0 means no limit. Only runners that stream their rows stop fetching at
+# the limits; results of the others are trimmed once fetched.
+def query_result_limits(data_source):
+    org = data_source.org
+    max_rows = data_source.options.get("max_result_rows") or org.get_setting(
+        "query_results_max_rows", raise_on_missing=False
+    )
+    max_bytes = data_source.options.get("max_result_bytes") or org.get_setting(
+        "query_results_max_bytes", raise_on_missing=False
+    )
+    return max_rows or 0, max_bytes or 0
+
+
+# Replace this method with your own implementation in case you want different concurrency limits
+# for certain data sources. Returns how many jobs of the data source may be queued or running at
+# once, where 0 means no limit.
+def query_concurrency_limit(data_source):
+    from redash import settings
+
+    return (
+        data_source.options.get("max_concurrent_queries")
+        or settings.DATA_SOURCE_MAX_CONCURRENT_QUERIES
+    )
+
+
 def periodic_jobs():
     """Schedule any custom periodic jobs here. For example:
 
@@ -54,6 +54,14 @@ HIDE_PLOTLY_MODE_BAR = parse_boolean(os.environ.get("HIDE_PLOTLY_MODE_BAR", "fal
 DISABLE_PUBLIC_URLS = parse_boolean(
     os.environ.get("REDASH_DISABLE_PUBLIC_URLS", "false")
 )
+# Largest result a query may store; bigger results are cut short and flagged as
+# truncated. 0 means no limit. Runners that stream their rows (PostgreSQL and the
+# runners based on it) or collect them in batches (Athena, BigQuery, Snowflake) stop
+# fetching at the limit; the others fetch their whole result, which is then trimmed
+# before it's stored. Data sources can override these with their "max_result_rows"
+# and "max_result_bytes" options.
+QUERY_RESULTS_MAX_ROWS = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_ROWS", "0"))
+QUERY_RESULTS_MAX_BYTES = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_BYTES", "0"))
 
 settings = {
     "beacon_consent": None,
@@ -82,4 +90,6 @@ settings = {
     "send_email_on_failed_scheduled_queries": SEND_EMAIL_ON_FAILED_SCHEDULED_QUERIES,
     "hide_plotly_mode_bar": HIDE_PLOTLY_MODE_BAR,
     "disable_public_urls": DISABLE_PUBLIC_URLS,
+    "query_results_max_rows": QUERY_RESULTS_MAX_ROWS,
+    "query_results_max_bytes": QUERY_RESULTS_MAX_BYTES,
 }
@@ -1,6 +1,9 @@
 from .general import (
     record_event,
+    queue_event,
+    flush_events,
     version_check,
+    refresh_status,
     send_mail,
     sync_user_details,
 )
@@ -12,6 +15,7 @@ from .queries import (
     cleanup_query_results,
     empty_schedules,
     remove_ghost_locks,
+    dispatch_pending_queries,
 )
 from .alerts import check_alerts_for_query
 from .failure_report import send_aggregated_errors
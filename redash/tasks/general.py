@@ -2,21 +2,23 @@ import requests
 from datetime import datetime
 
 from flask_mail import Message
-from redash import mail, models, settings
+from redash import mail, models, redis_connection, settings
 from redash.models import users
+from redash.monitor import refresh_status_snapshots
 from redash.version_check import run_version_check
 from redash.worker import job, get_job_logger
 from redash.tasks.worker import Queue
 from redash.query_runner import NotSupported
+from redash.utils import json_dumps, json_loads
 
 logger = get_job_logger(__name__)
 
 
-@job("default")
-def record_event(raw_event):
-    event = models.Event.record(raw_event)
-    models.db.session.commit()
+EVENTS_KEY = "events:pending"
+EVENTS_FLUSH_LOCK_KEY = "events:flush_lock"
 
+
+def _forward_event(event):
     for hook in settings.EVENT_REPORTING_WEBHOOKS:
         logger.debug("Forwarding event to: %s", hook)
         try:
@@ -31,10 +33,86 @@ def record_event(raw_event):
             logger.exception("Failed posting to %s", hook)
 
 
+@job("default")
+def record_event(raw_event):
+    event = models.Event.record(raw_event)
+    models.db.session.commit()
+    _forward_event(event)
+
+
+def queue_event(raw_event):
+    """Buffers an event to be stored by the next `flush_events` run."""
+    redis_connection.rpush(EVENTS_KEY, json_dumps(raw_event))
+
+
+def _store_events(raw_events):
+    # Event.record consumes the dict it's given, so it gets copies to keep the
+    # raw events around for retrying them one by one.
+    events = [models.Event.record(dict(raw_event)) for raw_event in raw_events]
+    try:
+        models.db.session.commit()
+        return events
+    except Exception:
+        models.db.session.rollback()
+        logger.warning("Failed storing events batch, storing them one by one.")
+
+    # A single bad event (e.g. of a since deleted user) shouldn't hold back
+    # the rest of the batch.
+    stored = []
+    for raw_event in raw_events:
+        try:
+            event = models.Event.record(dict(raw_event))
+            models.db.session.commit()
+            stored.append(event)
+        except Exception:
+            models.db.session.rollback()
+            logger.exception("Dropping event that can't be stored: %s", raw_event)
+
+    return stored
+
+
+def flush_events():
+    """Stores buffered events, one transaction per batch of up to
+    EVENTS_BATCH_SIZE. Events leave the buffer only after they're stored."""
+    if not redis_connection.set(
+        EVENTS_FLUSH_LOCK_KEY, 1, nx=True, ex=settings.EVENTS_FLUSH_INTERVAL * 10
+    ):
+        logger.info("Events are already being flushed.")
+        return
+
+    try:
+        for _ in range(settings.EVENTS_FLUSH_MAX_BATCHES):
+            payloads = redis_connection.lrange(
+                EVENTS_KEY, 0, settings.EVENTS_BATCH_SIZE - 1
+            )
+            if not payloads:
+                break
+
+            raw_events = []
+            for payload in payloads:
+                try:
+                    raw_events.append(json_loads(payload))
+                except ValueError:
+                    logger.error("Dropping malformed event: %s", payload)
+
+            events = _store_events(raw_events)
+            redis_connection.ltrim(EVENTS_KEY, len(payloads), -1)
+
+            logger.info("Stored %d events.", len(events))
+            for event in events:
+                _forward_event(event)
+    finally:
+        redis_connection.delete(EVENTS_FLUSH_LOCK_KEY)
+
+
 def version_check():
     run_version_check()
 
 
+def refresh_status():
+    refresh_status_snapshots()
+
+
 @job("default")
 def subscribe(form):
     logger.info(
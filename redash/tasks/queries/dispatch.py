@@ -0,0 +1,217 @@
+"""
+Per data source concurrency limits for query jobs.
+
+A data source with a limit (see `dynamic_settings.query_concurrency_limit`)
+only gets that many jobs at once on its RQ queues, queued or running. Further
+jobs are saved as deferred and kept in a pending list of the data source, and
+are moved to their queue as the data source's jobs end. A data source with a
+flood of due queries can then only take its share of the workers of a shared
+queue, instead of starving every other data source.
+
+Pending queries run by users go first. Scheduled ones are ordered as if they
+were submitted QUERY_PRIORITY_AGING seconds later than they were, so they
+wait behind queries run by users for no longer than that.
+"""
+import time
+
+from rq.job import JobStatus
+
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
+from redash.tasks.worker import Job, Queue
+from redash.worker import get_job_logger
+
+logger = get_job_logger(__name__)
+
+DATA_SOURCES_KEY = "query_dispatch:data_sources"
+# Jobs that were dispatched but are still deferred after this many seconds
+# are assumed to have been lost on their way to the queue.
+DISPATCH_GRACE_PERIOD = 60
+
+# Dispatches the job right away when the data source is under its limit and
+# has no pending jobs, or adds it to the pending jobs (ordered by priority)
+# otherwise.
+_admit = redis_connection.register_script(
+    """
+    local limit = tonumber(ARGV[1])
+    redis.call("sadd", KEYS[3], ARGV[4])
+    if redis.call("zcard", KEYS[2]) == 0 and redis.call("zcard", KEYS[1]) < limit then
+        redis.call("zadd", KEYS[1], ARGV[3], ARGV[2])
+        return 1
+    end
+    redis.call("zadd", KEYS[2], ARGV[5], ARGV[2])
+    return 0
+    """
+)
+
+# Frees the slots of jobs that ended, and dispatches the pending jobs that fit
+# under the limit (all of them when there's no limit anymore).
+_release = redis_connection.register_script(
+    """
+    local limit = tonumber(ARGV[1])
+    for i = 4, #ARGV do
+        redis.call("zrem", KEYS[1], ARGV[i])
+    end
+
+    local dispatched = {}
+    while limit == 0 or redis.call("zcard", KEYS[1]) < limit do
+        local job_id = redis.call("zrange", KEYS[2], 0, 0)[1]
+        if not job_id then
+            break
+        end
+        redis.call("zrem", KEYS[2], job_id)
+        redis.call("zadd", KEYS[1], ARGV[2], job_id)
+        table.insert(dispatched, job_id)
+    end
+
+    if redis.call("zcard", KEYS[1]) == 0 and redis.call("zcard", KEYS[2]) == 0 then
+        redis.call("srem", KEYS[3], ARGV[3])
+    end
+    return dispatched
+    """
+)
+
+
+def _running_key(data_source_id):
+    return "query_dispatch:{}:running".format(data_source_id)
+
+
+def _pending_key(data_source_id):
+    return "query_dispatch:{}:pending".format(data_source_id)
+
+
+def _keys(data_source_id):
+    return [
+        _running_key(data_source_id),
+        _pending_key(data_source_id),
+        DATA_SOURCES_KEY,
+    ]
+
+
+def concurrency_limit(data_source):
+    return settings.dynamic_settings.query_concurrency_limit(data_source) or 0
+
+
+def data_source_status(data_source_id):
+    pipe = redis_connection.pipeline()
+    pipe.zcard(_running_key(data_source_id))
+    pipe.zcard(_pending_key(data_source_id))
+    running, pending = pipe.execute()
+    return {"running": running, "pending": pending}
+
+
+def _record_depth(data_source_id):
+    status = data_source_status(data_source_id)
+    for name, value in status.items():
+        statsd_client.gauge("query_dispatch.{}.{}".format(data_source_id, name), value)
+
+
+def submit(queue, job, limit):
+    """
+    Enqueues `job` (created but not enqueued yet) when its data source has
+    less than `limit` jobs on its queues, and defers it otherwise. Returns
+    whether it was enqueued.
+    """
+    data_source_id = job.meta["data_source_id"]
+    pipe = rq_redis_connection.pipeline()
+    job.set_status(JobStatus.DEFERRED, pipeline=pipe)
+    job.save(pipeline=pipe)
+    pipe.execute()
+
+    now = time.time()
+    priority = now + settings.QUERY_PRIORITY_AGING if job.meta.get("scheduled") else now
+    admitted = _admit(
+        keys=_keys(data_source_id),
+        args=[limit, job.id, now, data_source_id, priority],
+    )
+    if admitted:
+        queue.enqueue_job(job)
+    else:
+        logger.info(
+            "Data source %s is at its limit of %d jobs, deferred job %s.",
+            data_source_id,
+            limit,
+            job.id,
+        )
+
+    _record_depth(data_source_id)
+    return bool(admitted)
+
+
+def _enqueue(job_ids):
+    ended = []
+    jobs = Job.fetch_many(job_ids, connection=rq_redis_connection)
+    for job_id, job in zip(job_ids, jobs):
+        if job is None or job.is_cancelled:
+            ended.append(job_id)
+        else:
+            Queue(job.origin, connection=rq_redis_connection).enqueue_job(job)
+    return ended
+
+
+def release(data_source_id, limit, *job_ids):
+    """
+    Frees the slots of the data source's jobs in `job_ids`, which ended, and
+    enqueues the pending jobs that fit.
+    """
+    while True:
+        dispatched = _release(
+            keys=_keys(data_source_id),
+            args=[limit, time.time(), data_source_id] + list(job_ids),
+        )
+        # Pending jobs that were cancelled (or expired) free their slot
+        # right away.
+        job_ids = _enqueue(dispatched)
+        if not job_ids:
+            break
+
+    _record_depth(data_source_id)
+
+
+def _ended_jobs(data_source_id):
+    running = redis_connection.zrange(
+        _running_key(data_source_id), 0, -1, withscores=True
+    )
+    job_ids = [job_id for job_id, _ in running]
+    jobs = Job.fetch_many(job_ids, connection=rq_redis_connection)
+
+    ended = []
+    lost = []
+    for (job_id, dispatched_at), job in zip(running, jobs):
+        if job is None or job.is_cancelled:
+            ended.append(job_id)
+            continue
+
+        status = job.get_status(refresh=False)
+        if status in (JobStatus.FINISHED, JobStatus.FAILED):
+            ended.append(job.id)
+        elif (
+            status == JobStatus.DEFERRED
+            and time.time() - dispatched_at > DISPATCH_GRACE_PERIOD
+        ):
+            lost.append(job)
+
+    return ended, lost
+
+
+def dispatch_pending_queries():
+    """
+    Frees the slots of jobs that ended without releasing them (e.g. because
+    their work horse was killed) and dispatches pending jobs accordingly.
+    """
+    for data_source_id in redis_connection.smembers(DATA_SOURCES_KEY):
+        data_source_id = int(data_source_id)
+        data_source = models.DataSource.query.get(data_source_id)
+        limit = concurrency_limit(data_source) if data_source else 0
+
+        ended, lost = _ended_jobs(data_source_id)
+        for job in lost:
+            logger.info("Enqueueing job %s, dispatched but never enqueued.", job.id)
+            Queue(job.origin, connection=rq_redis_connection).enqueue_job(job)
+
+        release(data_source_id, limit, *ended)
@@ -1,30 +1,110 @@
 import signal
+import threading
 import time
 import redis
+from collections import OrderedDict
 
 from rq import get_current_job
 from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
 from rq.exceptions import NoSuchJobError
 
-from redash import models, redis_connection, settings
-from redash.query_runner import InterruptException
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
+from redash.query_runner import InterruptException, QueryRunnerError
 from redash.tasks.worker import Queue, Job
 from redash.tasks.alerts import check_alerts_for_query
 from redash.tasks.failure_report import track_failure
-from redash.utils import gen_query_hash, json_dumps, utcnow
+from redash.utils import gen_query_hash, json_dumps, json_loads, utcnow
+from redash.utils.result_limits import ResultSizeGuard, truncate_encoded_result
 from redash.worker import get_job_logger
 
+from . import dispatch
+
 logger = get_job_logger(__name__)
 TIMEOUT_MESSAGE = "Query exceeded Redash query execution time limit."
+# Set of the ids of query locks that were taken, so they can be checked
+# without scanning the keyspace. Ids of locks that are gone are removed by
+# remove_ghost_locks.
+JOB_LOCKS_KEY = "query_hash_job_locks"
 
 
 def _job_lock_id(query_hash, data_source_id):
     return "query_hash_job:%s:%s" % (data_source_id, query_hash)
 
 
+def _remove_locks(*lock_ids):
+    pipe = redis_connection.pipeline()
+    pipe.delete(*lock_ids)
+    pipe.srem(JOB_LOCKS_KEY, *lock_ids)
+    pipe.execute()
+
+
 def _unlock(query_hash, data_source_id):
-    redis_connection.delete(_job_lock_id(query_hash, data_source_id))
+    _remove_locks(_job_lock_id(query_hash, data_source_id))
+
+
+def _enqueue_arguments(data_source, user_id, is_api_key, scheduled_query, metadata):
+    if scheduled_query:
+        queue_name = data_source.scheduled_queue_name
+        scheduled_query_id = scheduled_query.id
+    else:
+        queue_name = data_source.queue_name
+        scheduled_query_id = None
+
+    time_limit = settings.dynamic_settings.query_time_limit(
+        scheduled_query, user_id, data_source.org_id
+    )
+    metadata["Queue"] = queue_name
+
+    enqueue_kwargs = {
+        "user_id": user_id,
+        "scheduled_query_id": scheduled_query_id,
+        "is_api_key": is_api_key,
+        "job_timeout": time_limit,
+        "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
+        "meta": {
+            "data_source_id": data_source.id,
+            "org_id": data_source.org_id,
+            "scheduled": scheduled_query_id is not None,
+            "query_id": metadata.get("query_id"),
+            "user_id": user_id,
+        },
+    }
+
+    if not scheduled_query:
+        enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
+
+    return queue_name, enqueue_kwargs
+
+
+def _create_job(queue, query_text, data_source_id, metadata, enqueue_kwargs):
+    enqueue_kwargs = dict(enqueue_kwargs)
+    return queue.create_job(
+        execute_query,
+        args=(query_text, data_source_id, metadata),
+        kwargs={
+            "user_id": enqueue_kwargs.pop("user_id"),
+            "scheduled_query_id": enqueue_kwargs.pop("scheduled_query_id"),
+            "is_api_key": enqueue_kwargs.pop("is_api_key"),
+        },
+        timeout=enqueue_kwargs.pop("job_timeout"),
+        **enqueue_kwargs
+    )
+
+
+def _lock_is_irrelevant(job):
+    if job is None:
+        return True
+    return (
+        job.get_status(refresh=False) in [JobStatus.FINISHED, JobStatus.FAILED]
+        or job.is_cancelled
+    )
 
 
 def enqueue_query(
@@ -66,46 +146,26 @@ def enqueue_query(
 
                 if lock_is_irrelevant:
                     logger.info("[%s] %s, removing lock", query_hash, message)
-                    redis_connection.delete(_job_lock_id(query_hash, data_source.id))
+                    _remove_locks(_job_lock_id(query_hash, data_source.id))
                     job = None
 
             if not job:
                 pipe.multi()
 
-                if scheduled_query:
-                    queue_name = data_source.scheduled_queue_name
-                    scheduled_query_id = scheduled_query.id
-                else:
-                    queue_name = data_source.queue_name
-                    scheduled_query_id = None
-
-                time_limit = settings.dynamic_settings.query_time_limit(
-                    scheduled_query, user_id, data_source.org_id
+                queue_name, enqueue_kwargs = _enqueue_arguments(
+                    data_source, user_id, is_api_key, scheduled_query, metadata
                 )
-                metadata["Queue"] = queue_name
-
                 queue = Queue(queue_name)
-                enqueue_kwargs = {
-                    "user_id": user_id,
-                    "scheduled_query_id": scheduled_query_id,
-                    "is_api_key": is_api_key,
-                    "job_timeout": time_limit,
-                    "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
-                    "meta": {
-                        "data_source_id": data_source.id,
-                        "org_id": data_source.org_id,
-                        "scheduled": scheduled_query_id is not None,
-                        "query_id": metadata.get("query_id"),
-                        "user_id": user_id,
-                    },
-                }
-
-                if not scheduled_query:
-                    enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
-
-                job = queue.enqueue(
-                    execute_query, query, data_source.id, metadata, **enqueue_kwargs
-                )
+                limit = dispatch.concurrency_limit(data_source)
+                if limit:
+                    job = _create_job(
+                        queue, query, data_source.id, metadata, enqueue_kwargs
+                    )
+                    dispatch.submit(queue, job, limit)
+                else:
+                    job = queue.enqueue(
+                        execute_query, query, data_source.id, metadata, **enqueue_kwargs
+                    )
 
                 logger.info("[%s] Created new job: %s", query_hash, job.id)
                 pipe.set(
@@ -113,6 +173,7 @@ def enqueue_query(
                     job.id,
                     settings.JOB_EXPIRY_TIME,
                 )
+                pipe.sadd(JOB_LOCKS_KEY, _job_lock_id(query_hash, data_source.id))
                 pipe.execute()
             break
 
@@ -125,10 +186,144 @@ def enqueue_query(
     return job
 
 
+def enqueue_scheduled_queries(scheduled, on_error=None):
+    """
+    Enqueues executions for a batch of scheduled queries, given as
+    (query_text, query) pairs, using a fixed number of Redis round trips no
+    matter how large the batch is. Returns the queries that have a pending
+    job once done (either an existing one or a newly created one).
+
+    A query that fails to be enqueued doesn't keep the others from being
+    enqueued: `on_error` is called with the query and the exception instead.
+    """
+
+    def failed(query, error, *lock_ids):
+        # Locks this call took for jobs that never made it to their queue.
+        if lock_ids:
+            try:
+                _remove_locks(*lock_ids)
+            except redis.RedisError:
+                logger.warning("Failed removing job locks.", exc_info=True)
+        if on_error is None:
+            logger.exception("Failed enqueuing query %s.", query.id)
+        else:
+            on_error(query, error)
+
+    batch = OrderedDict()
+    for query_text, query in scheduled:
+        lock_id = _job_lock_id(gen_query_hash(query_text), query.data_source_id)
+        batch.setdefault(lock_id, (query_text, query))
+
+    if not batch:
+        return []
+
+    lock_ids = list(batch.keys())
+    locked_job_ids = dict(zip(lock_ids, redis_connection.mget(lock_ids)))
+
+    job_ids = list(set(job_id for job_id in locked_job_ids.values() if job_id))
+    jobs = dict(zip(job_ids, Job.fetch_many(job_ids, connection=rq_redis_connection)))
+
+    enqueued = []
+    stale_locks = []
+    candidates = []
+    for lock_id, job_id in locked_job_ids.items():
+        query_text, query = batch[lock_id]
+        if job_id and not _lock_is_irrelevant(jobs[job_id]):
+            logger.info("[%s] Found existing job: %s", query.query_hash, job_id)
+            enqueued.append(query)
+            continue
+
+        if job_id:
+            stale_locks.append(lock_id)
+        candidates.append(lock_id)
+
+    if stale_locks:
+        logger.info("Removing %d irrelevant job locks", len(stale_locks))
+        _remove_locks(*stale_locks)
+
+    pipe = redis_connection.pipeline()
+
+    new_jobs = []
+    for lock_id in candidates:
+        query_text, query = batch[lock_id]
+        metadata = {"query_id": query.id, "Username": "Scheduled"}
+        try:
+            queue_name, enqueue_kwargs = _enqueue_arguments(
+                query.data_source, query.user_id, False, query, metadata
+            )
+            queue = Queue(queue_name)
+            job = _create_job(
+                queue, query_text, query.data_source_id, metadata, enqueue_kwargs
+            )
+        except Exception as e:
+            failed(query, e)
+            continue
+
+        new_jobs.append((lock_id, queue, job, query))
+        pipe.set(lock_id, job.id, ex=settings.JOB_EXPIRY_TIME, nx=True)
+
+    if new_jobs:
+        pipe.sadd(JOB_LOCKS_KEY, *[lock_id for lock_id, _, _, _ in new_jobs])
+    acquired = pipe.execute()[: len(new_jobs)]
+
+    limited = []
+    unlimited = []
+    rq_pipe = rq_redis_connection.pipeline()
+    for (lock_id, queue, job, query), lock_acquired in zip(new_jobs, acquired):
+        if not lock_acquired:
+            enqueued.append(query)
+            continue
+
+        logger.info("[%s] Created new job: %s", query.query_hash, job.id)
+        try:
+            limit = dispatch.concurrency_limit(query.data_source)
+            if limit:
+                limited.append((lock_id, queue, job, query, limit))
+            else:
+                queue.enqueue_job(job, pipeline=rq_pipe)
+                unlimited.append((lock_id, query))
+        except Exception as e:
+            failed(query, e, lock_id)
+
+    try:
+        rq_pipe.execute()
+        enqueued.extend(query for _, query in unlimited)
+    except Exception as e:
+        for lock_id, query in unlimited:
+            failed(query, e, lock_id)
+
+    for lock_id, queue, job, query, limit in limited:
+        try:
+            dispatch.submit(queue, job, limit)
+            enqueued.append(query)
+        except Exception as e:
+            failed(query, e, lock_id)
+
+    return enqueued
+
+
 def signal_handler(*args):
     raise InterruptException
 
 
+def _thread_result_limit():
+    # Jobs running in worker threads share the worker's memory, so each one is
+    # held to its share of it.
+    if threading.current_thread() is not threading.main_thread():
+        return settings.RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES or None
+    return None
+
+
+def _job_result_limits(max_rows, max_bytes):
+    # This only bounds the memory of runners that stream their rows or collect
+    # them with limit_rows: the others hold their whole result before it's
+    # trimmed.
+    thread_limit = _thread_result_limit()
+    if thread_limit:
+        max_bytes = min(max_bytes or thread_limit, thread_limit)
+    return max_rows, max_bytes
+
+
 class QueryExecutionError(Exception):
     pass
 
@@ -158,6 +353,9 @@ class QueryExecutor(object):
         self.data_source_id = data_source_id
         self.metadata = metadata
         self.data_source = self._load_data_source()
+        self.result_limits = _job_result_limits(
+            *settings.dynamic_settings.query_result_limits(self.data_source)
+        )
         self.query_id = metadata.get("query_id")
         self.user = _resolve_user(user_id, is_api_key, metadata.get("query_id"))
         self.query_model = (
@@ -175,17 +373,32 @@ class QueryExecutor(object):
             models.scheduled_queries_executions.update(self.query_model.id)
 
     def run(self):
-        signal.signal(signal.SIGINT, signal_handler)
+        # Jobs running in a worker thread can't handle signals. The worker
+        # interrupts them when they're cancelled instead.
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, signal_handler)
         started_at = time.time()
 
         logger.debug("Executing query:\n%s", self.query)
         self._log_progress("executing_query")
 
         query_runner = self.data_source.query_runner
+        # HTTP runners get the whole response before picking their rows.
+        query_runner.max_response_bytes = _thread_result_limit()
         annotated_query = self._annotate_query(query_runner)
 
         try:
-            data, error = query_runner.run_query(annotated_query, self.user)
+            if query_runner.supports_streaming:
+                data = self._run_query_stream(query_runner, annotated_query)
+                error = None
+            else:
+                guard = ResultSizeGuard(*self.result_limits)
+                query_runner.result_guard = guard
+                data, error = query_runner.run_query(annotated_query, self.user)
+                data = self._limit_result(data, guard)
+        except QueryRunnerError as e:
+            data = None
+            error = str(e)
         except Exception as e:
             if isinstance(e, JobTimeoutException):
                 error = TIMEOUT_MESSAGE
@@ -196,6 +409,7 @@ class QueryExecutor(object):
             logger.warning("Unexpected error while running query:", exc_info=1)
 
         run_time = time.time() - started_at
+        self._release_dispatch_slot()
 
         logger.info(
             "job=execute_query query_hash=%s ds_id=%d data_length=%s error=[%s]",
@@ -233,6 +447,7 @@ class QueryExecutor(object):
             updated_query_ids = models.Query.update_latest_result(query_result)
 
             models.db.session.commit()  # make sure that alert sees the latest query result
+            models.results_cache.set(query_result)
             self._log_progress("checking_alerts")
             for query_id in updated_query_ids:
                 check_alerts_for_query.delay(query_id)
@@ -242,6 +457,57 @@ class QueryExecutor(object):
             models.db.session.commit()
             return result
 
+    def _release_dispatch_slot(self):
+        # The query is done with the data source, so its next pending query
+        # can go.
+        limit = dispatch.concurrency_limit(self.data_source)
+        if limit:
+            dispatch.release(self.data_source.id, limit, self.job.id)
+
+    def _run_query_stream(self, query_runner, annotated_query):
+        # Rows are encoded a batch at a time as they're fetched, so only the
+        # encoded result (and not every row) is held in memory.
+        # Once the result grows past its limits the stream is closed, which
+        # stops the runner from fetching any more rows.
+        encoder = query_runner.result_encoder
+        guard = ResultSizeGuard(*self.result_limits, cls=encoder)
+        stream = query_runner.run_query_stream(annotated_query, self.user)
+        try:
+            columns = next(stream)
+            data = models.QueryResult.encode_rows(columns, stream, encoder, guard)
+        finally:
+            stream.close()
+
+        if guard.truncated:
+            self._track_truncation()
+        return data
+
+    def _limit_result(self, data, guard):
+        # Runners that can't stream but collect their rows with
+        # BaseQueryRunner.limit_rows stopped fetching at the limits already.
+        # The others have fetched their whole result by now, so it's trimmed
+        # before being stored.
+        truncated = guard.truncated
+        max_rows, max_bytes = self.result_limits
+
+        # Every row takes at least 4 characters ("{}, "), so shorter results
+        # can't be over the row limit and don't need to be decoded.
+        over_bytes = max_bytes and len(data or "") > max_bytes
+        over_rows = max_rows and len(data or "") > 4 * max_rows
+        if over_bytes or over_rows:
+            result = truncate_encoded_result(data, max_rows, max_bytes)
+            if result is not None:
+                data = json_dumps(result)
+                truncated = True
+
+        if truncated:
+            self._track_truncation()
+        return data
+
+    def _track_truncation(self):
+        statsd_client.incr("query_results.truncated")
+        self._log_progress("truncated")
+
     def _annotate_query(self, query_runner):
         self.metadata["Job ID"] = self.job.id
         self.metadata["Query Hash"] = self.query_hash
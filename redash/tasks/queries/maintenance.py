@@ -1,8 +1,16 @@
+import itertools
 import logging
 import time
 
+from rq.job import Job, JobStatus
 from rq.timeouts import JobTimeoutException
-from redash import models, redis_connection, settings, statsd_client
+from redash import (
+    models,
+    redis_connection,
+    rq_redis_connection,
+    settings,
+    statsd_client,
+)
 from redash.models.parameterized_query import (
     InvalidParameterError,
     QueryDetachedFromDataSourceError,
@@ -10,9 +18,8 @@ from redash.models.parameterized_query import (
 from redash.tasks.failure_report import track_failure
 from redash.utils import json_dumps, sentry
 from redash.worker import job, get_job_logger
-from redash.monitor import rq_job_ids
 
-from .execution import enqueue_query
+from .execution import JOB_LOCKS_KEY, enqueue_scheduled_queries
 
 logger = get_job_logger(__name__)
 
@@ -28,7 +35,22 @@ def empty_schedules():
     logger.info("Deleted %d schedules.", len(queries))
 
 
-def _should_refresh_query(query):
+def _paused_data_sources(queries):
+    data_source_ids = list(
+        set(query.data_source_id for query in queries if query.data_source_id)
+    )
+    pipe = redis_connection.pipeline()
+    for data_source_id in data_source_ids:
+        pipe.get(models.DataSource.pause_key_for(data_source_id))
+
+    return {
+        data_source_id: reason
+        for data_source_id, reason in zip(data_source_ids, pipe.execute())
+        if reason is not None
+    }
+
+
+def _should_refresh_query(query, paused_data_sources):
     if settings.FEATURE_DISABLE_REFRESH_QUERIES:
         logger.info("Disabled refresh queries.")
         return False
@@ -38,12 +60,12 @@ def _should_refresh_query(query):
     elif query.data_source is None:
         logger.debug("Skipping refresh of %s because the datasource is none.", query.id)
         return False
-    elif query.data_source.paused:
+    elif query.data_source_id in paused_data_sources:
         logger.debug(
             "Skipping refresh of %s because datasource - %s is paused (%s).",
             query.id,
             query.data_source.name,
-            query.data_source.pause_reason,
+            paused_data_sources[query.data_source_id],
         )
         return False
     else:
@@ -83,29 +105,31 @@ def _apply_auto_limit(query_text, query):
     )
 
 
+def _report_enqueue_failure(query, e):
+    message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
+    logging.info(message)
+    error = RefreshQueriesError(message).with_traceback(e.__traceback__)
+    sentry.capture_exception(error)
+
+
 def refresh_queries():
     logger.info("Refreshing queries...")
-    enqueued = []
-    for query in models.Query.outdated_queries():
-        if not _should_refresh_query(query):
+    queries = models.Query.outdated_queries()
+    paused_data_sources = _paused_data_sources(queries)
+
+    scheduled = []
+    for query in queries:
+        if not _should_refresh_query(query, paused_data_sources):
             continue
 
         try:
             query_text = _apply_default_parameters(query)
             query_text = _apply_auto_limit(query_text, query)
-            enqueue_query(
-                query_text,
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata={"query_id": query.id, "Username": "Scheduled"},
-            )
-            enqueued.append(query)
+            scheduled.append((query_text, query))
         except Exception as e:
-            message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
-            logging.info(message)
-            error = RefreshQueriesError(message).with_traceback(e.__traceback__)
-            sentry.capture_exception(error)
+            _report_enqueue_failure(query, e)
+
+    enqueued = enqueue_scheduled_queries(scheduled, on_error=_report_enqueue_failure)
 
     status = {
         "outdated_queries_count": len(enqueued),
@@ -144,22 +168,56 @@ def cleanup_query_results():
     logger.info("Deleted %d unused query results.", deleted_count)
 
 
-def remove_ghost_locks():
+def _ghost_locks(lock_ids):
     """
-    Removes query locks that reference a non existing RQ job.
+    Returns which of `lock_ids` reference a job that is done or doesn't exist
+    anymore, and which locks are already gone.
     """
-    keys = redis_connection.keys("query_hash_job:*")
-    locks = {k: redis_connection.get(k) for k in keys}
-    jobs = list(rq_job_ids())
+    job_ids = redis_connection.mget(lock_ids)
+    locks = list(zip(lock_ids, job_ids))
+    held = [(lock_id, job_id) for lock_id, job_id in locks if job_id]
+    released = [lock_id for lock_id, job_id in locks if not job_id]
+
+    pipe = rq_redis_connection.pipeline()
+    for _, job_id in held:
+        pipe.hget(Job.key_for(job_id), "status")
+    statuses = pipe.execute()
+
+    done = (None, JobStatus.FINISHED.encode(), JobStatus.FAILED.encode())
+    ghosts = [lock_id for (lock_id, _), status in zip(held, statuses) if status in done]
 
-    count = 0
+    return ghosts, released
 
-    for lock, job_id in locks.items():
-        if job_id not in jobs:
-            redis_connection.delete(lock)
-            count += 1
 
-    logger.info("Locks found: {}, Locks removed: {}".format(len(locks), count))
+def remove_ghost_locks():
+    """
+    Removes query locks that reference a job that is done or doesn't exist.
+
+    Only the locks recorded in JOB_LOCKS_KEY are checked, a batch at a time
+    and without blocking Redis, so the cost is proportional to the number of
+    live locks rather than to the size of the keyspace or RQ's registries.
+    """
+    batch_size = settings.GHOST_LOCKS_BATCH_SIZE
+    found = removed = 0
+
+    lock_ids = redis_connection.sscan_iter(JOB_LOCKS_KEY, count=batch_size)
+    while True:
+        batch = list(itertools.islice(lock_ids, batch_size))
+        if not batch:
+            break
+
+        ghosts, released = _ghost_locks(batch)
+        found += len(batch) - len(released)
+
+        pipe = redis_connection.pipeline()
+        if ghosts:
+            pipe.delete(*ghosts)
+        if ghosts or released:
+            pipe.srem(JOB_LOCKS_KEY, *(ghosts + released))
+        pipe.execute()
+        removed += len(ghosts)
+
+    logger.info("Locks found: {}, Locks removed: {}".format(found, removed))
 
 
 @job("schemas")
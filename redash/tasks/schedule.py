@@ -12,11 +12,14 @@ from redash.tasks import (
     sync_user_details,
     refresh_queries,
     remove_ghost_locks,
+    dispatch_pending_queries,
     empty_schedules,
     refresh_schemas,
     cleanup_query_results,
     version_check,
     send_aggregated_errors,
+    flush_events,
+    refresh_status,
     Queue,
 )
 
@@ -66,6 +69,11 @@ def periodic_job_definitions():
             "interval": timedelta(minutes=1),
             "result_ttl": 600,
         },
+        {
+            "func": dispatch_pending_queries,
+            "interval": timedelta(minutes=1),
+            "result_ttl": 600,
+        },
         {"func": empty_schedules, "interval": timedelta(minutes=60)},
         {
             "func": refresh_schemas,
@@ -81,6 +89,16 @@ def periodic_job_definitions():
             "func": send_aggregated_errors,
             "interval": timedelta(minutes=settings.SEND_FAILURE_EMAIL_INTERVAL),
         },
+        {
+            "func": flush_events,
+            "interval": settings.EVENTS_FLUSH_INTERVAL,
+            "result_ttl": 600,
+        },
+        {
+            "func": refresh_status,
+            "interval": settings.STATUS_SNAPSHOT_INTERVAL,
+            "result_ttl": 600,
+        },
     ]
 
     if settings.VERSION_CHECK:
@@ -1,12 +1,27 @@
+import ctypes
 import errno
 import os
 import signal
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import timedelta
+
+from flask import current_app
 from redash import statsd_client
+from redash.models.base import db
+from redash.query_runner import InterruptException
 from rq import Queue as BaseQueue, get_current_job
+from rq.exceptions import DequeueTimeout, NoSuchJobError
 from rq.worker import HerokuWorker # HerokuWorker implements graceful shutdown on SIGTERM
-from rq.utils import utcnow
-from rq.timeouts import UnixSignalDeathPenalty, HorseMonitorTimeoutException
+from rq.worker import WorkerStatus
+from rq.utils import as_text, utcnow, utcparse
+from rq.timeouts import (
+    BaseDeathPenalty,
+    UnixSignalDeathPenalty,
+    HorseMonitorTimeoutException,
+)
 from rq.job import Job as BaseJob, JobStatus
 
 
@@ -47,10 +62,25 @@ class StatsdRecordingWorker(HerokuWorker):
     """
 
     def execute_job(self, job, queue):
+        with self.record_job_metrics(job, queue):
+            super().execute_job(job, queue)
+
+    @contextmanager
+    def record_job_metrics(self, job, queue):
         statsd_client.incr("rq.jobs.running.{}".format(queue.name))
         statsd_client.incr("rq.jobs.started.{}".format(queue.name))
+        data_source_id = job.meta.get("data_source_id")
+        if data_source_id and job.created_at:
+            # How long queries wait before they start, including the time they
+            # were held back by their data source's concurrency limit.
+            wait_time = utcnow() - job.created_at
+            priority = "scheduled" if job.meta.get("scheduled") else "interactive"
+            statsd_client.timing(
+                "query_dispatch.{}.wait_time".format(data_source_id), wait_time
+            )
+            statsd_client.timing("queries.{}.wait_time".format(priority), wait_time)
         try:
-            super().execute_job(job, queue)
+            yield
         finally:
             statsd_client.decr("rq.jobs.running.{}".format(queue.name))
             if job.get_status() == JobStatus.FINISHED:
@@ -165,7 +195,398 @@ class HardLimitingWorker(HerokuWorker):
             )
 
 
-class RedashWorker(StatsdRecordingWorker, HardLimitingWorker):
+class PriorityWorker(HerokuWorker):
+    """
+    RQ workers serve their queues strictly in the order they're listed, so a
+    backlog on the first queues holds back every job of the next ones for as
+    long as it lasts. The PriorityWorker serves the queue whose oldest job has
+    waited longest instead, counting jobs of each queue as enqueued `aging`
+    seconds later than those of the queue listed before it. A job then waits
+    behind jobs of the queues listed first for no longer than that, and no
+    queue is starved.
+    """
+
+    def __init__(self, *args, aging=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aging = aging
+
+    def ordered_queues(self):
+        if not self.aging or len(self.queues) < 2:
+            return self.queues
+
+        pipe = self.connection.pipeline()
+        for queue in self.queues:
+            pipe.lindex(queue.key, 0)
+        waiting = [
+            (rank, queue, as_text(job_id))
+            for rank, (queue, job_id) in enumerate(zip(self.queues, pipe.execute()))
+            if job_id is not None
+        ]
+
+        for _, _, job_id in waiting:
+            pipe.hget(self.job_class.key_for(job_id), "enqueued_at")
+
+        heads = []
+        for (rank, queue, _), enqueued_at in zip(waiting, pipe.execute()):
+            if enqueued_at is None:
+                continue
+            enqueued_at = utcparse(as_text(enqueued_at))
+            heads.append((enqueued_at + timedelta(seconds=rank * self.aging), queue))
+
+        # sorted is stable, so queues with ties stay in their listed order
+        ordered = [queue for _, queue in sorted(heads, key=lambda head: head[0])]
+        return ordered + [queue for queue in self.queues if queue not in ordered]
+
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        # Same as RQ's, but the order of the queues is decided again on every
+        # attempt.
+        result = None
+        qnames = ",".join(self.queue_names())
+
+        self.set_state(WorkerStatus.IDLE)
+        self.procline("Listening on " + qnames)
+        self.log.debug("*** Listening on %s...", qnames)
+
+        while True:
+            self.heartbeat()
+
+            if self.should_run_maintenance_tasks:
+                self.run_maintenance_tasks()
+
+            try:
+                result = self.queue_class.dequeue_any(
+                    self.ordered_queues(),
+                    timeout,
+                    connection=self.connection,
+                    job_class=self.job_class,
+                )
+                if result is not None:
+                    job, queue = result
+                    job.redis_server_version = self.get_redis_server_version()
+                    if self.log_job_description:
+                        self.log.info(
+                            "%s: %s (%s)", queue.name, job.description, job.id
+                        )
+                    else:
+                        self.log.info("%s: %s", queue.name, job.id)
+
+                break
+            except DequeueTimeout:
+                pass
+
+        self.heartbeat()
+        return result
+
+
+class CancellationWatcher(threading.Thread):
+    """
+    Keeps the worker's heartbeat while a job runs in the worker process, and
+    calls `interrupt` once the job is cancelled.
+
+    There's no work horse to kill when the job outlives its timeout (plus the
+    worker's `grace_period`), e.g. when it's blocked in a call that never
+    returns, so that's logged and counted in the `rq.jobs.overrun.<queue>`
+    metric instead.
+    """
+
+    def __init__(self, worker, job, interrupt):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.job_id = job.id
+        self.queue_name = job.origin
+        self.interrupt = interrupt
+        self.done = threading.Event()
+        self.hard_limit = None
+        if job.timeout is not None and job.timeout != -1:
+            self.hard_limit = job.timeout + getattr(worker, "grace_period", 0)
+
+    def is_cancelled(self):
+        try:
+            # A copy of the job, as the one being performed isn't thread-safe.
+            job = self.worker.job_class.fetch(
+                self.job_id, connection=self.worker.connection
+            )
+        except NoSuchJobError:
+            return False
+        return job.is_cancelled
+
+    def report_overrun(self):
+        self.worker.log.warning(
+            "Job %s exceeded its hard time limit of %ds but is still running.",
+            self.job_id,
+            self.hard_limit,
+        )
+        statsd_client.incr("rq.jobs.overrun.{}".format(self.queue_name))
+
+    def run(self):
+        interval = self.worker.job_monitoring_interval
+        started_at = time.time()
+        cancelled = overrun = False
+        while not self.done.wait(interval):
+            self.worker.heartbeat(interval + 60)
+            if not cancelled and self.is_cancelled():
+                cancelled = True
+                self.interrupt()
+
+            if (
+                not overrun
+                and self.hard_limit is not None
+                and time.time() - started_at > self.hard_limit
+            ):
+                overrun = True
+                self.report_overrun()
+
+
+class InProcessWorker(HerokuWorker):
+    """
+    Forking a work horse for each job (and having it reconnect to the database
+    and Redis) costs a lot more than short jobs like recording an event or
+    sending an email. For queues listed in `in_process_queues`, the
+    InProcessWorker runs jobs in the worker process itself instead.
+
+    Time limits are enforced the same way work horses enforce their soft limit
+    (a SIGALRM raising JobTimeoutException), and cancelled jobs are interrupted
+    with an InterruptException. There's no hard limit though, as there's no
+    work horse to kill: jobs outliving it are only reported (see
+    CancellationWatcher).
+    """
+
+    def __init__(self, *args, in_process_queues=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_process_queues = set(in_process_queues)
+
+    def execute_job(self, job, queue):
+        if queue.name in self.in_process_queues:
+            self.execute_job_in_process(job, queue)
+        else:
+            super().execute_job(job, queue)
+
+    def restore_signal_handlers(self, handlers):
+        # Jobs may install their own handlers (execute_query does for SIGINT),
+        # which shouldn't outlive them. Handlers the worker installed for a
+        # shutdown requested meanwhile are kept.
+        shutdown_handlers = (self.request_stop, self.request_force_stop)
+        for signum, handler in handlers.items():
+            if signal.getsignal(signum) not in shutdown_handlers:
+                signal.signal(signum, handler)
+
+    def execute_job_in_process(self, job, queue):
+        handlers = {
+            signum: signal.getsignal(signum)
+            for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1)
+        }
+        lock = threading.Lock()
+
+        def cancel():
+            with lock:
+                if not watcher.done.is_set():
+                    os.kill(os.getpid(), signal.SIGUSR1)
+
+        def interrupt(signum, frame):
+            if not watcher.done.is_set():
+                self.log.warning("Job %s has been cancelled.", job.id)
+                raise InterruptException("Job has been cancelled.")
+
+        watcher = CancellationWatcher(self, job, cancel)
+        self.set_state(WorkerStatus.BUSY)
+        signal.signal(signal.SIGUSR1, interrupt)
+        watcher.start()
+        try:
+            try:
+                self.perform_job(job, queue)
+            finally:
+                with lock:
+                    watcher.done.set()
+        except InterruptException:
+            # perform_job() handles the job's own exceptions, so this one was
+            # delivered once the job was over: it would stop the worker.
+            self.log.debug("Ignoring late interrupt of job %s.", job.id)
+        finally:
+            watcher.join()
+            self.restore_signal_handlers(handlers)
+            # A forked work horse would take its database session down with it.
+            db.session.remove()
+        self.set_state(WorkerStatus.IDLE)
+
+
+def raise_in_thread(thread_id, exception):
+    """Raises `exception` in another thread, once it runs Python code again."""
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exception)
+    )
+
+
+class ThreadDeathPenalty(BaseDeathPenalty):
+    """
+    Time limit for jobs that run in a worker thread, where SIGALRM can't be
+    used. The exception is raised in the job's thread by a timer.
+    """
+
+    def setup_death_penalty(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._timer = None
+        if self._timeout <= 0:
+            return
+
+        self._timer = threading.Timer(
+            self._timeout, self.handle_death_penalty, (threading.get_ident(),)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def handle_death_penalty(self, thread_id):
+        with self._lock:
+            if not self._cancelled:
+                raise_in_thread(thread_id, self._exception)
+
+    def cancel_death_penalty(self):
+        with self._lock:
+            self._cancelled = True
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+class ThreadedWorker(StatsdRecordingWorker):
+    """
+    Most data sources spend nearly all of a query's time waiting on the
+    network, so a process per running query wastes a lot of memory. For queues
+    listed in `threaded_queues`, the ThreadedWorker runs up to `threads` jobs
+    at once, each in a thread of the worker process.
+
+    Each job gets its own time limit and is interrupted on cancellation, by
+    raising JobTimeoutException or InterruptException in its thread. Those are
+    only raised once the thread runs Python code again, so they can't stop a
+    job blocked in a call that never returns; such jobs are reported once they
+    outlive their hard limit. Results of threaded jobs are
+    also capped at RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES, as they all share
+    the process' memory.
+
+    Jobs of other queues wait for the running threads to finish first, as
+    forking a process with running threads isn't safe. On a cold shutdown,
+    jobs running in threads are interrupted, and the worker waits for them
+    for `cold_shutdown_grace_period` seconds at most.
+    """
+
+    cold_shutdown_grace_period = 10
+
+    def __init__(self, *args, threaded_queues=(), threads=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threaded_queues = set(threaded_queues)
+        self.threads = threads
+        self._executor = None
+        self._running = set()
+        # thread id -> function interrupting the job running in that thread
+        self._interrupts = {}
+        self._force_stopping = False
+
+    @property
+    def death_penalty_class(self):
+        if threading.current_thread() is threading.main_thread():
+            return UnixSignalDeathPenalty
+        return ThreadDeathPenalty
+
+    def wait_for_threads(self, limit=0, timeout=None):
+        """Waits until no more than `limit` jobs are running in threads, or for
+        `timeout` seconds at most. Returns whether they're down to `limit`."""
+        deadline = None if timeout is None else time.time() + timeout
+        while len(self._running) > limit:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            done, self._running = wait(
+                self._running, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            if not done:
+                return False
+
+            for future in done:
+                if future.exception() is not None:
+                    self.log.error(
+                        "Failed running job in thread.", exc_info=future.exception()
+                    )
+        return True
+
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        # Jobs are only taken off the queues once a thread is free to run
+        # them: until then they're left to idle workers, and aren't lost if
+        # this one dies (they'd be in neither the queue nor the
+        # StartedJobRegistry meanwhile).
+        while not self.wait_for_threads(limit=self.threads - 1, timeout=timeout):
+            self.heartbeat()
+        return super().dequeue_job_and_maintain_ttl(timeout)
+
+    def execute_job(self, job, queue):
+        if queue.name not in self.threaded_queues:
+            self.wait_for_threads()
+            return super().execute_job(job, queue)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads)
+
+        self._running.add(
+            self._executor.submit(
+                self.execute_job_in_thread,
+                current_app._get_current_object(),
+                job,
+                queue,
+            )
+        )
+
+    def execute_job_in_thread(self, app, job, queue):
+        thread_id = threading.get_ident()
+        lock = threading.Lock()
+
+        def interrupt():
+            # Once the job is done, the exception would land in the cleanup
+            # below instead.
+            with lock:
+                if not watcher.done.is_set():
+                    raise_in_thread(thread_id, InterruptException)
+
+        watcher = CancellationWatcher(self, job, interrupt)
+        self._interrupts[thread_id] = interrupt
+        try:
+            with app.app_context(), self.record_job_metrics(job, queue):
+                watcher.start()
+                try:
+                    self.perform_job(job, queue)
+                finally:
+                    with lock:
+                        watcher.done.set()
+                    watcher.join()
+        finally:
+            self._interrupts.pop(thread_id, None)
+            db.session.remove()
+
+    def request_force_stop(self, signum, frame):
+        self._force_stopping = True
+        for interrupt in list(self._interrupts.values()):
+            interrupt()
+        super().request_force_stop(signum, frame)
+
+    def register_death(self):
+        # Called when the worker stops: let jobs still running in threads
+        # finish before, unless it's a cold shutdown.
+        if self._force_stopping:
+            if not self.wait_for_threads(timeout=self.cold_shutdown_grace_period):
+                self.log.warning(
+                    "Gave up waiting for %d jobs running in threads.",
+                    len(self._running),
+                )
+        else:
+            self.wait_for_threads()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=not self._force_stopping)
+        super().register_death()
+
+
+class RedashWorker(
+    ThreadedWorker,
+    StatsdRecordingWorker,
+    PriorityWorker,
+    InProcessWorker,
+    HardLimitingWorker,
+):
     queue_class = RedashQueue
 
 
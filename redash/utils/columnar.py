@@ -0,0 +1,187 @@
+"""
+Compact, compressed columnar encoding for query result data.
+
+A result (`{"columns": [...], "rows": [...]}`) is split into blocks of rows and
+every column of every block is stored as its own zlib compressed JSON array.
+A small header describes the columns, the row count and where each block
+lives, so readers can decode a subset of rows and columns without touching
+the rest of the payload.
+
+Layout: MAGIC | header length (4 bytes, big endian) | header | blocks
+"""
+import struct
+import zlib
+
+from redash.utils import json_dumps, json_loads
+
+MAGIC = b"RDC\x01"
+DEFAULT_BLOCK_SIZE = 10000
+COMPRESSION_LEVEL = 6
+
+_header_length = struct.Struct(">I")
+
+
+class UnsupportedResultError(ValueError):
+    pass
+
+
+def _decompress(chunk):
+    return json_loads(zlib.decompress(chunk).decode("utf-8"))
+
+
+def is_columnar(payload):
+    return isinstance(payload, (bytes, memoryview)) and bytes(payload[:4]) == MAGIC
+
+
+def serialize(data, block_size=DEFAULT_BLOCK_SIZE):
+    """Encode query result data. Raises UnsupportedResultError for data that
+    isn't a columns/rows table (or whose rows carry keys that aren't listed as
+    columns), in which case callers should keep storing it as JSON."""
+    if not isinstance(data, dict) or not isinstance(data.get("columns"), list):
+        raise UnsupportedResultError("Result has no column list.")
+
+    rows = data.get("rows") or []
+    known_names = set(column["name"] for column in data["columns"])
+
+    for row in rows:
+        if not isinstance(row, dict) or not known_names.issuperset(row):
+            raise UnsupportedResultError("Result rows don't match its columns.")
+
+    writer = ColumnarWriter(data["columns"], block_size)
+    writer.write(rows)
+    return writer.finish(
+        {k: v for k, v in data.items() if k not in ("columns", "rows")}
+    )
+
+
+class ColumnarWriter(object):
+    """Encodes a result incrementally: rows are added in any number of
+    batches and compressed a block at a time, so only one block of rows is
+    ever buffered. Rows are expected to only carry keys listed as columns."""
+
+    def __init__(self, columns, block_size=DEFAULT_BLOCK_SIZE, **dumps_kwargs):
+        self.columns = columns
+        self.block_size = block_size
+        self.row_count = 0
+        self._names = [column["name"] for column in columns]
+        self._dumps_kwargs = dumps_kwargs
+        self._pending = []
+        self._blocks = [[] for _ in self._names]
+        self._chunks = []
+        self._offset = 0
+
+    def _compress(self, values):
+        return zlib.compress(
+            json_dumps(values, **self._dumps_kwargs).encode("utf-8"),
+            COMPRESSION_LEVEL,
+        )
+
+    def _flush(self, rows):
+        for index, name in enumerate(self._names):
+            chunk = self._compress([row.get(name) for row in rows])
+            self._blocks[index].append((self._offset, len(chunk)))
+            self._chunks.append(chunk)
+            self._offset += len(chunk)
+
+    def write(self, rows):
+        self._pending.extend(rows)
+        self.row_count += len(rows)
+
+        while len(self._pending) >= self.block_size:
+            self._flush(self._pending[: self.block_size])
+            del self._pending[: self.block_size]
+
+    def finish(self, extra=None):
+        if self._pending:
+            self._flush(self._pending)
+            self._pending = []
+
+        header = zlib.compress(
+            json_dumps(
+                {
+                    "columns": self.columns,
+                    "row_count": self.row_count,
+                    "block_size": self.block_size,
+                    "blocks": self._blocks,
+                    "extra": extra or {},
+                }
+            ).encode("utf-8")
+        )
+
+        return b"".join(
+            [MAGIC, _header_length.pack(len(header)), header] + self._chunks
+        )
+
+
+class ColumnarReader(object):
+    def __init__(self, payload):
+        if not is_columnar(payload):
+            raise UnsupportedResultError("Payload is not a columnar result.")
+
+        self.payload = memoryview(payload)
+        (length,) = _header_length.unpack_from(self.payload, len(MAGIC))
+        body_start = len(MAGIC) + _header_length.size
+
+        header = json_loads(
+            zlib.decompress(self.payload[body_start : body_start + length]).decode(
+                "utf-8"
+            )
+        )
+        self.columns = header["columns"]
+        self.row_count = header["row_count"]
+        self.block_size = header["block_size"]
+        self.extra = header["extra"]
+        self._blocks = header["blocks"]
+        self._body_start = body_start + length
+
+    def _column_values(self, index, first, last):
+        values = []
+        for block in range(first // self.block_size, last // self.block_size + 1):
+            offset, length = self._blocks[index][block]
+            start = self._body_start + offset
+            values.extend(_decompress(self.payload[start : start + length]))
+
+        skip = first - (first // self.block_size) * self.block_size
+        return values[skip : skip + last - first + 1]
+
+    def read(self, offset=0, limit=None, columns=None):
+        """Decode `limit` rows starting at `offset`, keeping only the given
+        column names (all of them by default)."""
+        if columns is None:
+            selected = list(enumerate(self.columns))
+        else:
+            wanted = set(columns)
+            selected = [
+                (index, column)
+                for index, column in enumerate(self.columns)
+                if column["name"] in wanted
+            ]
+
+        end = self.row_count if limit is None else min(self.row_count, offset + limit)
+        names = [column["name"] for _, column in selected]
+
+        if offset >= end:
+            rows = []
+        elif not selected:
+            rows = [{} for _ in range(end - offset)]
+        else:
+            values = [
+                self._column_values(index, offset, end - 1) for index, _ in selected
+            ]
+            rows = [dict(zip(names, row)) for row in zip(*values)]
+
+        data = dict(self.extra)
+        data["columns"] = [column for _, column in selected]
+        data["rows"] = rows
+        return data
+
+    def iter_rows(self, columns=None):
+        """Yield rows one block at a time, so only a single block is decoded
+        at any moment."""
+        for offset in range(0, self.row_count, self.block_size):
+            for row in self.read(offset, self.block_size, columns)["rows"]:
+                yield row
+
+
+def deserialize(payload):
+    return ColumnarReader(payload).read()
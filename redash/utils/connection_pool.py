@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except Exception:
+        logger.debug("Failed closing pooled connection.", exc_info=True)
+
+
+class ConnectionPool(object):
+    """Keeps the idle DB-API connections of this process, grouped by a key
+    identifying what they're connected to, so later jobs can reuse them
+    instead of opening new ones. Up to `max_idle` connections are kept per
+    key, and connections idle for longer than `idle_timeout` seconds are
+    closed instead of reused.
+
+    Only long-lived processes benefit from it: jobs of in-process or threaded
+    queues and the web process. A forked work horse exits with whatever it
+    put back in the pool."""
+
+    def __init__(self, max_idle, idle_timeout, metrics_prefix=None):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.metrics_prefix = metrics_prefix
+        self.hits = 0
+        self.misses = 0
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+        # connections of the parent process, see _after_fork
+        self._inherited = []
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked process (like an RQ work horse) shares the sockets of the
+        # idle connections with its parent, which may still use them. They're
+        # kept referenced but unused here, as closing them (explicitly or when
+        # they're collected) would also close them for the parent.
+        self._inherited.append(self._idle)
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _count(self, event):
+        # Imported here, as query runners (which create the pool) are loaded
+        # before the statsd client is set up.
+        from redash import statsd_client
+
+        if self.metrics_prefix:
+            statsd_client.incr("{}.{}".format(self.metrics_prefix, event))
+
+    def _pop_idle(self, key):
+        with self._lock:
+            idle = self._idle[key]
+            return idle.pop() if idle else (None, None)
+
+    def acquire(self, key, connect, check):
+        """Returns an idle connection for `key` that passes `check`, or a new
+        one from `connect` when there's none. `check` gets the connection
+        before it's reused and should reset its session, raising if the
+        connection isn't usable anymore."""
+        while True:
+            connection, released_at = self._pop_idle(key)
+            if connection is None:
+                break
+
+            if time.time() - released_at > self.idle_timeout:
+                _close(connection)
+                continue
+
+            try:
+                check(connection)
+            except Exception:
+                logger.info("Discarding broken pooled connection.", exc_info=True)
+                self._count("discard")
+                _close(connection)
+                continue
+
+            self.hits += 1
+            self._count("hit")
+            return connection
+
+        self.misses += 1
+        self._count("miss")
+        return connect()
+
+    def release(self, key, connection):
+        """Returns a connection that is done running a job to the pool. Only
+        release connections that are in a clean state; close the others."""
+        now = time.time()
+        expired = []
+
+        with self._lock:
+            idle = self._idle[key]
+            while idle and now - idle[0][1] > self.idle_timeout:
+                expired.append(idle.pop(0)[0])
+
+            if len(idle) < self.max_idle:
+                idle.append((connection, now))
+                connection = None
+
+        for stale in expired + [connection]:
+            if stale is not None:
+                _close(stale)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+
+        for connections in idle.values():
+            for connection, _ in connections:
+                _close(connection)
+
+    def __len__(self):
+        return sum(len(connections) for connections in self._idle.values())
@@ -0,0 +1,89 @@
+"""
+A thread safe, least recently used cache bounded by the total size of its
+items rather than their count. Callers report each item's size when adding it.
+"""
+import threading
+from collections import OrderedDict
+
+from redash import statsd_client
+
+
+class LRUCache(object):
+    def __init__(self, max_size, metrics_prefix=None):
+        self.max_size = max_size
+        self.metrics_prefix = metrics_prefix
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _incr(self, name, count=1):
+        if self.metrics_prefix:
+            statsd_client.incr("{}.{}".format(self.metrics_prefix, name), count)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+            else:
+                self._items.move_to_end(key)
+                self.hits += 1
+
+        if item is None:
+            self._incr("miss")
+            return None
+
+        self._incr("hit")
+        return item[0]
+
+    def set(self, key, value, size):
+        """Adds an item, evicting the least recently used ones to make room.
+        Items larger than the whole cache aren't stored."""
+        if not self.enabled or size > self.max_size:
+            return False
+
+        evicted = 0
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+
+            self._items[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+                evicted += 1
+
+            self.evictions += evicted
+
+        if evicted:
+            self._incr("eviction", evicted)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self.size -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
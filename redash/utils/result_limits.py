@@ -0,0 +1,123 @@
+"""
+Row and size limits for query results.
+
+Sizes are measured on the JSON encoding of the rows, which is close to what
+ends up being stored and served. A falsy limit means no limit.
+"""
+import re
+
+import simplejson
+
+from redash.utils import json_dumps
+
+_decoder = simplejson.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*").match
+
+
+class ResultSizeGuard(object):
+    """Keeps count of the rows and bytes admitted into a result while it's
+    being fetched, and trims the batch that crosses `max_rows` or `max_bytes`.
+    Once it trimmed anything the result is `truncated` and callers should stop
+    fetching."""
+
+    def __init__(self, max_rows=None, max_bytes=None, **dumps_kwargs):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+        self._dumps_kwargs = dumps_kwargs
+
+    def _encode(self, rows):
+        return json_dumps(rows, **self._dumps_kwargs)[1:-1]
+
+    def _rows_within(self, rows, budget):
+        kept = 0
+        for row in rows:
+            # Two extra characters for the separator between rows.
+            budget -= len(json_dumps(row, **self._dumps_kwargs)) + 2
+            if budget < 0:
+                break
+            kept += 1
+        return rows[:kept]
+
+    def admit(self, rows):
+        """Returns the part of `rows` that fits within the limits, and the rows'
+        JSON encoding (without the enclosing brackets) when it was needed to
+        measure them, None otherwise."""
+        if self.max_rows and self.row_count + len(rows) > self.max_rows:
+            rows = rows[: max(self.max_rows - self.row_count, 0)]
+            self.truncated = True
+
+        encoded = None
+        if self.max_bytes:
+            encoded = self._encode(rows)
+            if self.byte_count + len(encoded) > self.max_bytes:
+                rows = self._rows_within(rows, self.max_bytes - self.byte_count)
+                encoded = self._encode(rows)
+                self.truncated = True
+            self.byte_count += len(encoded)
+
+        self.row_count += len(rows)
+        return rows, encoded
+
+
+def _skip_separator(data, index, separator):
+    index = _whitespace(data, index).end()
+    if data[index : index + 1] == separator:
+        index = _whitespace(data, index + 1).end()
+    return index
+
+
+def _decode_rows(data, index, max_rows, max_bytes):
+    # Decodes the rows array starting at `index` a row at a time, keeping the
+    # rows within the limits. Returns them, whether any were dropped, and the
+    # index past the array.
+    rows = []
+    byte_count = 0
+    truncated = False
+    index = _whitespace(data, index + 1).end()
+    while data[index : index + 1] != "]":
+        row, index = _decoder.raw_decode(data, index)
+        if not truncated and max_bytes:
+            # Measured like ResultSizeGuard does.
+            byte_count += len(json_dumps(row)) + 2
+        if truncated or (max_rows and len(rows) >= max_rows):
+            truncated = True
+        elif max_bytes and byte_count > max_bytes:
+            truncated = True
+        else:
+            rows.append(row)
+        index = _skip_separator(data, index, ",")
+
+    return rows, truncated, index + 1
+
+
+def truncate_encoded_result(data, max_rows=None, max_bytes=None):
+    """Trims the rows of an already fetched result, still encoded as JSON, to
+    the limits. Rows are decoded one at a time and only those kept are held,
+    so a result over the limits is never decoded as a whole. Returns the
+    result flagged as truncated when any rows were dropped, None otherwise."""
+    index = _whitespace(data, 0).end()
+    if data[index : index + 1] != "{":
+        return None
+
+    result = {}
+    truncated = False
+    index = _whitespace(data, index + 1).end()
+    while data[index : index + 1] != "}":
+        key, index = _decoder.raw_decode(data, index)
+        index = _skip_separator(data, index, ":")
+        if key == "rows" and data[index : index + 1] == "[":
+            result[key], truncated, index = _decode_rows(
+                data, index, max_rows, max_bytes
+            )
+        else:
+            result[key], index = _decoder.raw_decode(data, index)
+        index = _skip_separator(data, index, ",")
+
+    if not truncated:
+        return None
+
+    result["truncated"] = True
+    return result
@@ -24,7 +24,7 @@ os.environ["REDASH_ENFORCE_CSRF"] = "false"
 
 from redash import limiter, redis_connection
 from redash.app import create_app
-from redash.models import db
+from redash.models import db, decoded_results
 from redash.utils import json_dumps, json_loads
 from tests.factories import Factory, user_factory
 
@@ -67,6 +67,7 @@ class BaseTestCase(TestCase):
         db.get_engine(self.app).dispose()
         self.app_ctx.pop()
         redis_connection.flushdb()
+        decoded_results.clear()
 
     def make_request(
         self,
@@ -176,6 +176,46 @@ class TestDataSourceListResourcePost(BaseTestCase):
 
         self.assertIsNotNone(DataSource.query.get(rv.json["id"]))
 
+    def test_accepts_result_limit_options(self):
+        admin = self.factory.create_admin()
+        options = {"dbname": "redash", "max_result_rows": 1000}
+        rv = self.make_request(
+            "post",
+            "/api/data_sources",
+            data={"name": "DS 1", "type": "pg", "options": options},
+            user=admin,
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        data_source = DataSource.query.get(rv.json["id"])
+        self.assertEqual(1000, data_source.options["max_result_rows"])
+
+    def test_accepts_concurrency_limit_option(self):
+        admin = self.factory.create_admin()
+        options = {"dbname": "redash", "max_concurrent_queries": 4}
+        rv = self.make_request(
+            "post",
+            "/api/data_sources",
+            data={"name": "DS 1", "type": "pg", "options": options},
+            user=admin,
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        data_source = DataSource.query.get(rv.json["id"])
+        self.assertEqual(4, data_source.options["max_concurrent_queries"])
+
+    def test_rejects_invalid_result_limit_options(self):
+        admin = self.factory.create_admin()
+        options = {"dbname": "redash", "max_result_rows": "many"}
+        rv = self.make_request(
+            "post",
+            "/api/data_sources",
+            data={"name": "DS 1", "type": "pg", "options": options},
+            user=admin,
+        )
+
+        self.assertEqual(rv.status_code, 400)
+
 
 class TestDataSourcePausePost(BaseTestCase):
     def test_pauses_data_source(self):
@@ -0,0 +1,50 @@
+from mock import patch
+
+from tests import BaseTestCase
+from redash import models
+from redash.handlers import events
+
+
+class TestEventsResourceGet(BaseTestCase):
+    def setUp(self):
+        super(TestEventsResourceGet, self).setUp()
+        events.get_location.cache_clear()
+        events.get_browser.cache_clear()
+
+    def record_events(self, count):
+        for i in range(count):
+            models.Event.record(
+                {
+                    "org_id": self.factory.org.id,
+                    "user_id": self.factory.user.id,
+                    "action": "view",
+                    "object_type": "dashboard",
+                    "object_id": i,
+                    "timestamp": 0,
+                    "ip": "127.0.0.1",
+                    "user_agent": "Mozilla/5.0 (X11; Linux x86_64) Firefox/80.0",
+                }
+            )
+        models.db.session.commit()
+
+    def test_enriches_repeated_ips_and_user_agents_once(self):
+        self.record_events(3)
+        admin = self.factory.create_admin()
+
+        with patch.object(events, "_geoip_reader") as reader, patch.object(
+            events, "parse_ua", return_value="Firefox 80"
+        ) as parse_ua:
+            reader.return_value.get.return_value = {
+                "country": {"names": {"en": "Israel"}}
+            }
+            rv = self.make_request("get", "/api/events", user=admin)
+
+        self.assertEqual(200, rv.status_code)
+        self.assertEqual(3, len(rv.json["results"]))
+        self.assertEqual("Israel", rv.json["results"][0]["location"])
+        self.assertEqual("Firefox 80", rv.json["results"][0]["browser"])
+        reader.return_value.get.assert_called_once_with("127.0.0.1")
+        parse_ua.assert_called_once()
+
+    def test_unknown_location_without_ip(self):
+        self.assertEqual("Unknown", events.get_location(None))
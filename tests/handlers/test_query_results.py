@@ -1,6 +1,9 @@
+from mock import patch
+
 from redash.query_runner import BaseSQLQueryRunner, BaseQueryRunner
 from tests import BaseTestCase
 
+from redash import models
 from redash.models import db
 from redash.utils import json_dumps
 from redash.handlers.query_results import error_messages
@@ -59,6 +62,26 @@ class TestQueryResultListAPI(BaseTestCase):
         self.assertEqual(rv.status_code, 200)
         self.assertEqual(query_result.id, rv.json["query_result"]["id"])
 
+    def test_serves_results_from_shared_cache(self):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query()
+        data = {
+            "data_source_id": self.factory.data_source.id,
+            "query": query.query_text,
+        }
+
+        with patch.object(models.results_cache, "enabled", True):
+            rv = self.make_request("post", "/api/query_results", data=data)
+            self.assertEqual(query_result.id, rv.json["query_result"]["id"])
+
+            with patch.object(models.QueryResult, "get_latest") as get_latest:
+                rv = self.make_request("post", "/api/query_results", data=data)
+                get_latest.assert_not_called()
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(query_result.id, rv.json["query_result"]["id"])
+        self.assertEqual(query_result.data, rv.json["query_result"]["data"])
+
     def test_execute_new_query(self):
         query_result = self.factory.create_query_result()
         query = self.factory.create_query()
@@ -371,6 +394,50 @@ class TestQueryResultAPI(BaseTestCase):
         self.assertEqual(rv.status_code, 403)
 
 
+class TestQueryResultPagination(BaseTestCase):
+    def setUp(self):
+        super(TestQueryResultPagination, self).setUp()
+        data = {
+            "rows": [{"a": i, "b": i * 2} for i in range(10)],
+            "columns": [{"name": "a", "type": "integer"}, {"name": "b", "type": "integer"}],
+        }
+        self.query_result = self.factory.create_query_result(data=json_dumps(data))
+
+    def test_returns_page_of_rows(self):
+        rv = self.make_request(
+            "get",
+            "/api/query_results/{}?offset=4&limit=3".format(self.query_result.id),
+        )
+
+        self.assertEqual(rv.status_code, 200)
+        data = rv.json["query_result"]["data"]
+        self.assertEqual(data["rows"], [{"a": i, "b": i * 2} for i in range(4, 7)])
+        self.assertEqual(data["row_count"], 10)
+
+    def test_returns_selected_columns(self):
+        rv = self.make_request(
+            "get",
+            "/api/query_results/{}?limit=2&columns=b".format(self.query_result.id),
+        )
+
+        data = rv.json["query_result"]["data"]
+        self.assertEqual([c["name"] for c in data["columns"]], ["b"])
+        self.assertEqual(data["rows"], [{"b": 0}, {"b": 2}])
+
+    def test_returns_all_rows_by_default(self):
+        rv = self.make_request("get", "/api/query_results/{}".format(self.query_result.id))
+
+        data = rv.json["query_result"]["data"]
+        self.assertEqual(len(data["rows"]), 10)
+        self.assertNotIn("row_count", data)
+
+    def test_rejects_negative_offset(self):
+        rv = self.make_request(
+            "get", "/api/query_results/{}?offset=-1".format(self.query_result.id)
+        )
+        self.assertEqual(rv.status_code, 400)
+
+
 class TestQueryResultDropdownResource(BaseTestCase):
     def test_checks_for_access_to_the_query(self):
         ds2 = self.factory.create_data_source(
@@ -489,6 +556,28 @@ class TestQueryResultExcelResponse(BaseTestCase):
         self.assertEqual(rv.status_code, 200)
 
 
+class TestQueryResultCSVResponse(BaseTestCase):
+    def test_streams_csv_file(self):
+        query = self.factory.create_query()
+        data = {
+            "rows": [{"test": i} for i in range(2500)],
+            "columns": [{"name": "test", "type": "integer"}],
+        }
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+
+        rv = self.make_request(
+            "get",
+            "/api/queries/{}/results/{}.csv".format(query.id, query_result.id),
+            is_json=False,
+        )
+        self.assertEqual(rv.status_code, 200)
+        self.assertTrue(rv.is_streamed)
+
+        lines = rv.data.decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "test")
+        self.assertEqual(lines[1:], [str(i) for i in range(2500)])
+
+
 class TestJobResource(BaseTestCase):
     def test_cancels_queued_queries(self):
         QUEUED = 1
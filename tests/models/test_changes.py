@@ -1,3 +1,6 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import load_only
+
 from tests import BaseTestCase
 
 from redash.models import db, Query, Change, ChangeTrackingMixin
@@ -85,3 +88,84 @@ class TestLogChange(BaseTestCase):
 
         self.assertIsNotNone(change)
         self.assertEqual(q.user, change.user)
+
+    def test_logs_values_from_before_the_first_modification(self):
+        obj = create_object(self.factory)
+        obj.record_changes(changed_by=self.factory.user)
+        obj.name = "Query 2"
+        obj.name = "Query 3"
+        obj.record_changes(changed_by=self.factory.user)
+
+        change = (
+            Change.query.filter(
+                Change.object_id == obj.id, Change.object_type == "queries"
+            )
+            .order_by(Change.id.desc())
+            .first()
+            .change
+        )
+        self.assertEqual({"previous": "Query", "current": "Query 3"}, change["name"])
+        self.assertEqual("SELECT 1", change["query"]["previous"])
+
+    def test_logs_previous_values_of_expired_columns(self):
+        obj = create_object(self.factory)
+        obj.record_changes(changed_by=self.factory.user)
+        db.session.commit()
+
+        obj.name = "Query 2"
+        obj.record_changes(changed_by=self.factory.user)
+
+        change = (
+            Change.query.filter(
+                Change.object_id == obj.id, Change.object_type == "queries"
+            )
+            .order_by(Change.id.desc())
+            .first()
+            .change
+        )
+        self.assertEqual({"previous": "Query", "current": "Query 2"}, change["name"])
+
+
+class TestChangeTrackingCost(BaseTestCase):
+    def test_assignments_dont_load_other_columns(self):
+        query = self.factory.create_query(schedule={"interval": "60"})
+        db.session.commit()
+        db.session.expunge_all()
+
+        query = Query.query.options(load_only("id", "schedule")).get(query.id)
+        query.schedule = None
+        query.schedule_failures = 0
+
+        unloaded = inspect(query).unloaded
+        self.assertIn("query_text", unloaded)
+        self.assertIn("search_vector", unloaded)
+
+    def test_mass_update_of_scheduled_queries(self):
+        # Benchmark: resetting the schedule of many queries only does work for
+        # the assigned fields, instead of reading every column on each one.
+        data_source = self.factory.data_source
+        for _ in range(200):
+            self.factory.create_query(
+                schedule={"interval": "60"}, data_source=data_source
+            )
+        db.session.commit()
+        db.session.expunge_all()
+
+        queries = Query.query.options(load_only("id", "schedule")).all()
+
+        statements = []
+        engine = db.session.get_bind()
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            for query in queries:
+                query.schedule = None
+                query.schedule_failures = 0
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        self.assertEqual([], statements)
+        self.assertTrue(all("query_text" in inspect(q).unloaded for q in queries))
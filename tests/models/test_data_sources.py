@@ -106,6 +106,29 @@ class TestDataSourceCreate(BaseTestCase):
         self.assertIn(self.factory.org.default_group.id, data_source.groups)
 
 
+class TestDataSourceQueryRunner(BaseTestCase):
+    def test_keeps_data_source_options_out_of_runner_configuration(self):
+        data_source = self.factory.create_data_source(
+            type="impala",
+            options=ConfigurationContainer(
+                {
+                    "host": "impala",
+                    "max_result_rows": 10,
+                    "max_concurrent_queries": 2,
+                }
+            ),
+        )
+
+        # impyla isn't installed for tests
+        with patch("redash.query_runner.impala_ds.connect", create=True) as connect:
+            connect.return_value.cursor.return_value.description = []
+            data_source.query_runner.run_query("SELECT 1", None)
+
+        connect.assert_called_once_with(host="impala")
+        self.assertEqual(10, data_source.options["max_result_rows"])
+        self.assertEqual(2, data_source.options["max_concurrent_queries"])
+
+
 class TestDataSourceIsPaused(BaseTestCase):
     def test_returns_false_by_default(self):
         self.assertFalse(self.factory.data_source.paused)
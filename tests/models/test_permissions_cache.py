@@ -0,0 +1,93 @@
+from mock import patch
+
+from tests import BaseTestCase
+from redash import models
+from redash.models import permissions_cache
+
+
+class PermissionsCacheTest(BaseTestCase):
+    def create_group(self, **kwargs):
+        group = self.factory.create_group(**kwargs)
+        models.db.session.add(group)
+        models.db.session.commit()
+        return group
+
+    def test_caches_user_permissions_across_requests(self):
+        user = self.factory.create_user()
+        permissions = user.permissions
+
+        with patch.object(models.Group, "query") as group_query:
+            self.assertEqual(permissions, user.permissions)
+            group_query.filter.assert_not_called()
+
+    def test_caches_permissions_per_request(self):
+        user = self.factory.create_user()
+
+        with self.app.test_request_context("/"):
+            permissions = user.permissions
+            with patch.object(models.redis_connection, "get") as redis_get:
+                self.assertEqual(permissions, user.permissions)
+                redis_get.assert_not_called()
+
+    def test_group_changes_invalidate_permissions(self):
+        group = self.create_group(permissions=["view_query"])
+        user = self.factory.create_user(group_ids=[group.id])
+        self.assertEqual(["view_query"], user.permissions)
+
+        group.permissions = ["view_query", "edit_query"]
+        models.db.session.commit()
+
+        self.assertEqual(["view_query", "edit_query"], user.permissions)
+
+    def test_invalidates_permissions_once_changes_are_committed(self):
+        group = self.create_group(permissions=["view_query"])
+        generation = models.redis_connection.get(permissions_cache.GENERATION_KEY)
+
+        group.permissions = ["view_query", "edit_query"]
+        models.db.session.flush()
+        self.assertEqual(
+            generation, models.redis_connection.get(permissions_cache.GENERATION_KEY)
+        )
+
+        models.db.session.commit()
+        self.assertNotEqual(
+            generation, models.redis_connection.get(permissions_cache.GENERATION_KEY)
+        )
+
+    def test_membership_changes_apply_right_away(self):
+        group = self.create_group(permissions=["edit_query"])
+        user = self.factory.create_user(group_ids=[])
+        self.assertEqual([], user.permissions)
+
+        user.group_ids = [group.id]
+        self.assertEqual(["edit_query"], user.permissions)
+
+    def test_caches_data_source_groups(self):
+        data_source = self.factory.create_data_source()
+        groups = data_source.groups
+
+        with patch.object(models.DataSourceGroup, "query") as query:
+            self.assertEqual(groups, data_source.groups)
+            query.filter.assert_not_called()
+
+    def test_grant_changes_invalidate_data_source_groups(self):
+        data_source = self.factory.create_data_source()
+        group = self.create_group()
+        self.assertNotIn(group.id, data_source.groups)
+
+        data_source.add_group(group, view_only=True)
+        models.db.session.commit()
+        self.assertEqual(True, data_source.groups[group.id])
+
+        data_source.update_group_permission(group, view_only=False)
+        models.db.session.commit()
+        self.assertEqual(False, data_source.groups[group.id])
+
+        data_source.remove_group(group)
+        self.assertNotIn(group.id, data_source.groups)
+
+    def test_works_without_redis(self):
+        user = self.factory.create_user()
+
+        with patch.object(permissions_cache, "ttl", 0):
+            self.assertEqual(self.factory.default_group.permissions, user.permissions)
@@ -517,3 +517,51 @@ class TestQueryUpdateLatestResult(BaseTestCase):
         self.assertEqual(query1.latest_query_data, query_result)
         self.assertEqual(query2.latest_query_data, query_result)
         self.assertNotEqual(query3.latest_query_data, query_result)
+
+    def _store_result(self):
+        return QueryResult.store_result(
+            self.data_source.org_id,
+            self.data_source,
+            self.query_hash,
+            self.query,
+            self.data,
+            self.runtime,
+            self.utcnow,
+        )
+
+    def test_returns_ids_of_updated_queries(self):
+        query1 = self.factory.create_query(query_text=self.query)
+        query2 = self.factory.create_query(query_text=self.query)
+        self.factory.create_query(query_text=self.query + "123")
+
+        query_ids = Query.update_latest_result(self._store_result())
+
+        self.assertCountEqual([query1.id, query2.id], query_ids)
+
+    def test_updates_queries_not_loaded_in_the_session(self):
+        query = self.factory.create_query(query_text=self.query)
+        db.session.commit()
+        query_id = query.id
+        db.session.expunge_all()
+
+        query_result = self._store_result()
+        Query.update_latest_result(query_result)
+        db.session.commit()
+        db.session.expunge_all()
+
+        query = Query.query.get(query_id)
+        self.assertEqual(query_result.id, query.latest_query_data_id)
+
+    def test_keeps_updated_at_and_version_but_resets_next_run(self):
+        query = self.factory.create_query(query_text=self.query)
+        query.schedule_next_run_at = utcnow()
+        db.session.commit()
+        updated_at, version = query.updated_at, query.version
+
+        Query.update_latest_result(self._store_result())
+        db.session.commit()
+        db.session.expire(query)
+
+        self.assertEqual(updated_at, query.updated_at)
+        self.assertEqual(version, query.version)
+        self.assertIsNone(query.schedule_next_run_at)
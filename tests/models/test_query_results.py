@@ -3,10 +3,12 @@ import datetime
 from unittest import TestCase
 from tests import BaseTestCase
 from mock import patch
+from sqlalchemy import inspect as sa_inspect
 
 from redash import models
 from redash.models import DBPersistence
 from redash.utils import utcnow, json_dumps
+from redash.utils.result_limits import ResultSizeGuard
 
 
 class QueryResultTest(BaseTestCase):
@@ -110,3 +112,129 @@ class TestDBPersistence(TestCase):
         a = p.data
         b = p.data
         json_loads_patch.assert_called_once_with(json_data)
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_stores_tabular_data_as_columnar(self):
+        p = DBPersistence()
+        data = {"columns": [{"name": "a", "type": "integer"}], "rows": [{"a": 1}]}
+        p.data = json_dumps(data)
+
+        self.assertIsNone(p._data)
+        self.assertIsNotNone(p._columnar_data)
+        self.assertDictEqual(p.data, data)
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_falls_back_to_json_for_other_data(self):
+        p = DBPersistence()
+        p.data = '{"test": 1}'
+
+        self.assertIsNone(p._columnar_data)
+        self.assertDictEqual(p.data, {"test": 1})
+
+    def test_encodes_row_batches(self):
+        columns = [{"name": "a", "type": "integer"}]
+        p = DBPersistence()
+        p.data = DBPersistence.encode_rows(columns, [[{"a": 1}], [], [{"a": 2}]])
+
+        self.assertDictEqual(p.data, {"columns": columns, "rows": [{"a": 1}, {"a": 2}]})
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_encodes_row_batches_as_columnar(self):
+        columns = [{"name": "a", "type": "integer"}]
+        p = DBPersistence()
+        p.data = DBPersistence.encode_rows(columns, [[{"a": 1}], [{"a": 2}]])
+
+        self.assertIsNone(p._data)
+        self.assertDictEqual(p.data, {"columns": columns, "rows": [{"a": 1}, {"a": 2}]})
+
+    def test_truncates_row_batches_over_the_limit(self):
+        columns = [{"name": "a", "type": "integer"}]
+        batches = iter([[{"a": 1}, {"a": 2}], [{"a": 3}], [{"a": 4}]])
+        p = DBPersistence()
+        p.data = DBPersistence.encode_rows(
+            columns, batches, guard=ResultSizeGuard(max_rows=2)
+        )
+
+        self.assertEqual([{"a": 1}, {"a": 2}], p.data["rows"])
+        self.assertTrue(p.data["truncated"])
+        self.assertEqual([{"a": 4}], next(batches))
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_truncates_columnar_row_batches_over_the_limit(self):
+        columns = [{"name": "a", "type": "integer"}]
+        p = DBPersistence()
+        p.data = DBPersistence.encode_rows(
+            columns, [[{"a": 1}], [{"a": 2}]], guard=ResultSizeGuard(max_rows=1)
+        )
+
+        self.assertEqual([{"a": 1}], p.data["rows"])
+        self.assertTrue(p.data["truncated"])
+
+
+class QueryResultColumnarStorageTest(BaseTestCase):
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_reads_back_stored_columnar_result(self):
+        data = {"columns": [{"name": "a", "type": "integer"}], "rows": [{"a": 1}]}
+        qr = self.factory.create_query_result(data=json_dumps(data))
+        models.db.session.commit()
+        qr_id = qr.id
+        models.db.session.expunge_all()
+
+        self.assertEqual(data, models.QueryResult.query.get(qr_id).data)
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_reads_page_of_columnar_result(self):
+        data = {
+            "columns": [{"name": "a", "type": "integer"}, {"name": "b", "type": "integer"}],
+            "rows": [{"a": i, "b": -i} for i in range(5)],
+        }
+        qr = self.factory.create_query_result(data=json_dumps(data))
+
+        page, row_count = qr.read_data(offset=1, limit=2, columns=["a"])
+        self.assertEqual(row_count, 5)
+        self.assertEqual(page["rows"], [{"a": 1}, {"a": 2}])
+        self.assertEqual(page["columns"], [{"name": "a", "type": "integer"}])
+
+
+class QueryResultDecodedCacheTest(BaseTestCase):
+    def _reload(self, qr):
+        models.db.session.commit()
+        models.db.session.expunge_all()
+        return models.QueryResult.get_by_id_and_org(qr.id, self.factory.org)
+
+    def test_decodes_result_once_per_process(self):
+        data = {"columns": [{"name": "a", "type": "integer"}], "rows": [{"a": 1}]}
+        qr = self.factory.create_query_result(data=json_dumps(data))
+        self.assertEqual(data, self._reload(qr).data)
+
+        with patch("redash.models.json_loads") as json_loads:
+            self.assertEqual(data, self._reload(qr).data)
+            json_loads.assert_not_called()
+
+    def test_cache_hit_skips_loading_data_columns(self):
+        qr = self.factory.create_query_result()
+        self._reload(qr).data
+
+        reloaded = self._reload(qr)
+        reloaded.data
+        self.assertIn("_data", sa_inspect(reloaded).unloaded)
+
+    def test_setting_data_evicts_cached_result(self):
+        qr = self.factory.create_query_result(data='{"test": 1}')
+        self._reload(qr).data
+
+        reloaded = self._reload(qr)
+        reloaded.data = '{"test": 2}'
+        self.assertNotIn(qr.id, models.decoded_results)
+        self.assertEqual({"test": 2}, reloaded.data)
+
+    def test_charges_cache_for_decoded_size(self):
+        data = {
+            "columns": [{"name": "a", "type": "integer"}],
+            "rows": [{"a": i} for i in range(1000)],
+        }
+        payload = json_dumps(data)
+        qr = self.factory.create_query_result(data=payload)
+        self._reload(qr).data
+
+        self.assertGreater(models.decoded_results.size, 4 * len(payload))
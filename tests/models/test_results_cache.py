@@ -0,0 +1,83 @@
+import datetime
+import zlib
+
+from tests import BaseTestCase
+from redash import settings
+from redash.models.results_cache import SharedResultsCache
+from redash.utils import json_dumps, utcnow
+
+
+class SharedResultsCacheTest(BaseTestCase):
+    def setUp(self):
+        super(SharedResultsCacheTest, self).setUp()
+        self.cache = SharedResultsCache(
+            True, settings.QUERY_RESULTS_REDIS_CACHE_URL, 60, 1024 * 1024
+        )
+
+    def test_returns_stored_result(self):
+        qr = self.factory.create_query_result()
+        self.cache.set(qr)
+
+        cached = self.cache.get(qr.data_source_id, qr.query_hash, 60)
+        self.assertEqual(qr.id, cached["id"])
+        self.assertEqual(qr.data, cached["data"])
+
+    def test_skips_results_older_than_max_age(self):
+        qr = self.factory.create_query_result(
+            retrieved_at=utcnow() - datetime.timedelta(minutes=5)
+        )
+        self.cache.set(qr)
+
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, 60))
+        self.assertIsNotNone(self.cache.get(qr.data_source_id, qr.query_hash, 600))
+        self.assertIsNotNone(self.cache.get(qr.data_source_id, qr.query_hash, -1))
+
+    def test_never_serves_max_age_zero(self):
+        qr = self.factory.create_query_result()
+        self.cache.set(qr)
+
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, 0))
+
+    def test_sets_expiry(self):
+        qr = self.factory.create_query_result()
+        self.cache.set(qr)
+
+        ttl = self.cache.connection.ttl(self.cache.key(qr.data_source_id, qr.query_hash))
+        self.assertTrue(0 < ttl <= 60)
+
+    def test_drops_entry_when_newer_result_is_too_large(self):
+        qr = self.factory.create_query_result()
+        self.cache.set(qr)
+
+        self.cache.max_size = 1
+        newer = self.factory.create_query_result()
+        self.assertFalse(self.cache.set(newer))
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, -1))
+
+    def test_skips_results_without_decoding_them(self):
+        qr = self.factory.create_query_result()
+        qr.data = json_dumps({"columns": [], "rows": [], "truncated": True})
+        self.assertFalse(self.cache.set(qr))
+
+        self.cache.max_size = 1
+        qr.data = json_dumps({"columns": [], "rows": [{"a": 1}] * 10})
+        self.assertFalse(self.cache.set(qr))
+
+        self.assertFalse(hasattr(qr, "_deserialized_data"))
+
+    def test_treats_invalid_entries_as_misses(self):
+        qr = self.factory.create_query_result()
+        key = self.cache.key(qr.data_source_id, qr.query_hash)
+
+        self.cache.connection.set(key, b"not compressed")
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, -1))
+
+        self.cache.connection.set(key, zlib.compress(b"{not json"))
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, -1))
+
+    def test_disabled(self):
+        qr = self.factory.create_query_result()
+        self.cache.enabled = False
+
+        self.assertFalse(self.cache.set(qr))
+        self.assertIsNone(self.cache.get(qr.data_source_id, qr.query_hash, -1))
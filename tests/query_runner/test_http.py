@@ -1,3 +1,4 @@
+import io
 import mock
 from unittest import TestCase
 
@@ -127,3 +128,32 @@ class TestBaseHTTPQueryRunner(TestCase):
         self.assertRaisesRegex(
             ValueError, exception_message, query_runner.get_response, url
         )
+
+    @mock.patch.object(ConfiguredSession, "request")
+    def test_get_response_rejects_responses_over_the_size_limit(self, mock_get):
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.iter_content.return_value = [b"x" * 60, b"x" * 60]
+        mock_get.return_value = mock_response
+
+        url = "https://example.com/"
+        query_runner = BaseHTTPQueryRunner({})
+        query_runner.max_response_bytes = 100
+        response, error = query_runner.get_response(url)
+        mock_get.assert_called_once_with("get", url, auth=None, stream=True)
+        self.assertEqual("Response is larger than the 100 bytes limit.", error)
+        mock_response.close.assert_called_once_with()
+
+    @mock.patch.object(ConfiguredSession, "request")
+    def test_get_response_reads_responses_within_the_size_limit(self, mock_get):
+        mock_response = requests_or_advocate.Response()
+        mock_response.status_code = 200
+        mock_response.raw = io.BytesIO(b'{"rows": []}')
+        mock_get.return_value = mock_response
+
+        query_runner = BaseHTTPQueryRunner({})
+        query_runner.max_response_bytes = 100
+        response, error = query_runner.get_response("https://example.com/")
+        self.assertIsNone(error)
+        self.assertEqual({"rows": []}, response.json())
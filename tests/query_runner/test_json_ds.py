@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from redash.query_runner.json_ds import parse_json
+
+
+class TestParseJson(TestCase):
+    def test_flattens_nested_objects(self):
+        data = [{"a": 1, "b": {"c": "x"}}, {"a": 2, "d": True}]
+        result = parse_json(data, None, None)
+
+        self.assertEqual([{"a": 1, "b.c": "x"}, {"a": 2, "d": True}], result["rows"])
+        self.assertEqual(
+            [("a", "integer"), ("b.c", "string"), ("d", "boolean")],
+            [(c["name"], c["type"]) for c in result["columns"]],
+        )
+
+    def test_orders_columns_by_fields(self):
+        data = {"items": [{"a": 1, "b": 2, "c": 3}]}
+        result = parse_json(data, "items", ["c", "a"])
+
+        self.assertEqual([{"a": 1, "c": 3}], result["rows"])
+        self.assertEqual(["c", "a"], [c["name"] for c in result["columns"]])
+
+    def test_flattens_large_results(self):
+        data = [
+            dict(
+                {"field_{}".format(i): i for i in range(200)},
+                nested={"field_{}".format(i): str(i) for i in range(200)},
+            )
+            for _ in range(2000)
+        ]
+
+        result = parse_json(data, None, None)
+
+        expected_columns = ["field_{}".format(i) for i in range(200)] + [
+            "nested.field_{}".format(i) for i in range(200)
+        ]
+        self.assertEqual(expected_columns, [c["name"] for c in result["columns"]])
+        self.assertEqual(2000, len(result["rows"]))
+        self.assertEqual(
+            dict(
+                {"field_{}".format(i): i for i in range(200)},
+                **{"nested.field_{}".format(i): str(i) for i in range(200)}
+            ),
+            result["rows"][-1],
+        )
@@ -177,3 +177,33 @@ class TestMongoResults(TestCase):
         self.assertIsNotNone(_get_column_by_name(columns, "nested.a"))
         self.assertIsNotNone(_get_column_by_name(columns, "nested.b"))
         self.assertIsNotNone(_get_column_by_name(columns, "nested.c"))
+
+
+def synthetic_documents(count, fields):
+    return [
+        dict(
+            {"field_{}".format(i): i for i in range(fields)},
+            nested={"field_{}".format(i): str(i) for i in range(fields)},
+        )
+        for _ in range(count)
+    ]
+
+
+class TestMongoLargeResults(TestCase):
+    def test_flattens_large_results(self):
+        documents = synthetic_documents(2000, 200)
+
+        rows, columns = parse_results(documents)
+
+        expected_columns = ["field_{}".format(i) for i in range(200)] + [
+            "nested.field_{}".format(i) for i in range(200)
+        ]
+        self.assertEqual(expected_columns, [c["name"] for c in columns])
+        self.assertEqual(2000, len(rows))
+        self.assertEqual(
+            dict(
+                {"field_{}".format(i): i for i in range(200)},
+                **{"nested.field_{}".format(i): str(i) for i in range(200)}
+            ),
+            rows[-1],
+        )
@@ -1,5 +1,10 @@
 from unittest import TestCase
-from redash.query_runner.pg import build_schema
+
+from mock import Mock, patch
+
+from redash.query_runner import QueryRunnerError, connection_pool
+from redash.query_runner.pg import PostgreSQL, build_schema
+from redash.utils import json_loads
 
 
 class TestBuildSchema(TestCase):
@@ -24,3 +29,141 @@ class TestBuildSchema(TestCase):
         self.assertListEqual(schema["main.users"]["columns"], ["id", "name"])
         self.assertIn('public."main.users"', schema.keys())
         self.assertListEqual(schema['public."main.users"']["columns"], ["id"])
+
+
+class TestRunQuery(TestCase):
+    def setUp(self):
+        self.runner = PostgreSQL({"dbname": "test"})
+
+    def test_collects_streamed_batches(self):
+        columns = [{"name": "a", "friendly_name": "a", "type": "integer"}]
+
+        def run_query_stream(query, user):
+            yield columns
+            yield [{"a": 1}]
+            yield [{"a": 2}]
+
+        with patch.object(PostgreSQL, "run_query_stream", side_effect=run_query_stream):
+            data, error = self.runner.run_query("SELECT a", None)
+
+        self.assertIsNone(error)
+        self.assertEqual(
+            {"columns": columns, "rows": [{"a": 1}, {"a": 2}]}, json_loads(data)
+        )
+
+    def test_returns_stream_errors(self):
+        def run_query_stream(query, user):
+            raise QueryRunnerError("syntax error")
+            yield
+
+        with patch.object(PostgreSQL, "run_query_stream", side_effect=run_query_stream):
+            data, error = self.runner.run_query("SELECT a", None)
+
+        self.assertIsNone(data)
+        self.assertEqual("syntax error", error)
+
+
+@patch("redash.query_runner.pg._wait")
+class TestConnectionPooling(TestCase):
+    def setUp(self):
+        connection_pool.clear()
+        self.addCleanup(connection_pool.clear)
+
+    def run_noop(self, runner):
+        stream = runner.run_query_stream("SELECT 1", None)
+        next(stream)
+        stream.close()
+
+    def connection(self):
+        connection = Mock()
+        connection.cursor.return_value.description = [("a", 23)]
+        return connection
+
+    def test_reuses_connections_when_enabled(self, _):
+        runner = PostgreSQL({"dbname": "test", "pool_connections": True})
+        connection = self.connection()
+
+        with patch("psycopg2.connect", return_value=connection) as connect:
+            self.run_noop(runner)
+            self.run_noop(runner)
+
+        connect.assert_called_once()
+        connection.cursor.return_value.execute.assert_any_call("DISCARD ALL")
+        connection.close.assert_not_called()
+
+    def test_closes_connections_by_default(self, _):
+        runner = PostgreSQL({"dbname": "test"})
+        connection = self.connection()
+
+        with patch("psycopg2.connect", return_value=connection):
+            self.run_noop(runner)
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(0, len(connection_pool))
+
+    def test_closes_connections_of_failed_queries(self, _):
+        runner = PostgreSQL({"dbname": "test", "pool_connections": True})
+        connection = self.connection()
+        connection.cursor.return_value.description = None
+
+        with patch("psycopg2.connect", return_value=connection):
+            with self.assertRaises(QueryRunnerError):
+                self.run_noop(runner)
+
+        connection.close.assert_called_once_with()
+        self.assertEqual(0, len(connection_pool))
+
+
+@patch("redash.query_runner.pg._wait")
+class TestServerSideCursor(TestCase):
+    def setUp(self):
+        self.runner = PostgreSQL({"dbname": "test"})
+        self.runner.stream_batch_size = 2
+        self.connection = Mock()
+        self.cursor = self.connection.cursor.return_value
+        self.cursor.description = [("a", 23)]
+
+    def run_query(self, query):
+        with patch("psycopg2.connect", return_value=self.connection):
+            return list(self.runner.run_query_stream(query, None))
+
+    def executed(self):
+        return [c[0][0] for c in self.cursor.execute.call_args_list]
+
+    def test_fetches_rows_a_batch_at_a_time(self, _):
+        self.cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+
+        batches = self.run_query("SELECT a FROM t;")
+
+        self.assertEqual([[{"a": 1}, {"a": 2}], [{"a": 3}]], batches[1:])
+        fetch = "FETCH FORWARD 2 FROM redash_result"
+        self.assertEqual(
+            [
+                "BEGIN",
+                "DECLARE redash_result NO SCROLL CURSOR FOR SELECT a FROM t",
+                fetch,
+                fetch,
+                fetch,
+                "COMMIT",
+            ],
+            self.executed(),
+        )
+
+    def test_runs_other_queries_as_they_are(self, _):
+        self.cursor.fetchmany.side_effect = [[(1,)], []]
+        query = "CREATE TEMP TABLE t AS SELECT 1 AS a; SELECT a FROM t"
+
+        self.run_query(query)
+
+        self.assertEqual([query], self.executed())
+
+    def test_ends_transaction_when_stopped_early(self, _):
+        self.cursor.fetchmany.return_value = [(1,), (2,)]
+
+        stream = self.runner.run_query_stream("SELECT a FROM t", None)
+        with patch("psycopg2.connect", return_value=self.connection):
+            next(stream)
+            next(stream)
+            stream.close()
+
+        self.assertEqual("ROLLBACK", self.executed()[-1])
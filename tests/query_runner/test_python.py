@@ -1,9 +1,25 @@
 from unittest import TestCase
 
 from redash.query_runner.python import Python
+from redash.utils import json_dumps
+from tests import BaseTestCase
 
 
 class TestPython(TestCase):
     def test_sorted_safe_builtins(self):
         src = list(Python.safe_builtins)
         assert src == sorted(src), 'Python safe_builtins package not sorted.'
+
+
+class TestGetQueryResult(BaseTestCase):
+    def test_scripts_cant_change_the_shared_result(self):
+        data = {"columns": [{"name": "a"}], "rows": [{"a": 1}]}
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        result = Python.get_query_result(query.id)
+        result["rows"][0]["a"] = 2
+        result["rows"].append({"a": 3})
+
+        self.assertEqual(data, Python.get_query_result(query.id))
+        self.assertEqual(data, query_result.data)
@@ -129,6 +129,38 @@ class TestCreateTable(TestCase):
         create_table(connection, table_name, results)
         self.assertEqual(len(list(connection.execute("SELECT * FROM query_123"))), 2)
 
+    def test_declares_column_types_from_result_metadata(self):
+        connection = sqlite3.connect(":memory:")
+        results = {
+            "columns": [
+                {"name": "id", "type": "integer"},
+                {"name": "score", "type": "float"},
+                {"name": "name", "type": "string"},
+                {"name": "other"},
+            ],
+            "rows": [{"id": "10", "score": "1.5", "name": "9", "other": "2"}],
+        }
+        create_table(connection, "query_123", results, typed_columns=True)
+
+        row = connection.execute(
+            "SELECT typeof(id), typeof(score), typeof(name), typeof(other) "
+            "FROM query_123"
+        ).fetchone()
+        self.assertEqual(("integer", "real", "text", "text"), row)
+        count = connection.execute("SELECT COUNT(*) FROM query_123 WHERE id > 9")
+        self.assertEqual(1, count.fetchone()[0])
+
+    def test_keeps_values_as_they_are_by_default(self):
+        connection = sqlite3.connect(":memory:")
+        results = {
+            "columns": [{"name": "id", "type": "integer"}],
+            "rows": [{"id": "10"}],
+        }
+        create_table(connection, "query_123", results)
+
+        row = connection.execute("SELECT typeof(id) FROM query_123").fetchone()
+        self.assertEqual(("text",), row)
+
 
 class TestGetQuery(BaseTestCase):
     # test query from different account
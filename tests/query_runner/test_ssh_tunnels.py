@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from redash.query_runner import SSHTunnelManager, with_ssh_tunnel
+from redash.query_runner.pg import PostgreSQL
+
+AUTH = {"ssh_username": "redash"}
+
+
+def make_tunnel(*args, **kwargs):
+    server = Mock(is_active=True, is_alive=True)
+    server.local_bind_address = ("127.0.0.1", 40000)
+    return server
+
+
+@patch("redash.query_runner.open_tunnel", side_effect=make_tunnel)
+class TestSSHTunnelManager(TestCase):
+    def setUp(self):
+        self.manager = SSHTunnelManager(idle_timeout=60)
+        self.addCleanup(self.manager.clear)
+
+    def use(self, remote=("db", 5432)):
+        with self.manager.tunnel(("bastion", 22), remote, AUTH) as server:
+            return server
+
+    def test_reuses_open_tunnels(self, open_tunnel):
+        self.assertIs(self.use(), self.use())
+        open_tunnel.assert_called_once()
+
+    def test_opens_a_tunnel_per_remote_address(self, open_tunnel):
+        self.assertIsNot(self.use(("db", 5432)), self.use(("other", 5432)))
+
+    def test_reopens_tunnels_that_went_down(self, open_tunnel):
+        server = self.use()
+        server.is_active = False
+
+        self.assertIsNot(server, self.use())
+        server.stop.assert_called_once_with()
+
+    def test_closes_idle_tunnels(self, open_tunnel):
+        with patch("redash.query_runner.time.time", return_value=0):
+            server = self.use()
+
+        with patch("redash.query_runner.time.time", return_value=61):
+            self.assertIsNot(server, self.use())
+
+        server.stop.assert_called_once_with()
+
+    def test_opens_tunnels_without_holding_the_lock(self, open_tunnel):
+        def open_tunnel_checking_lock(*args, **kwargs):
+            self.assertFalse(self.manager._lock.locked())
+            return make_tunnel()
+
+        open_tunnel.side_effect = open_tunnel_checking_lock
+        self.use()
+        open_tunnel.assert_called_once()
+
+    def test_opens_a_tunnel_per_use_without_idle_timeout(self, open_tunnel):
+        self.manager.idle_timeout = 0
+        server = self.use()
+
+        server.stop.assert_called_once_with()
+        self.assertIsNot(server, self.use())
+
+    def test_forked_processes_dont_use_or_close_parent_tunnels(self, open_tunnel):
+        server = self.use()
+        self.manager._after_fork()
+
+        self.assertIsNot(server, self.use())
+        self.manager.clear()
+        server.stop.assert_not_called()
+
+
+def tunnelled_runner():
+    return with_ssh_tunnel(
+        PostgreSQL({"dbname": "test", "host": "db", "port": 5432}),
+        {"ssh_host": "bastion", "ssh_username": "redash"},
+    )
+
+
+@patch("redash.settings.dynamic_settings.ssh_tunnel_auth", return_value={})
+@patch("redash.query_runner.ssh_tunnels", SSHTunnelManager(idle_timeout=0))
+@patch("redash.query_runner.open_tunnel", side_effect=make_tunnel)
+class TestWithSSHTunnel(TestCase):
+    def test_runs_query_through_tunnel(self, open_tunnel, _):
+        def run_query(query, user):
+            return (runner.host, runner.port), None
+
+        with patch.object(PostgreSQL, "run_query", side_effect=run_query):
+            runner = tunnelled_runner()
+            address, _ = runner.run_query("SELECT 1", None)
+
+        self.assertEqual(("127.0.0.1", 40000), address)
+        self.assertEqual(("db", 5432), (runner.host, runner.port))
+
+    def test_streams_query_through_tunnel(self, open_tunnel, _):
+        def run_query_stream(query, user):
+            yield (runner.host, runner.port)
+
+        with patch.object(PostgreSQL, "run_query_stream", side_effect=run_query_stream):
+            runner = tunnelled_runner()
+            rows = list(runner.run_query_stream("SELECT 1", None))
+
+        self.assertEqual([("127.0.0.1", 40000)], rows)
+        self.assertEqual(("db", 5432), (runner.host, runner.port))
+
+    def test_runs_non_streaming_paths_through_a_single_tunnel(self, open_tunnel, _):
+        addresses = []
+
+        def run_query_stream(query, user):
+            addresses.append((runner.host, runner.port))
+            yield [{"name": "?column?", "friendly_name": "?column?", "type": None}]
+            yield [{"?column?": 1}]
+
+        with patch.object(PostgreSQL, "run_query_stream", side_effect=run_query_stream):
+            runner = tunnelled_runner()
+            runner.test_connection()
+
+        open_tunnel.assert_called_once()
+        self.assertEqual([("127.0.0.1", 40000)], addresses)
+        self.assertEqual(("db", 5432), (runner.host, runner.port))
@@ -6,7 +6,11 @@ from tests import BaseTestCase
 
 from redash import models
 from redash.utils import utcnow, json_dumps
-from redash.serializers import serialize_query_result, serialize_query_result_to_dsv
+from redash.serializers import (
+    serialize_query_result,
+    serialize_query_result_to_dsv,
+    serialize_query_result_to_dsv_stream,
+)
 
 
 data = {
@@ -81,3 +85,20 @@ class DsvSerializationTest(BaseTestCase):
         self.assertEqual(rows[1]["bool"], "false")
         self.assertEqual(rows[2]["date"], "")
         self.assertEqual(rows[3]["datetime"], "459")
+
+    def test_doesnt_modify_query_result_data(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        with self.app.test_request_context("/"):
+            serialize_query_result_to_dsv(query_result, ",")
+
+        self.assertEqual(query_result.data["rows"][0]["bool"], True)
+
+    def test_streams_rows_in_batches(self):
+        query_result = self.factory.create_query_result(data=json_dumps(data))
+        with self.app.test_request_context("/"):
+            chunks = list(
+                serialize_query_result_to_dsv_stream(query_result, ",", batch_size=2)
+            )
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(list(csv.DictReader(io.StringIO("".join(chunks))))), 5)
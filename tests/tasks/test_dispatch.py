@@ -0,0 +1,134 @@
+from mock import patch
+from rq import Connection
+from rq.job import JobStatus
+
+from tests import BaseTestCase
+from redash import rq_redis_connection
+from redash.tasks import Job
+from redash.tasks.queries import dispatch
+from redash.tasks.queries.execution import enqueue_query, enqueue_scheduled_queries
+from redash.tasks.worker import Queue
+
+
+@patch("redash.settings.DATA_SOURCE_MAX_CONCURRENT_QUERIES", 2)
+class TestDataSourceConcurrencyLimit(BaseTestCase):
+    def setUp(self):
+        super(TestDataSourceConcurrencyLimit, self).setUp()
+        self.data_source = self.factory.data_source
+        self.queues = [
+            Queue(name, connection=rq_redis_connection)
+            for name in (
+                self.data_source.queue_name,
+                self.data_source.scheduled_queue_name,
+            )
+        ]
+        for queue in self.queues:
+            queue.empty()
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.empty()
+        super(TestDataSourceConcurrencyLimit, self).tearDown()
+
+    def enqueue(self, query_text, data_source=None):
+        query = self.factory.create_query(
+            query_text=query_text, data_source=data_source or self.data_source
+        )
+        with Connection(rq_redis_connection):
+            return enqueue_query(
+                query.query_text,
+                query.data_source,
+                query.user_id,
+                False,
+                None,
+                {"query_id": query.id},
+            )
+
+    def test_defers_jobs_over_the_limit(self):
+        jobs = [self.enqueue("SELECT {}".format(i)) for i in range(3)]
+
+        self.assertEqual([j.id for j in jobs[:2]], self.queues[0].job_ids)
+        self.assertEqual(JobStatus.DEFERRED, jobs[2].get_status())
+        self.assertEqual(
+            {"running": 2, "pending": 1},
+            dispatch.data_source_status(self.data_source.id),
+        )
+
+    def test_doesnt_hold_back_other_data_sources(self):
+        for i in range(3):
+            self.enqueue("SELECT {}".format(i))
+
+        other = self.enqueue("SELECT 1", self.factory.create_data_source())
+
+        self.assertIn(other.id, self.queues[0].job_ids)
+
+    def test_enqueues_pending_jobs_as_jobs_end(self):
+        jobs = [self.enqueue("SELECT {}".format(i)) for i in range(3)]
+
+        with Connection(rq_redis_connection):
+            dispatch.release(self.data_source.id, 2, jobs[0].id)
+
+        self.assertIn(jobs[2].id, self.queues[0].job_ids)
+        self.assertEqual(JobStatus.QUEUED, jobs[2].get_status())
+
+    def test_skips_cancelled_pending_jobs(self):
+        jobs = [self.enqueue("SELECT {}".format(i)) for i in range(4)]
+        with Connection(rq_redis_connection):
+            Job.fetch(jobs[2].id).cancel()
+            dispatch.release(self.data_source.id, 2, jobs[0].id)
+
+        self.assertIn(jobs[3].id, self.queues[0].job_ids)
+        self.assertNotIn(jobs[2].id, self.queues[0].job_ids)
+
+    def test_limits_scheduled_queries(self):
+        queries = [
+            self.factory.create_query(query_text="SELECT {}".format(i))
+            for i in range(3)
+        ]
+
+        with Connection(rq_redis_connection):
+            enqueued = enqueue_scheduled_queries([(q.query_text, q) for q in queries])
+
+        self.assertEqual(queries, enqueued)
+        self.assertEqual(2, len(self.queues[1].job_ids))
+        self.assertEqual(
+            {"running": 2, "pending": 1},
+            dispatch.data_source_status(self.data_source.id),
+        )
+
+    def test_frees_slots_of_jobs_that_ended_without_releasing_them(self):
+        jobs = [self.enqueue("SELECT {}".format(i)) for i in range(3)]
+        jobs[0].set_status(JobStatus.FINISHED)
+
+        with Connection(rq_redis_connection):
+            dispatch.dispatch_pending_queries()
+
+        self.assertIn(jobs[2].id, self.queues[0].job_ids)
+        self.assertEqual(
+            {"running": 2, "pending": 0},
+            dispatch.data_source_status(self.data_source.id),
+        )
+
+    def fill_with_scheduled_and_interactive_pending(self):
+        jobs = [self.enqueue("SELECT {}".format(i)) for i in range(2)]
+        query = self.factory.create_query(query_text="SELECT 'scheduled'")
+        with Connection(rq_redis_connection):
+            enqueue_scheduled_queries([(query.query_text, query)])
+        interactive = self.enqueue("SELECT 'interactive'")
+
+        with Connection(rq_redis_connection):
+            dispatch.release(self.data_source.id, 2, jobs[0].id)
+        return interactive
+
+    def test_dispatches_interactive_jobs_ahead_of_scheduled_ones(self):
+        interactive = self.fill_with_scheduled_and_interactive_pending()
+
+        self.assertIn(interactive.id, self.queues[0].job_ids)
+        self.assertEqual([], self.queues[1].job_ids)
+
+    @patch("redash.settings.QUERY_PRIORITY_AGING", 0)
+    def test_dispatches_scheduled_jobs_once_they_aged(self):
+        interactive = self.fill_with_scheduled_and_interactive_pending()
+
+        self.assertNotIn(interactive.id, self.queues[0].job_ids)
+        self.assertEqual(1, len(self.queues[1].job_ids))
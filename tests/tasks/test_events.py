@@ -0,0 +1,71 @@
+import time
+
+from mock import patch
+
+from tests import BaseTestCase
+from redash import models, redis_connection
+from redash.tasks.general import EVENTS_KEY, flush_events, queue_event
+
+
+class TestFlushEvents(BaseTestCase):
+    def raw_event(self, **kwargs):
+        event = {
+            "org_id": self.factory.org.id,
+            "user_id": self.factory.user.id,
+            "action": "view",
+            "object_type": "dashboard",
+            "object_id": 1,
+            "timestamp": int(time.time()),
+        }
+        event.update(kwargs)
+        return event
+
+    def test_stores_queued_events(self):
+        queue_event(self.raw_event(action="view"))
+        queue_event(self.raw_event(action="execute", ip="127.0.0.1"))
+
+        flush_events()
+
+        events = models.Event.query.order_by(models.Event.id).all()
+        self.assertEqual(["view", "execute"], [e.action for e in events])
+        self.assertEqual({"ip": "127.0.0.1"}, events[1].additional_properties)
+        self.assertEqual(0, redis_connection.llen(EVENTS_KEY))
+
+    @patch("redash.tasks.general.settings.EVENTS_BATCH_SIZE", 2)
+    def test_stores_a_batch_per_transaction(self):
+        for i in range(5):
+            queue_event(self.raw_event(object_id=i))
+
+        with patch.object(
+            models.db.session, "commit", wraps=models.db.session.commit
+        ) as commit:
+            flush_events()
+
+        self.assertEqual(3, commit.call_count)
+        self.assertEqual(5, models.Event.query.count())
+
+    @patch("redash.tasks.general.settings.EVENTS_FLUSH_MAX_BATCHES", 1)
+    @patch("redash.tasks.general.settings.EVENTS_BATCH_SIZE", 2)
+    def test_leaves_events_over_the_flush_limit_for_the_next_run(self):
+        for i in range(3):
+            queue_event(self.raw_event(object_id=i))
+
+        flush_events()
+        self.assertEqual(2, models.Event.query.count())
+        self.assertEqual(1, redis_connection.llen(EVENTS_KEY))
+
+    def test_skips_events_that_cant_be_stored(self):
+        queue_event(self.raw_event(user_id=-1))
+        redis_connection.rpush(EVENTS_KEY, "not json")
+        queue_event(self.raw_event())
+
+        flush_events()
+
+        self.assertEqual(1, models.Event.query.count())
+        self.assertEqual(0, redis_connection.llen(EVENTS_KEY))
+
+    def test_handlers_queue_events(self):
+        self.make_request("get", "/api/dashboards")
+
+        self.assertEqual(1, redis_connection.llen(EVENTS_KEY))
+        self.assertEqual(0, models.Event.query.count())
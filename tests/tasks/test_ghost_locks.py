@@ -0,0 +1,60 @@
+from rq import Connection
+from rq.job import JobStatus
+
+from tests import BaseTestCase
+from redash import redis_connection, rq_redis_connection
+from redash.tasks import Job
+from redash.tasks.queries.execution import (
+    JOB_LOCKS_KEY,
+    _job_lock_id,
+    enqueue_scheduled_queries,
+)
+from redash.tasks.queries.maintenance import remove_ghost_locks
+from redash.tasks.worker import Queue
+
+
+class TestRemoveGhostLocks(BaseTestCase):
+    def setUp(self):
+        super(TestRemoveGhostLocks, self).setUp()
+        self.queue = Queue(
+            self.factory.data_source.scheduled_queue_name,
+            connection=rq_redis_connection,
+        )
+        self.queue.empty()
+        self.query = self.factory.create_query()
+        self.lock_id = _job_lock_id(self.query.query_hash, self.query.data_source_id)
+
+        with Connection(rq_redis_connection):
+            enqueue_scheduled_queries([(self.query.query_text, self.query)])
+
+    def job(self):
+        job_id = redis_connection.get(self.lock_id)
+        return Job.fetch(job_id, connection=rq_redis_connection)
+
+    def test_keeps_locks_of_pending_jobs(self):
+        remove_ghost_locks()
+
+        self.assertIsNotNone(redis_connection.get(self.lock_id))
+        self.assertTrue(redis_connection.sismember(JOB_LOCKS_KEY, self.lock_id))
+
+    def test_removes_locks_of_missing_jobs(self):
+        self.job().delete()
+
+        remove_ghost_locks()
+
+        self.assertIsNone(redis_connection.get(self.lock_id))
+        self.assertFalse(redis_connection.sismember(JOB_LOCKS_KEY, self.lock_id))
+
+    def test_removes_locks_of_finished_jobs(self):
+        self.job().set_status(JobStatus.FINISHED)
+
+        remove_ghost_locks()
+
+        self.assertIsNone(redis_connection.get(self.lock_id))
+
+    def test_forgets_locks_that_are_gone(self):
+        redis_connection.delete(self.lock_id)
+
+        remove_ghost_locks()
+
+        self.assertEqual(0, redis_connection.scard(JOB_LOCKS_KEY))
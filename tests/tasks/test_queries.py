@@ -1,4 +1,5 @@
 from unittest import TestCase
+import threading
 import uuid
 
 from mock import patch, Mock
@@ -8,14 +9,20 @@ from rq.exceptions import NoSuchJobError
 
 from tests import BaseTestCase
 from redash import redis_connection, rq_redis_connection, models
-from redash.utils import json_dumps
+from redash.utils import gen_query_hash, json_dumps
+from redash.query_runner import QueryRunnerError
 from redash.query_runner.pg import PostgreSQL
 from redash.tasks.queries.execution import (
     QueryExecutionError,
     enqueue_query,
+    enqueue_scheduled_queries,
     execute_query,
+    _create_job,
+    _job_lock_id,
+    _job_result_limits,
 )
 from redash.tasks import Job
+from redash.tasks.worker import Queue
 
 
 def fetch_job(*args, **kwargs):
@@ -177,7 +184,136 @@ class TestEnqueueTask(BaseTestCase):
         self.assertEqual(3, enqueue.call_count)
 
 
+class TestEnqueueScheduledQueries(BaseTestCase):
+    def setUp(self):
+        super(TestEnqueueScheduledQueries, self).setUp()
+        self.queue = Queue(
+            self.factory.data_source.scheduled_queue_name,
+            connection=rq_redis_connection,
+        )
+        self.queue.empty()
+
+    def test_enqueues_one_job_per_distinct_query(self):
+        data_source = self.factory.create_data_source()
+        query1 = self.factory.create_query(data_source=data_source)
+        query2 = self.factory.create_query(
+            query_text="SELECT 2", data_source=data_source
+        )
+        duplicate = self.factory.create_query(
+            query_text="SELECT 2", data_source=data_source
+        )
+
+        with Connection(rq_redis_connection):
+            enqueued = enqueue_scheduled_queries(
+                [
+                    (query1.query_text, query1),
+                    (query2.query_text, query2),
+                    (duplicate.query_text, duplicate),
+                ]
+            )
+
+        self.assertEqual([query1, query2], enqueued)
+        job_ids = self.queue.job_ids
+        self.assertEqual(2, len(job_ids))
+
+        job = Job.fetch(job_ids[0], connection=rq_redis_connection)
+        self.assertEqual(query1.id, job.kwargs["scheduled_query_id"])
+        self.assertEqual(query1.id, job.meta["query_id"])
+        self.assertTrue(job.meta["scheduled"])
+
+    def test_doesnt_enqueue_queries_with_pending_jobs(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            enqueue_scheduled_queries([(query.query_text, query)])
+            enqueued = enqueue_scheduled_queries([(query.query_text, query)])
+
+        self.assertEqual([query], enqueued)
+        self.assertEqual(1, len(self.queue.job_ids))
+
+    def test_replaces_locks_of_expired_jobs(self):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            enqueue_scheduled_queries([(query.query_text, query)])
+            for job_id in self.queue.job_ids:
+                Job.fetch(job_id, connection=rq_redis_connection).delete()
+
+            enqueue_scheduled_queries([(query.query_text, query)])
+
+        self.assertEqual(1, len(self.queue.job_ids))
+
+    def test_empty_batch(self):
+        self.assertEqual([], enqueue_scheduled_queries([]))
+
+    def test_failing_query_doesnt_stop_the_batch(self):
+        data_source = self.factory.create_data_source()
+        query1 = self.factory.create_query(data_source=data_source)
+        query2 = self.factory.create_query(
+            query_text="SELECT 2", data_source=data_source
+        )
+        error = ValueError("boom")
+        on_error = Mock()
+
+        def create_job(queue, query_text, *args):
+            if query_text == query1.query_text:
+                raise error
+            return _create_job(queue, query_text, *args)
+
+        with Connection(rq_redis_connection), patch(
+            "redash.tasks.queries.execution._create_job", side_effect=create_job
+        ):
+            enqueued = enqueue_scheduled_queries(
+                [(query1.query_text, query1), (query2.query_text, query2)],
+                on_error=on_error,
+            )
+
+        self.assertEqual([query2], enqueued)
+        self.assertEqual(1, len(self.queue.job_ids))
+        on_error.assert_called_once_with(query1, error)
+
+    def test_releases_lock_when_submission_fails(self):
+        query = self.factory.create_query()
+        error = ValueError("boom")
+        on_error = Mock()
+
+        with Connection(rq_redis_connection), patch(
+            "redash.tasks.queries.execution.dispatch.concurrency_limit",
+            side_effect=error,
+        ):
+            enqueued = enqueue_scheduled_queries(
+                [(query.query_text, query)], on_error=on_error
+            )
+
+        self.assertEqual([], enqueued)
+        on_error.assert_called_once_with(query, error)
+        lock_id = _job_lock_id(query.query_hash, query.data_source_id)
+        self.assertIsNone(redis_connection.get(lock_id))
+
+
+class TestJobResultLimits(TestCase):
+    def limits_in_thread(self, max_rows, max_bytes):
+        limits = []
+        thread = threading.Thread(
+            target=lambda: limits.append(_job_result_limits(max_rows, max_bytes))
+        )
+        thread.start()
+        thread.join()
+        return limits[0]
+
+    @patch("redash.settings.RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES", 1000)
+    def test_caps_the_size_of_results_of_jobs_running_in_threads(self):
+        self.assertEqual((10, 1000), self.limits_in_thread(10, None))
+        self.assertEqual((10, 1000), self.limits_in_thread(10, 5000))
+        self.assertEqual((10, 500), self.limits_in_thread(10, 500))
+
+    @patch("redash.settings.RQ_WORKER_THREADED_JOB_MAX_RESULT_BYTES", 1000)
+    def test_keeps_limits_of_other_jobs(self):
+        self.assertEqual((10, None), _job_result_limits(10, None))
+
+
 @patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
+@patch.object(PostgreSQL, "supports_streaming", False)
 class QueryExecutorTests(BaseTestCase):
     def test_success(self, _):
         """
@@ -191,6 +327,66 @@ class QueryExecutorTests(BaseTestCase):
             result = models.QueryResult.query.get(result_id)
             self.assertEqual(result.data, query_result_data)
 
+    def test_success_updates_shared_results_cache(self, _):
+        with patch.object(PostgreSQL, "run_query") as qr, patch.object(
+            models.results_cache, "enabled", True
+        ):
+            qr.return_value = (json_dumps({"columns": [], "rows": []}), None)
+            result_id = execute_query("SELECT 1, 2", self.factory.data_source.id, {})
+
+            cached = models.results_cache.get(
+                self.factory.data_source.id, gen_query_hash("SELECT 1, 2"), -1
+            )
+            self.assertEqual(result_id, cached["id"])
+
+    def test_truncates_results_over_the_org_row_limit(self, _):
+        self.factory.org.set_setting("query_results_max_rows", 2)
+        models.db.session.commit()
+        data = {"columns": [{"name": "a"}], "rows": [{"a": i} for i in range(20)]}
+
+        with patch.object(PostgreSQL, "run_query") as qr:
+            qr.return_value = (json_dumps(data), None)
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        result = models.QueryResult.query.get(result_id)
+        self.assertEqual([{"a": 0}, {"a": 1}], result.data["rows"])
+        self.assertTrue(result.data["truncated"])
+
+    def test_stops_runners_collecting_rows_at_the_limits(self, _):
+        self.factory.org.set_setting("query_results_max_rows", 2)
+        models.db.session.commit()
+        fetched = []
+
+        def batches():
+            for i in range(10):
+                fetched.append(i)
+                yield [{"a": i}]
+
+        def run_query(runner, query, user):
+            rows, truncated = runner.limit_rows(batches())
+            data = {"columns": [{"name": "a"}], "rows": rows, "truncated": truncated}
+            return json_dumps(data), None
+
+        with patch.object(PostgreSQL, "run_query", autospec=True) as qr:
+            qr.side_effect = run_query
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        result = models.QueryResult.query.get(result_id)
+        self.assertEqual([{"a": 0}, {"a": 1}], result.data["rows"])
+        self.assertTrue(result.data["truncated"])
+        self.assertEqual([0, 1, 2], fetched)
+
+    def test_keeps_results_within_the_limits(self, _):
+        self.factory.org.set_setting("query_results_max_rows", 20)
+        models.db.session.commit()
+        data = {"columns": [{"name": "a"}], "rows": [{"a": i} for i in range(20)]}
+
+        with patch.object(PostgreSQL, "run_query") as qr:
+            qr.return_value = (json_dumps(data), None)
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        self.assertEqual(data, models.QueryResult.query.get(result_id).data)
+
     def test_success_scheduled(self, _):
         """
         Scheduled queries remember their latest results.
@@ -301,3 +497,79 @@ class QueryExecutorTests(BaseTestCase):
             )
             q = models.Query.get_by_id(q.id)
             self.assertEqual(q.schedule_failures, 0)
+
+
+def stream(columns, *batches):
+    def run_query_stream(query, user):
+        yield columns
+        for batch in batches:
+            yield batch
+
+    return run_query_stream
+
+
+def failing_stream(query, user):
+    raise QueryRunnerError("relation does not exist")
+    yield
+
+
+@patch("redash.tasks.queries.execution.get_current_job", side_effect=fetch_job)
+class QueryExecutorStreamingTests(BaseTestCase):
+    columns = [{"name": "a", "friendly_name": "a", "type": "integer"}]
+
+    def test_stores_streamed_batches(self, _):
+        run_query_stream = stream(
+            self.columns, [{"a": 1}, {"a": 2}], [], [{"a": 3}]
+        )
+
+        with patch.object(PostgreSQL, "run_query_stream") as qr:
+            qr.side_effect = run_query_stream
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        result = models.QueryResult.query.get(result_id)
+        self.assertEqual(
+            {"columns": self.columns, "rows": [{"a": 1}, {"a": 2}, {"a": 3}]},
+            result.data,
+        )
+
+    @patch("redash.models.settings.QUERY_RESULTS_STORAGE_FORMAT", "columnar")
+    def test_stores_streamed_batches_as_columnar(self, _):
+        run_query_stream = stream(self.columns, [{"a": 1}], [{"a": 2}])
+
+        with patch.object(PostgreSQL, "run_query_stream") as qr:
+            qr.side_effect = run_query_stream
+            result_id = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        result = models.QueryResult.query.get(result_id)
+        self.assertIsNone(result._data)
+        self.assertEqual([{"a": 1}, {"a": 2}], result.data["rows"])
+
+    def test_stops_fetching_past_the_row_limit(self, _):
+        fetched = []
+
+        def run_query_stream(query, user):
+            yield self.columns
+            for i in range(10):
+                fetched.append(i)
+                yield [{"a": i}]
+
+        data_source = self.factory.data_source
+        data_source.options["max_result_rows"] = 3
+        models.db.session.commit()
+
+        with patch.object(PostgreSQL, "run_query_stream") as qr:
+            qr.side_effect = run_query_stream
+            result_id = execute_query("SELECT a", data_source.id, {})
+
+        result = models.QueryResult.query.get(result_id)
+        self.assertEqual([{"a": 0}, {"a": 1}, {"a": 2}], result.data["rows"])
+        self.assertTrue(result.data["truncated"])
+        self.assertEqual([0, 1, 2, 3], fetched)
+
+    def test_reports_stream_errors(self, _):
+        with patch.object(PostgreSQL, "run_query_stream") as qr:
+            qr.side_effect = failing_stream
+            result = execute_query("SELECT a", self.factory.data_source.id, {})
+
+        self.assertTrue(isinstance(result, QueryExecutionError))
+        self.assertEqual("relation does not exist", str(result))
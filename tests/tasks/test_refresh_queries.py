@@ -1,9 +1,9 @@
-from mock import patch, call, ANY
+from mock import ANY, patch
 from tests import BaseTestCase
 from redash.tasks.queries.maintenance import refresh_queries
 from redash.models import Query
 
-ENQUEUE_QUERY = "redash.tasks.queries.maintenance.enqueue_query"
+ENQUEUE_QUERIES = "redash.tasks.queries.maintenance.enqueue_scheduled_queries"
 
 
 class TestRefreshQuery(BaseTestCase):
@@ -19,29 +19,16 @@ class TestRefreshQuery(BaseTestCase):
             options={"apply_auto_limit": True},
         )
         oq = staticmethod(lambda: [query1, query2])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            self.assertEqual(add_job_mock.call_count, 2)
-            add_job_mock.assert_has_calls(
+            enqueue_mock.assert_called_once_with(
                 [
-                    call(
-                        query1.query_text + " LIMIT 1000",
-                        query1.data_source,
-                        query1.user_id,
-                        scheduled_query=query1,
-                        metadata={"query_id": query1.id, "Username": "Scheduled"},
-                    ),
-                    call(
-                        "select 42 LIMIT 1000",
-                        query2.data_source,
-                        query2.user_id,
-                        scheduled_query=query2,
-                        metadata={"query_id": query2.id, "Username": "Scheduled"},
-                    ),
+                    (query1.query_text + " LIMIT 1000", query1),
+                    ("select 42 LIMIT 1000", query2),
                 ],
-                any_order=True,
+                on_error=ANY,
             )
 
     def test_enqueues_outdated_queries_for_non_sqlquery(self):
@@ -59,29 +46,16 @@ class TestRefreshQuery(BaseTestCase):
             query_text="select 42;", data_source=ds, options={"apply_auto_limit": True}
         )
         oq = staticmethod(lambda: [query1, query2])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            self.assertEqual(add_job_mock.call_count, 2)
-            add_job_mock.assert_has_calls(
+            enqueue_mock.assert_called_once_with(
                 [
-                    call(
-                        query1.query_text,
-                        query1.data_source,
-                        query1.user_id,
-                        scheduled_query=query1,
-                        metadata={"query_id": query1.id, "Username": "Scheduled"},
-                    ),
-                    call(
-                        query2.query_text,
-                        query2.data_source,
-                        query2.user_id,
-                        scheduled_query=query2,
-                        metadata={"query_id": query2.id, "Username": "Scheduled"},
-                    ),
+                    (query1.query_text, query1),
+                    (query2.query_text, query2),
                 ],
-                any_order=True,
+                on_error=ANY,
             )
 
     def test_doesnt_enqueue_outdated_queries_for_paused_data_source_for_sqlquery(self):
@@ -93,20 +67,17 @@ class TestRefreshQuery(BaseTestCase):
         oq = staticmethod(lambda: [query])
         query.data_source.pause()
         with patch.object(Query, "outdated_queries", oq):
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as enqueue_mock:
                 refresh_queries()
-                add_job_mock.assert_not_called()
+                enqueue_mock.assert_called_once_with([], on_error=ANY)
 
             query.data_source.resume()
 
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as enqueue_mock:
                 refresh_queries()
-                add_job_mock.assert_called_with(
-                    query.query_text + " LIMIT 1000",
-                    query.data_source,
-                    query.user_id,
-                    scheduled_query=query,
-                    metadata=ANY,
+                enqueue_mock.assert_called_once_with(
+                    [(query.query_text + " LIMIT 1000", query)],
+                    on_error=ANY,
                 )
 
     def test_doesnt_enqueue_outdated_queries_for_paused_data_source_for_non_sqlquery(
@@ -125,20 +96,16 @@ class TestRefreshQuery(BaseTestCase):
         oq = staticmethod(lambda: [query])
         query.data_source.pause()
         with patch.object(Query, "outdated_queries", oq):
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as enqueue_mock:
                 refresh_queries()
-                add_job_mock.assert_not_called()
+                enqueue_mock.assert_called_once_with([], on_error=ANY)
 
             query.data_source.resume()
 
-            with patch(ENQUEUE_QUERY) as add_job_mock:
+            with patch(ENQUEUE_QUERIES) as enqueue_mock:
                 refresh_queries()
-                add_job_mock.assert_called_with(
-                    query.query_text,
-                    query.data_source,
-                    query.user_id,
-                    scheduled_query=query,
-                    metadata=ANY,
+                enqueue_mock.assert_called_once_with(
+                    [(query.query_text, query)], on_error=ANY
                 )
 
     def test_enqueues_parameterized_queries_for_sqlquery(self):
@@ -161,16 +128,12 @@ class TestRefreshQuery(BaseTestCase):
             },
         )
         oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            add_job_mock.assert_called_with(
-                "select 42 LIMIT 1000",
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata=ANY,
+            enqueue_mock.assert_called_once_with(
+                [("select 42 LIMIT 1000", query)], on_error=ANY
             )
 
     def test_enqueues_parameterized_queries_for_non_sqlquery(self):
@@ -197,17 +160,11 @@ class TestRefreshQuery(BaseTestCase):
             data_source=ds,
         )
         oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            add_job_mock.assert_called_with(
-                "select 42",
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata=ANY,
-            )
+            enqueue_mock.assert_called_once_with([("select 42", query)], on_error=ANY)
 
     def test_doesnt_enqueue_parameterized_queries_with_invalid_parameters(self):
         """
@@ -229,11 +186,11 @@ class TestRefreshQuery(BaseTestCase):
             },
         )
         oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            add_job_mock.assert_not_called()
+            enqueue_mock.assert_called_once_with([], on_error=ANY)
 
     def test_doesnt_enqueue_parameterized_queries_with_dropdown_queries_that_are_detached_from_data_source(
         self,
@@ -260,8 +217,25 @@ class TestRefreshQuery(BaseTestCase):
         dropdown_query = self.factory.create_query(id=100, data_source=None)
 
         oq = staticmethod(lambda: [query])
-        with patch(ENQUEUE_QUERY) as add_job_mock, patch.object(
+        with patch(ENQUEUE_QUERIES) as enqueue_mock, patch.object(
             Query, "outdated_queries", oq
         ):
             refresh_queries()
-            add_job_mock.assert_not_called()
+            enqueue_mock.assert_called_once_with([], on_error=ANY)
+
+    def test_reports_queries_that_fail_to_enqueue(self):
+        query = self.factory.create_query()
+        oq = staticmethod(lambda: [query])
+        error = ValueError("boom")
+
+        def enqueue(scheduled, on_error):
+            on_error(query, error)
+            return []
+
+        with patch(ENQUEUE_QUERIES, side_effect=enqueue), patch.object(
+            Query, "outdated_queries", oq
+        ), patch("redash.tasks.queries.maintenance.sentry") as sentry:
+            refresh_queries()
+
+        reported = sentry.capture_exception.call_args[0][0]
+        self.assertIn("Could not enqueue query %d" % query.id, str(reported))
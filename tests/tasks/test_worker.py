@@ -1,10 +1,17 @@
+import signal
+import threading
+import time
+from datetime import timedelta
+
 from mock import patch, call
 from rq import Connection
 from rq.job import JobStatus
+from rq.utils import utcnow
 from redash.tasks import Worker
 
 from tests import BaseTestCase
 from redash import rq_redis_connection
+from redash.query_runner import InterruptException
 from redash.tasks.worker import Queue
 from redash.tasks.queries.execution import (
     enqueue_query,
@@ -42,6 +49,26 @@ class TestWorkerMetrics(BaseTestCase):
         ]
         incr.assert_has_calls(calls)
 
+    @patch("statsd.StatsClient.timing")
+    def test_worker_records_wait_time_per_priority(self, timing, incr):
+        query = self.factory.create_query()
+
+        with Connection(rq_redis_connection):
+            enqueue_query(
+                query.query_text,
+                query.data_source,
+                query.user_id,
+                False,
+                None,
+                {"Username": "Patrick", "query_id": query.id},
+            )
+
+            Worker(["queries"]).work(max_jobs=1)
+
+        names = [c[0][0] for c in timing.call_args_list]
+        self.assertIn("queries.interactive.wait_time", names)
+        self.assertNotIn("queries.scheduled.wait_time", names)
+
     @patch("rq.Worker.execute_job")
     def test_worker_records_failure_metrics(self, _, incr):
         """
@@ -100,3 +127,261 @@ class TestQueueMetrics(BaseTestCase):
 
         foo.delay()
         incr.assert_called_with("rq.jobs.created.default")
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+
+
+def poll_for(seconds):
+    # Sleeps in short steps, like runners polling for their query's results.
+    for _ in range(int(seconds * 10)):
+        time.sleep(0.1)
+
+
+def count_queued_after(seconds):
+    poll_for(seconds)
+    return Queue("queries", connection=rq_redis_connection).count
+
+
+def set_sigint_handler():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class TestInProcessWorker(BaseTestCase):
+    def setUp(self):
+        super(TestInProcessWorker, self).setUp()
+        self.queue = Queue("default", connection=rq_redis_connection)
+        self.queue.empty()
+
+    def tearDown(self):
+        self.queue.empty()
+        super(TestInProcessWorker, self).tearDown()
+
+    def work(self):
+        with Connection(rq_redis_connection):
+            worker = Worker(
+                [self.queue], in_process_queues=["default"], job_monitoring_interval=1
+            )
+            worker.work(burst=True)
+
+    @patch("os.fork")
+    def test_runs_jobs_without_forking(self, fork):
+        job = self.queue.enqueue(sleep_for, 0)
+
+        self.work()
+
+        fork.assert_not_called()
+        self.assertEqual(JobStatus.FINISHED, job.get_status())
+
+    def test_enforces_time_limits(self):
+        job = self.queue.enqueue(sleep_for, 30, job_timeout=1)
+
+        started_at = time.time()
+        self.work()
+
+        self.assertLess(time.time() - started_at, 10)
+        job.refresh()
+        self.assertEqual(JobStatus.FAILED, job.get_status())
+        self.assertIn("JobTimeoutException", job.exc_info)
+
+    def test_interrupts_cancelled_jobs(self):
+        job = self.queue.enqueue(sleep_for, 30)
+        threading.Timer(0.5, job.cancel).start()
+
+        started_at = time.time()
+        self.work()
+
+        self.assertLess(time.time() - started_at, 10)
+        job.refresh()
+        self.assertEqual(JobStatus.FAILED, job.get_status())
+        self.assertIn("InterruptException", job.exc_info)
+
+    def test_ignores_interrupts_delivered_after_jobs_finish(self):
+        first = self.queue.enqueue(sleep_for, 0)
+        second = self.queue.enqueue(sleep_for, 0)
+        perform_job = Worker.perform_job
+
+        def perform_and_interrupt(worker, job, queue):
+            perform_job(worker, job, queue)
+            if job.id == first.id:
+                raise InterruptException("Job has been cancelled.")
+
+        with patch.object(Worker, "perform_job", perform_and_interrupt):
+            self.work()
+
+        self.assertEqual(JobStatus.FINISHED, first.get_status())
+        self.assertEqual(JobStatus.FINISHED, second.get_status())
+
+    def test_restores_signal_handlers_changed_by_jobs(self):
+        handler = signal.getsignal(signal.SIGINT)
+        self.queue.enqueue(set_sigint_handler)
+
+        with patch.object(Worker, "_install_signal_handlers"):
+            self.work()
+
+        self.assertEqual(handler, signal.getsignal(signal.SIGINT))
+
+
+class TestThreadedWorker(BaseTestCase):
+    def setUp(self):
+        super(TestThreadedWorker, self).setUp()
+        self.queue = Queue("queries", connection=rq_redis_connection)
+        self.queue.empty()
+
+    def tearDown(self):
+        self.queue.empty()
+        super(TestThreadedWorker, self).tearDown()
+
+    def work(self, threads=3):
+        with Connection(rq_redis_connection):
+            worker = Worker(
+                [self.queue],
+                threaded_queues=["queries"],
+                threads=threads,
+                job_monitoring_interval=1,
+            )
+            worker.work(burst=True)
+
+    def test_runs_jobs_concurrently(self):
+        jobs = [self.queue.enqueue(poll_for, 1) for _ in range(3)]
+
+        started_at = time.time()
+        self.work()
+
+        self.assertLess(time.time() - started_at, 2.5)
+        for enqueued in jobs:
+            self.assertEqual(JobStatus.FINISHED, enqueued.get_status())
+
+    def test_leaves_jobs_queued_while_threads_are_busy(self):
+        running = self.queue.enqueue(count_queued_after, 0.5)
+        queued = self.queue.enqueue(poll_for, 0)
+
+        self.work(threads=1)
+
+        self.assertEqual(1, running.result)
+        self.assertEqual(JobStatus.FINISHED, queued.get_status())
+
+    def test_enforces_time_limits_per_job(self):
+        slow = self.queue.enqueue(poll_for, 30, job_timeout=1)
+        fast = self.queue.enqueue(poll_for, 0.5)
+
+        started_at = time.time()
+        self.work()
+
+        self.assertLess(time.time() - started_at, 10)
+        slow.refresh()
+        self.assertEqual(JobStatus.FAILED, slow.get_status())
+        self.assertIn("JobTimeoutException", slow.exc_info)
+        self.assertEqual(JobStatus.FINISHED, fast.get_status())
+
+    def test_interrupts_cancelled_jobs(self):
+        job = self.queue.enqueue(poll_for, 30)
+        threading.Timer(0.5, job.cancel).start()
+
+        started_at = time.time()
+        self.work()
+
+        self.assertLess(time.time() - started_at, 10)
+        job.refresh()
+        self.assertEqual(JobStatus.FAILED, job.get_status())
+        self.assertIn("InterruptException", job.exc_info)
+
+    @patch("statsd.StatsClient.incr")
+    def test_records_metrics_once_jobs_finish(self, incr):
+        self.queue.enqueue(poll_for, 0.5)
+
+        self.work()
+
+        incr.assert_any_call("rq.jobs.finished.queries")
+
+    @patch("statsd.StatsClient.incr")
+    def test_reports_jobs_outliving_their_hard_limit(self, incr):
+        # Blocked in a single call, so the time limit can't interrupt it.
+        self.queue.enqueue(sleep_for, 3, job_timeout=1)
+        worker = Worker(
+            [self.queue],
+            threaded_queues=["queries"],
+            job_monitoring_interval=1,
+            connection=rq_redis_connection,
+        )
+        worker.grace_period = 0
+        worker.work(burst=True)
+
+        incr.assert_any_call("rq.jobs.overrun.queries")
+
+    def test_cold_shutdown_interrupts_jobs(self):
+        job = self.queue.enqueue(poll_for, 30)
+        worker = Worker(
+            [self.queue],
+            threaded_queues=["queries"],
+            connection=rq_redis_connection,
+        )
+        worker.execute_job(job, self.queue)
+        poll_for(0.5)
+
+        started_at = time.time()
+        with self.assertRaises(SystemExit):
+            worker.request_force_stop(signal.SIGTERM, None)
+        worker.register_death()
+
+        self.assertLess(time.time() - started_at, 5)
+        job.refresh()
+        self.assertEqual(JobStatus.FAILED, job.get_status())
+        self.assertIn("InterruptException", job.exc_info)
+
+
+class TestPriorityWorker(BaseTestCase):
+    def setUp(self):
+        super(TestPriorityWorker, self).setUp()
+        self.queues = [
+            Queue(name, connection=rq_redis_connection)
+            for name in ("queries", "scheduled_queries")
+        ]
+        for queue in self.queues:
+            queue.empty()
+        self.worker = Worker(self.queues, aging=60, connection=rq_redis_connection)
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.empty()
+        super(TestPriorityWorker, self).tearDown()
+
+    def enqueue(self, queue, waited=0):
+        job = queue.enqueue(sleep_for, 0)
+        job.enqueued_at = utcnow() - timedelta(seconds=waited)
+        job.save()
+        return job
+
+    def test_serves_queues_in_listed_order(self):
+        self.enqueue(self.queues[1], waited=30)
+        self.enqueue(self.queues[0])
+
+        self.assertEqual(self.queues, self.worker.ordered_queues())
+
+    def test_serves_queues_with_aged_jobs_first(self):
+        job = self.enqueue(self.queues[1], waited=90)
+        self.enqueue(self.queues[0])
+
+        self.assertEqual(self.queues[::-1], self.worker.ordered_queues())
+        dequeued, queue = self.worker.dequeue_job_and_maintain_ttl(None)
+        self.assertEqual(job.id, dequeued.id)
+        self.assertEqual("scheduled_queries", queue.name)
+
+    def test_aging_can_be_disabled(self):
+        self.enqueue(self.queues[1], waited=90)
+        self.enqueue(self.queues[0])
+        self.worker.aging = 0
+
+        self.assertEqual(self.queues, self.worker.ordered_queues())
+
+    def test_compares_aged_jobs_with_jobs_of_first_queues(self):
+        # Both waited for longer than aging, but the scheduled job has been
+        # waiting for less than aging more than the other one.
+        self.enqueue(self.queues[1], waited=600)
+        job = self.enqueue(self.queues[0], waited=580)
+
+        self.assertEqual(self.queues, self.worker.ordered_queues())
+        dequeued, queue = self.worker.dequeue_job_and_maintain_ttl(None)
+        self.assertEqual(job.id, dequeued.id)
+        self.assertEqual("queries", queue.name)
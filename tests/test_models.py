@@ -5,6 +5,8 @@ from unittest import TestCase
 import pytz
 from dateutil.parser import parse as date_parse
 
+from mock import patch
+
 from tests import BaseTestCase
 
 from redash import models, redis_connection
@@ -158,6 +160,50 @@ class ShouldScheduleNextTest(TestCase):
             models.should_schedule_next(two_hours_ago, now, "3600", failures=32)
         )
 
+    def test_spread_delays_exact_time_by_query_offset(self):
+        previous = date_parse("2015-10-15 10:00+00")
+        offset = models.schedule_offset(7, 600)
+        due = date_parse("2015-10-16 10:00+00") + datetime.timedelta(seconds=offset)
+
+        self.assertEqual(
+            due,
+            models.next_scheduled_run(previous, "86400", "10:00", spread=600, seed=7),
+        )
+        # And the delayed run doesn't move the next one.
+        self.assertEqual(
+            due + datetime.timedelta(days=1),
+            models.next_scheduled_run(due, "86400", "10:00", spread=600, seed=7),
+        )
+
+    def test_spread_interval_runs_at_query_offset_within_interval(self):
+        previous = date_parse("2015-10-15 10:00:30+00")
+        offset = models.schedule_offset(7, 600)
+        due = date_parse("2015-10-15 11:00+00") + datetime.timedelta(seconds=offset)
+
+        next_run = models.next_scheduled_run(previous, "3600", spread=600, seed=7)
+        self.assertEqual(due, next_run)
+        self.assertEqual(
+            due + datetime.timedelta(hours=1),
+            models.next_scheduled_run(next_run, "3600", spread=600, seed=7),
+        )
+
+    def test_spread_window_is_capped_at_interval(self):
+        previous = date_parse("2015-10-15 10:00+00")
+        for seed in range(20):
+            next_run = models.next_scheduled_run(
+                previous, "300", spread=3600, seed=seed
+            )
+            self.assertLessEqual(next_run - previous, datetime.timedelta(minutes=7.5))
+
+    def test_spread_distributes_queries_due_at_the_same_time(self):
+        previous = date_parse("2015-10-15 10:00+00")
+        next_runs = {
+            models.next_scheduled_run(previous, "3600", spread=600, seed=seed)
+            for seed in range(20)
+        }
+
+        self.assertGreater(len(next_runs), 10)
+
 
 class QueryOutdatedQueriesTest(BaseTestCase):
     def schedule(self, **kwargs):
@@ -195,6 +241,23 @@ class QueryOutdatedQueriesTest(BaseTestCase):
 
         self.assertIn(query, queries)
 
+    @patch("redash.settings.SCHEDULED_QUERIES_SPREAD", 600)
+    def test_outdated_queries_spreads_queries_over_window(self):
+        query = self.create_scheduled_query(interval="86400", time="00:00")
+        self.fake_previous_execution(query, days=1)
+        offset = models.schedule_offset(query.id, 600)
+        today = utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        with patch("redash.models.utils.utcnow") as now:
+            now.return_value = today + datetime.timedelta(seconds=offset - 1)
+            self.assertNotIn(query, models.Query.outdated_queries())
+
+            models.Query.query.filter_by(id=query.id).update(
+                {"schedule_next_run_at": None}
+            )
+            now.return_value = today + datetime.timedelta(seconds=offset + 1)
+            self.assertIn(query, models.Query.outdated_queries())
+
     def test_outdated_queries_works_scheduled_queries_tracker(self):
         query = self.create_scheduled_query(interval="3600")
         self.fake_previous_execution(query, hours=2)
@@ -335,6 +398,63 @@ class QueryOutdatedQueriesTest(BaseTestCase):
         queries = models.Query.outdated_queries()
         self.assertNotIn(query, queries)
 
+    def test_records_next_run_of_queries_that_are_not_due(self):
+        query = self.create_scheduled_query(interval="3600")
+        self.fake_previous_execution(query, minutes=30)
+
+        self.assertNotIn(query, models.Query.outdated_queries())
+        self.assertEqual(
+            query.latest_query_data.retrieved_at + datetime.timedelta(hours=1),
+            query.schedule_next_run_at,
+        )
+
+    def test_skips_queries_whose_next_run_is_in_the_future(self):
+        query = self.create_scheduled_query(interval="60")
+        self.fake_previous_execution(query, minutes=10)
+        db.session.flush()
+        query.schedule_next_run_at = utcnow() + datetime.timedelta(minutes=10)
+
+        self.assertNotIn(query, models.Query.outdated_queries())
+
+    def test_new_results_reset_next_run(self):
+        query = self.create_scheduled_query(interval="3600")
+        self.fake_previous_execution(query, minutes=30)
+        models.Query.outdated_queries()
+
+        self.fake_previous_execution(query, hours=2)
+
+        self.assertIsNone(query.schedule_next_run_at)
+        self.assertIn(query, models.Query.outdated_queries())
+
+    def test_indexes_schedules_that_wont_run_again(self):
+        disabled = self.create_scheduled_query(interval="60", disabled=True)
+        expired = self.create_scheduled_query(interval="60", until="2000-01-01")
+        overflowed = self.create_scheduled_query(interval="60")
+        overflowed.schedule_failures = 64
+
+        self.assertEqual([], models.Query.outdated_queries())
+        for query in (disabled, expired, overflowed):
+            self.assertEqual(models.SCHEDULE_NEVER, query.schedule_next_run_at)
+
+    def test_schedule_changes_in_place_reset_next_run(self):
+        query = self.create_scheduled_query(interval="60", disabled=True)
+        models.Query.outdated_queries()
+
+        query.schedule["disabled"] = False
+
+        self.assertIsNone(query.schedule_next_run_at)
+        models.Query.outdated_queries()
+        self.assertLess(query.schedule_next_run_at, models.SCHEDULE_NEVER)
+
+    def test_failures_reset_next_run(self):
+        query = self.create_scheduled_query(interval="60")
+        db.session.flush()
+        query.schedule_next_run_at = utcnow() + datetime.timedelta(minutes=10)
+
+        query.schedule_failures += 1
+
+        self.assertIsNone(query.schedule_next_run_at)
+
 
 class QueryArchiveTest(BaseTestCase):
     def test_archive_query_sets_flag(self):
@@ -0,0 +1,64 @@
+import time
+
+from mock import patch
+
+from tests import BaseTestCase
+from redash import models, redis_connection
+from redash.monitor import (
+    STATUS_DETAILS_KEY,
+    STATUS_SNAPSHOT_KEY,
+    estimated_count,
+    get_status_snapshot,
+    refresh_status_snapshots,
+)
+
+
+class TestEstimatedCount(BaseTestCase):
+    def test_counts_tables_that_werent_analyzed(self):
+        self.factory.create_query()
+        self.factory.create_query()
+
+        self.assertEqual(2, estimated_count(models.Query))
+
+    def test_uses_the_planner_estimate(self):
+        with patch.object(models.db.session, "execute") as execute:
+            execute.return_value.scalar.return_value = 1000
+            self.assertEqual(1000, estimated_count(models.Query))
+
+
+class TestStatusSnapshot(BaseTestCase):
+    def test_serves_the_stored_snapshot(self):
+        self.factory.create_query()
+        refresh_status_snapshots()
+
+        with patch("redash.monitor.get_snapshot_status") as get_status:
+            status = get_status_snapshot()
+            get_status.assert_not_called()
+
+        self.assertEqual(1, status["queries_count"])
+        self.assertLess(status["age"], 60)
+
+    def test_reports_the_age_of_the_snapshot(self):
+        refresh_status_snapshots()
+        with patch("redash.monitor.time.time", return_value=time.time() + 30):
+            self.assertGreaterEqual(get_status_snapshot()["age"], 30)
+
+    def test_computes_the_status_when_there_is_no_snapshot(self):
+        status = get_status_snapshot()
+
+        self.assertIn("queries_count", status)
+        self.assertIsNotNone(redis_connection.get(STATUS_SNAPSHOT_KEY))
+
+    def test_refreshes_status_details_less_often(self):
+        refresh_status_snapshots()
+        self.factory.create_query()
+
+        with patch("redash.monitor.get_object_counts") as get_object_counts:
+            refresh_status_snapshots()
+            get_object_counts.assert_not_called()
+
+        self.assertEqual(0, get_status_snapshot()["queries_count"])
+
+        redis_connection.delete(STATUS_DETAILS_KEY)
+        refresh_status_snapshots()
+        self.assertEqual(1, get_status_snapshot()["queries_count"])
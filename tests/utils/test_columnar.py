@@ -0,0 +1,105 @@
+from unittest import TestCase
+
+from redash.utils import columnar
+
+
+def make_data(count):
+    return {
+        "columns": [
+            {"name": "id", "friendly_name": "id", "type": "integer"},
+            {"name": "name", "friendly_name": "name", "type": "string"},
+            {"name": "score", "friendly_name": "score", "type": "float"},
+        ],
+        "rows": [
+            {"id": i, "name": "row {}".format(i), "score": i / 2.0}
+            for i in range(count)
+        ],
+    }
+
+
+class TestColumnarSerialization(TestCase):
+    def test_round_trip(self):
+        data = make_data(25)
+        payload = columnar.serialize(data, block_size=10)
+
+        self.assertTrue(columnar.is_columnar(payload))
+        self.assertEqual(data, columnar.deserialize(payload))
+
+    def test_keeps_extra_keys(self):
+        data = make_data(3)
+        data["metadata"] = {"truncated": True}
+
+        self.assertEqual(data, columnar.deserialize(columnar.serialize(data)))
+
+    def test_empty_result(self):
+        data = make_data(0)
+        self.assertEqual(data, columnar.deserialize(columnar.serialize(data)))
+
+    def test_missing_values_become_none(self):
+        data = make_data(2)
+        del data["rows"][1]["score"]
+
+        rows = columnar.deserialize(columnar.serialize(data))["rows"]
+        self.assertIsNone(rows[1]["score"])
+
+    def test_rejects_rows_with_unknown_keys(self):
+        data = make_data(2)
+        data["rows"][0]["other"] = 1
+
+        with self.assertRaises(columnar.UnsupportedResultError):
+            columnar.serialize(data)
+
+    def test_rejects_non_tabular_data(self):
+        with self.assertRaises(columnar.UnsupportedResultError):
+            columnar.serialize({"test": 1})
+
+
+class TestColumnarWriter(TestCase):
+    def test_encodes_rows_written_in_batches(self):
+        data = make_data(25)
+        writer = columnar.ColumnarWriter(data["columns"], block_size=10)
+        for start in range(0, 25, 7):
+            writer.write(data["rows"][start : start + 7])
+
+        self.assertEqual(data, columnar.deserialize(writer.finish()))
+
+    def test_keeps_extra_keys(self):
+        data = make_data(3)
+        writer = columnar.ColumnarWriter(data["columns"])
+        writer.write(data["rows"])
+
+        payload = writer.finish({"metadata": {"truncated": True}})
+        self.assertEqual({"truncated": True}, columnar.deserialize(payload)["metadata"])
+
+
+class TestColumnarReader(TestCase):
+    def setUp(self):
+        self.data = make_data(35)
+        self.reader = columnar.ColumnarReader(
+            columnar.serialize(self.data, block_size=10)
+        )
+
+    def test_reads_metadata(self):
+        self.assertEqual(35, self.reader.row_count)
+        self.assertEqual(self.data["columns"], self.reader.columns)
+
+    def test_reads_page_across_blocks(self):
+        page = self.reader.read(offset=8, limit=15)
+        self.assertEqual(self.data["rows"][8:23], page["rows"])
+
+    def test_reads_last_partial_page(self):
+        page = self.reader.read(offset=30, limit=10)
+        self.assertEqual(self.data["rows"][30:], page["rows"])
+
+    def test_reads_past_the_end(self):
+        self.assertEqual([], self.reader.read(offset=40, limit=10)["rows"])
+
+    def test_projects_columns(self):
+        page = self.reader.read(offset=0, limit=2, columns=["name"])
+
+        self.assertEqual(["name"], [c["name"] for c in page["columns"]])
+        self.assertEqual([{"name": "row 0"}, {"name": "row 1"}], page["rows"])
+
+    def test_rejects_other_payloads(self):
+        with self.assertRaises(columnar.UnsupportedResultError):
+            columnar.ColumnarReader(b'{"rows": []}')
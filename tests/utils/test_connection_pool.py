@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from redash.utils.connection_pool import ConnectionPool
+
+
+def check(connection):
+    pass
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(max_idle=2, idle_timeout=60)
+
+    def test_opens_connection_when_none_is_idle(self):
+        connection = Mock()
+        self.assertIs(connection, self.pool.acquire("a", lambda: connection, check))
+        self.assertEqual((0, 1), (self.pool.hits, self.pool.misses))
+
+    def test_reuses_released_connections_of_the_same_key(self):
+        connection = Mock()
+        self.pool.release("a", connection)
+
+        self.assertIsNot(connection, self.pool.acquire("b", Mock, check))
+        self.assertIs(connection, self.pool.acquire("a", Mock, check))
+        self.assertEqual((1, 1), (self.pool.hits, self.pool.misses))
+
+    def test_discards_connections_failing_the_check(self):
+        broken = Mock()
+        self.pool.release("a", broken)
+
+        def failing_check(connection):
+            raise Exception("connection closed")
+
+        self.assertIsNot(broken, self.pool.acquire("a", Mock, failing_check))
+        broken.close.assert_called_once_with()
+
+    def test_closes_connections_over_max_idle(self):
+        connections = [Mock(), Mock(), Mock()]
+        for connection in connections:
+            self.pool.release("a", connection)
+
+        self.assertEqual(2, len(self.pool))
+        connections[2].close.assert_called_once_with()
+
+    def test_closes_expired_connections(self):
+        connection = Mock()
+        with patch("redash.utils.connection_pool.time.time", return_value=0):
+            self.pool.release("a", connection)
+
+        with patch("redash.utils.connection_pool.time.time", return_value=61):
+            self.assertIsNot(connection, self.pool.acquire("a", Mock, check))
+
+        connection.close.assert_called_once_with()
+
+    def test_clear_closes_idle_connections(self):
+        connection = Mock()
+        self.pool.release("a", connection)
+        self.pool.clear()
+
+        self.assertEqual(0, len(self.pool))
+        connection.close.assert_called_once_with()
+
+    def test_forked_processes_dont_use_or_close_parent_connections(self):
+        connection = Mock()
+        self.pool.release("a", connection)
+        self.pool._after_fork()
+
+        self.assertEqual(0, len(self.pool))
+        self.assertIsNot(connection, self.pool.acquire("a", Mock, check))
+        self.pool.clear()
+        connection.close.assert_not_called()
@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+from mock import patch
+
+from redash.utils.lru import LRUCache
+
+
+class TestLRUCache(TestCase):
+    def test_returns_cached_values(self):
+        cache = LRUCache(10)
+        cache.set("a", {"rows": []}, 1)
+
+        self.assertEqual({"rows": []}, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_evicts_least_recently_used_items_by_size(self):
+        cache = LRUCache(10)
+        cache.set("a", 1, 4)
+        cache.set("b", 2, 4)
+        cache.get("a")
+        cache.set("c", 3, 4)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(8, cache.size)
+        self.assertEqual(1, cache.evictions)
+
+    def test_skips_items_larger_than_the_cache(self):
+        cache = LRUCache(10)
+
+        self.assertFalse(cache.set("a", 1, 11))
+        self.assertEqual(0, len(cache))
+
+    def test_replacing_an_item_updates_size(self):
+        cache = LRUCache(10)
+        cache.set("a", 1, 4)
+        cache.set("a", 2, 6)
+
+        self.assertEqual(2, cache.get("a"))
+        self.assertEqual(6, cache.size)
+
+    def test_delete(self):
+        cache = LRUCache(10)
+        cache.set("a", 1, 4)
+        cache.delete("a")
+        cache.delete("b")
+
+        self.assertNotIn("a", cache)
+        self.assertEqual(0, cache.size)
+
+    def test_disabled_when_size_is_zero(self):
+        cache = LRUCache(0)
+
+        self.assertFalse(cache.set("a", 1, 0))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.misses)
+
+    @patch("redash.utils.lru.statsd_client")
+    def test_reports_metrics(self, statsd_client):
+        cache = LRUCache(4, metrics_prefix="test.cache")
+        cache.get("a")
+        cache.set("a", 1, 4)
+        cache.get("a")
+        cache.set("b", 2, 4)
+
+        statsd_client.incr.assert_any_call("test.cache.miss", 1)
+        statsd_client.incr.assert_any_call("test.cache.hit", 1)
+        statsd_client.incr.assert_any_call("test.cache.eviction", 1)
@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from redash.utils import json_dumps
+from redash.utils.result_limits import ResultSizeGuard, truncate_encoded_result
+
+
+def make_rows(count):
+    return [{"id": i, "name": "row {}".format(i)} for i in range(count)]
+
+
+class TestResultSizeGuard(TestCase):
+    def test_admits_everything_without_limits(self):
+        guard = ResultSizeGuard()
+        rows, encoded = guard.admit(make_rows(5))
+
+        self.assertEqual(make_rows(5), rows)
+        self.assertIsNone(encoded)
+        self.assertFalse(guard.truncated)
+
+    def test_trims_the_batch_crossing_the_row_limit(self):
+        guard = ResultSizeGuard(max_rows=5)
+        self.assertEqual(3, len(guard.admit(make_rows(3))[0]))
+        self.assertEqual(2, len(guard.admit(make_rows(3))[0]))
+        self.assertTrue(guard.truncated)
+
+    def test_reaching_the_row_limit_exactly_isnt_truncation(self):
+        guard = ResultSizeGuard(max_rows=3)
+        guard.admit(make_rows(3))
+        self.assertFalse(guard.truncated)
+
+        self.assertEqual([], guard.admit(make_rows(1))[0])
+        self.assertTrue(guard.truncated)
+
+    def test_trims_the_batch_crossing_the_byte_limit(self):
+        rows = make_rows(10)
+        max_bytes = len(json_dumps(rows[:4]))
+        guard = ResultSizeGuard(max_bytes=max_bytes)
+
+        admitted, encoded = guard.admit(rows)
+        self.assertEqual(rows[:4], admitted)
+        self.assertEqual(json_dumps(admitted)[1:-1], encoded)
+        self.assertLessEqual(guard.byte_count, max_bytes)
+        self.assertTrue(guard.truncated)
+
+
+class TestTruncateEncodedResult(TestCase):
+    def test_flags_truncated_results(self):
+        data = json_dumps({"columns": [], "rows": make_rows(5), "metadata": {}})
+
+        result = truncate_encoded_result(data, max_rows=2)
+        self.assertEqual(
+            {"columns": [], "rows": make_rows(2), "metadata": {}, "truncated": True},
+            result,
+        )
+
+    def test_trims_rows_over_the_byte_limit(self):
+        rows = make_rows(10)
+        data = json_dumps({"rows": rows, "columns": []}, indent=2)
+
+        result = truncate_encoded_result(data, max_bytes=len(json_dumps(rows[:4])))
+        self.assertEqual(rows[:4], result["rows"])
+        self.assertEqual([], result["columns"])
+
+    def test_leaves_results_within_the_limits(self):
+        data = json_dumps({"columns": [], "rows": make_rows(5)})
+
+        self.assertIsNone(truncate_encoded_result(data, max_rows=5, max_bytes=1000))
+        self.assertIsNone(truncate_encoded_result("[]", max_rows=1))